@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    name = 'apps.core'
+    verbose_name = 'Core'
+
+    def ready(self):
+        # connect model signals
+        from apps.core import signals  # noqa: F401
+        from utils import permissions  # noqa: F401
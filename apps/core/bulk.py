@@ -0,0 +1,252 @@
+"""
+    Bulk registration of sensors (Data) upserted on mac_address, and bulk ingestion of their readings into the
+    measurements store (apps.core.timeseries)
+"""
+import datetime
+import uuid
+
+from django.db import connections, transaction, DatabaseError
+from django.utils import timezone
+from psycopg2.extras import execute_values
+from rest_framework.exceptions import ValidationError
+
+from apps.core.models import Data, Table1, RelatedTable1, RelatedTable2, RelatedTable3
+from apps.core.serializers import DataBulkSerializer, ReadingBulkSerializer
+from apps.core.site_model import get_table1_of_rooms, invalidate_site_model
+from apps.core.spatial import invalidate_room_sensor_index
+from apps.core.timeseries import insert_measurements, refresh_rollups
+from utils.parsers import StreamRowError
+
+SENSORS_BULK_BATCH_SIZE = 1000
+SENSORS_BULK_MAX_REPORTED_ERRORS = 1000
+READINGS_BULK_BATCH_SIZE = 5000
+
+READINGS_BULK_FIELDS = ('temperature', 'humidity', 'pressure')
+
+# replaced on conflict
+SENSORS_BULK_FIELDS = ('name', )
+# replaced on conflict only when they are not null
+SENSORS_BULK_OPTIONAL_FIELDS = ('source', 'type', 'firmware_version', 'table1', 'related_table1',
+                                'related_table2', 'related_table3', 'x', 'y', 'z')
+
+SENSORS_BULK_RELATED_MODELS = {
+    'table1': Table1,
+    'related_table1': RelatedTable1,
+    'related_table2': RelatedTable2,
+    'related_table3': RelatedTable3,
+}
+
+
+class SensorsBulkResult:
+
+    def __init__(self, max_errors=SENSORS_BULK_MAX_REPORTED_ERRORS):
+        self.max_errors = max_errors
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line, mac_address, errors):
+        self.failed += 1
+        # only the first errors are kept so memory does not grow with the upload
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'mac_address': mac_address, 'errors': errors})
+
+    def to_dict(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors)
+        }
+
+
+def get_sensors_upsert_sql(db):
+    opts = Data._meta
+    quote_name = connections[db].ops.quote_name
+    table = quote_name(opts.db_table)
+
+    def column(name):
+        return quote_name(opts.get_field(name).column)
+
+    fields = ('id', 'mac_address') + SENSORS_BULK_FIELDS + SENSORS_BULK_OPTIONAL_FIELDS + ('created_at', 'updated_at')
+    updates = [f'{column(x)} = EXCLUDED.{column(x)}' for x in SENSORS_BULK_FIELDS + ('updated_at', )]
+    updates += [f'{column(x)} = COALESCE(EXCLUDED.{column(x)}, {table}.{column(x)})'
+                for x in SENSORS_BULK_OPTIONAL_FIELDS]
+
+    return (f'INSERT INTO {table} ({", ".join(column(x) for x in fields)}) VALUES %s '
+            f'ON CONFLICT ({column("mac_address")}) DO UPDATE SET {", ".join(updates)} '
+            f'RETURNING (xmax = 0) AS inserted')
+
+
+def _exclude_missing_related(batch, db, result):
+    """
+    Check in one query per related model that the referenced ids exist, rows referencing missing ids fail
+    """
+    for field, model in SENSORS_BULK_RELATED_MODELS.items():
+        ids = {data[field] for _, data in batch.values() if data.get(field)}
+        if not ids:
+            continue
+
+        existing = set(model.objects.using(db).filter(id__in=ids).values_list('id', flat=True))
+        for mac_address, (line, data) in list(batch.items()):
+            if data.get(field) and data[field] not in existing:
+                del batch[mac_address]
+                result.add_error(line, mac_address, {field: [f'{model._meta.verbose_name} does not exist']})
+
+
+def _upsert_batch(batch, db, result):
+    _exclude_missing_related(batch, db, result)
+    if not batch:
+        return
+
+    now = timezone.now()
+    values = [(uuid.uuid4(), mac_address)
+              + tuple(data[x] for x in SENSORS_BULK_FIELDS)
+              + tuple(data.get(x) for x in SENSORS_BULK_OPTIONAL_FIELDS)
+              + (now, now)
+              for mac_address, (_, data) in batch.items()]
+
+    rooms = set(Data.objects.using(db).filter(mac_address__in=list(batch))
+                .values_list('related_table1_id', flat=True))
+    rooms.update(data.get('related_table1') for _, data in batch.values())
+
+    try:
+        with transaction.atomic(using=db):
+            with connections[db].cursor() as cursor:
+                inserted = execute_values(cursor.cursor, get_sensors_upsert_sql(db), values,
+                                          page_size=len(values), fetch=True)
+    except DatabaseError as ex:
+        for mac_address, (line, _) in batch.items():
+            result.add_error(line, mac_address, {'non_field_errors': [ex.__str__()]})
+        return
+
+    created = sum(1 for x in inserted if x[0])
+    result.created += created
+    result.updated += len(inserted) - created
+
+    # the raw upsert sends no signals
+    for room_id in rooms:
+        invalidate_room_sensor_index(room_id, db)
+    for table1_id in get_table1_of_rooms(rooms, db):
+        invalidate_site_model(table1_id, db)
+
+
+def upsert_sensors(rows, db, batch_size=SENSORS_BULK_BATCH_SIZE):
+    """
+    Validate and upsert sensors on mac_address in batches
+    Invalid rows are reported and skipped, the rest of the batch is saved. When a mac_address is repeated the
+    last row wins.
+    @param rows: iterable of (line number, dict or StreamRowError), e.g. from utils.parsers
+    @param db: database
+    @param batch_size: rows per INSERT ... ON CONFLICT
+    @return: SensorsBulkResult
+    """
+    result = SensorsBulkResult()
+    serializer = DataBulkSerializer()
+    batch = {}
+
+    for line, row in rows:
+        if isinstance(row, StreamRowError):
+            result.add_error(line, None, {'non_field_errors': [row.__str__()]})
+            continue
+
+        try:
+            data = serializer.run_validation(row)
+        except ValidationError as ex:
+            result.add_error(line, row.get('mac_address'), ex.detail)
+            continue
+
+        batch.pop(data['mac_address'], None)
+        batch[data['mac_address']] = (line, data)
+        if len(batch) >= batch_size:
+            _upsert_batch(batch, db, result)
+            batch = {}
+
+    if batch:
+        _upsert_batch(batch, db, result)
+
+    return result
+
+
+class ReadingsBulkResult(SensorsBulkResult):
+
+    def __init__(self, max_errors=SENSORS_BULK_MAX_REPORTED_ERRORS):
+        super().__init__(max_errors)
+        self.inserted = 0
+        self.duplicated = 0
+
+    def to_dict(self):
+        return {
+            'inserted': self.inserted,
+            'duplicated': self.duplicated,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors)
+        }
+
+
+def _insert_readings_batch(batch, db, result):
+    sensors = dict(Data.objects.using(db).filter(mac_address__in={x['mac_address'] for _, x in batch})
+                   .values_list('mac_address', 'id'))
+    readings = []
+    for line, data in batch:
+        if data['mac_address'] not in sensors:
+            result.add_error(line, data['mac_address'], {'mac_address': ['Sensor does not exist']})
+            continue
+        readings.append((sensors[data['mac_address']], data['timestamp'])
+                        + tuple(data.get(x) for x in READINGS_BULK_FIELDS))
+    if not readings:
+        return
+
+    try:
+        inserted = insert_measurements(readings, db)
+        # buckets are recomputed from the raw readings, so late and repeated readings are rolled up again
+        timestamps = [x[1] for x in readings]
+        refresh_rollups(db, min(timestamps), max(timestamps) + datetime.timedelta(microseconds=1))
+    except DatabaseError as ex:
+        for line, data in batch:
+            if data['mac_address'] in sensors:
+                result.add_error(line, data['mac_address'], {'non_field_errors': [ex.__str__()]})
+        return
+
+    result.inserted += inserted
+    result.duplicated += len(readings) - inserted
+
+
+def insert_readings(rows, db, batch_size=READINGS_BULK_BATCH_SIZE):
+    """
+    Validate and store sensor readings in batches, each batch is inserted into the measurements store and the
+    rollups of the buckets it touches are refreshed
+    Invalid rows and readings of unknown sensors are reported and skipped. Readings already stored for the same
+    sensor and timestamp are ignored.
+    @param rows: iterable of (line number, dict or StreamRowError), e.g. from utils.parsers
+    @param db: database
+    @param batch_size: readings per insert
+    @return: ReadingsBulkResult
+    """
+    result = ReadingsBulkResult()
+    serializer = ReadingBulkSerializer()
+    batch = []
+
+    for line, row in rows:
+        if isinstance(row, StreamRowError):
+            result.add_error(line, None, {'non_field_errors': [row.__str__()]})
+            continue
+
+        try:
+            data = serializer.run_validation(row)
+        except ValidationError as ex:
+            result.add_error(line, row.get('mac_address'), ex.detail)
+            continue
+
+        batch.append((line, data))
+        if len(batch) >= batch_size:
+            _insert_readings_batch(batch, db, result)
+            batch = []
+
+    if batch:
+        _insert_readings_batch(batch, db, result)
+
+    return result
@@ -0,0 +1,206 @@
+"""
+    Psychrometric chart of a Table1: the background (humidity curves and operation envelopes) is rendered once per
+    envelope version in a process pool and kept in DEFAULT_FILE_STORAGE, the current row points are drawn over it
+    with Pillow on each request.
+
+    The storage is the manifest of the backgrounds: charts/<db>/<table1 id>/<version>.png and its transform in
+    <version>.json, the files of the other versions in the directory are removed when a background is stored.
+    Only the version and the render lock are kept in the django cache (a shared backend, see CACHES)
+"""
+import io
+import json
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from apps.core.envelopes import get_table1_envelopes, classify_readings
+from apps.core.models import RelatedTable1
+from apps.core.psychrometrics import get_room_psychrometrics
+from code_setting.settings import CHART_WORKERS, CHART_RENDER_TIMEOUT
+from utils.cache import VersionedLocalCache
+from utils.constants import ENVELOPE_RECOMMENDED, ENVELOPE_ALLOWED, ENVELOPE_OUTSIDE
+
+logger = logging.getLogger(__name__)
+
+CHART_POINT_RADIUS = 4
+CHART_POINT_COLORS = {
+    ENVELOPE_RECOMMENDED: (49, 163, 84),
+    ENVELOPE_ALLOWED: (230, 85, 13),
+    ENVELOPE_OUTSIDE: (203, 24, 29),
+}
+
+chart_cache = VersionedLocalCache('core:charts', max_entries=64)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            import multiprocessing
+            _executor = ProcessPoolExecutor(max_workers=CHART_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _executor
+
+
+def _reset_executor():
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+def _chart_key(table1_id, db):
+    return f'{db}:{table1_id}'
+
+
+def _lock_cache_key(key, version):
+    return f'core:charts:rendering:{key}:{version}'
+
+
+def _chart_directory(key):
+    return f"charts/{key.replace(':', '/')}"
+
+
+def _chart_name(key, version, extension):
+    return f'{_chart_directory(key)}/{version}.{extension}'
+
+
+def get_chart_background(table1_id, db):
+    """
+    @return: (png bytes, transform) of the current background or None when it is not rendered yet
+    """
+    key = _chart_key(table1_id, db)
+    version = chart_cache.get_version(key)
+
+    def read():
+        with default_storage.open(_chart_name(key, version, 'png'), 'rb') as f:
+            png = f.read()
+        with default_storage.open(_chart_name(key, version, 'json'), 'rb') as f:
+            return png, json.load(f)
+    try:
+        return chart_cache.get((key, version), read, version_key=key)
+    except (IOError, OSError, ValueError):
+        # not rendered yet, removed from the storage or being stored
+        return None
+
+
+def request_chart_background(table1_id, db):
+    """
+    Start rendering the background of a Table1 (standard pressure) unless it is already being rendered
+    @return: True when a render was started
+    """
+    from utils.charts import render_chart_background
+    from utils.psychrometrics import STANDARD_PRESSURE
+
+    key = _chart_key(table1_id, db)
+    version = chart_cache.get_version(key)
+    if not cache.add(_lock_cache_key(key, version), True, CHART_RENDER_TIMEOUT):
+        return False
+
+    try:
+        envelopes = get_table1_envelopes(table1_id, db)
+        args = (render_chart_background, envelopes.recommended, envelopes.allowed, STANDARD_PRESSURE)
+        try:
+            future = _get_executor().submit(*args)
+        except BrokenProcessPool:
+            _reset_executor()
+            future = _get_executor().submit(*args)
+    except Exception:
+        cache.delete(_lock_cache_key(key, version))
+        raise
+    future.add_done_callback(lambda x: _store_chart_background(key, version, x))
+    return True
+
+
+def _store_chart_background(key, version, future):
+    try:
+        png, transform = future.result()
+        # the png is read only with its transform, it is saved first
+        for extension, content in (('png', png), ('json', json.dumps(transform).encode())):
+            name = _chart_name(key, version, extension)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            default_storage.save(name, ContentFile(content))
+        _remove_stale_chart_backgrounds(key, version)
+    except Exception as ex:
+        logger.exception('Chart background %s can not be rendered', key)
+        if isinstance(ex, BrokenProcessPool):
+            _reset_executor()
+    finally:
+        cache.delete(_lock_cache_key(key, version))
+
+
+def _remove_stale_chart_backgrounds(key, version):
+    """
+    Remove the backgrounds of the versions other than the current one, whichever process rendered them and even
+    when the django cache was cleared in between. A render that finished after an invalidation removes only its own
+    files
+    """
+    version, current = str(version), str(chart_cache.get_version(key))
+    directory = _chart_directory(key)
+    if version != current:
+        names = [f'{version}.png', f'{version}.json']
+    else:
+        try:
+            names = [x for x in default_storage.listdir(directory)[1] if x.rsplit('.', 1)[0] != current]
+        except (IOError, OSError, NotImplementedError):
+            names = []
+    for name in names:
+        default_storage.delete(f'{directory}/{name}')
+
+
+def invalidate_table1_chart(table1_id, db):
+    chart_cache.invalidate(_chart_key(table1_id, db))
+
+
+def get_table1_points(table1_id, db):
+    """
+    @return: (temperatures, humidities %) of the cold and hot aisles of every row of the Table1
+    """
+    temperatures, humidities = [], []
+    for room_id in RelatedTable1.objects.using(db).filter(table1_id=table1_id).values_list('id', flat=True):
+        for state in get_room_psychrometrics(room_id, db):
+            if state['temperature'] is not None and state['humidity'] is not None:
+                temperatures.append(state['temperature'])
+                humidities.append(state['humidity'])
+    return temperatures, humidities
+
+
+def render_table1_chart(table1_id, db):
+    """
+    Draw the current points of a Table1 over its background
+    @return: png bytes or None while the background is being rendered
+    """
+    from PIL import Image, ImageDraw
+    from utils.charts import to_chart_coordinates, get_pixels
+    from utils.psychrometrics import STANDARD_PRESSURE
+
+    background = get_chart_background(table1_id, db)
+    if background is None:
+        request_chart_background(table1_id, db)
+        return None
+    png, transform = background
+
+    temperatures, humidities = get_table1_points(table1_id, db)
+    classes = classify_readings(table1_id, db, temperatures, humidities)
+    columns, rows = get_pixels(transform, *to_chart_coordinates(temperatures, humidities, STANDARD_PRESSURE))
+
+    image = Image.open(io.BytesIO(png)).convert('RGB')
+    draw = ImageDraw.Draw(image)
+    r = CHART_POINT_RADIUS
+    for column, row, envelope in zip(columns, rows, classes):
+        if column == column and row == row:
+            draw.ellipse((column - r, row - r, column + r, row + r), fill=CHART_POINT_COLORS[envelope],
+                         outline=(255, 255, 255))
+
+    result = io.BytesIO()
+    image.save(result, format='PNG')
+    return result.getvalue()
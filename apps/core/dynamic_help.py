@@ -0,0 +1,72 @@
+"""
+    Help texts of the UI components (DYNAMIC_HELP) with the image URLs of the company already resolved.
+    Each company and language gets a snapshot of rendered JSON bodies and their ETags, rebuilt only when the Files
+    of the company change.
+"""
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from apps.core.models import Files
+from code_setting.settings import LANGUAGES, LANGUAGE_EN
+from utils.cache import VersionedLocalCache
+from utils.constants import DYNAMIC_HELP
+
+LANGUAGE_CODES = tuple(x[0] for x in LANGUAGES)
+
+dynamic_help_cache = VersionedLocalCache('core:dynamic-help', max_entries=512)
+
+
+class DynamicHelpSnapshot:
+    """
+    Rendered bodies ({"result": ...}) of every UI component, they are bytes so nothing can change them
+    """
+
+    def __init__(self, bodies):
+        self._bodies = {k: (f'"{hashlib.sha1(v).hexdigest()}"', v) for k, v in bodies.items()}
+
+    def get(self, ui_component):
+        """
+        @return: (etag, body) or None for unknown components
+        """
+        return self._bodies.get(ui_component)
+
+
+def localize_help_text(text, language):
+    """
+    @param text: DYNAMIC_HELP entry with the translations in <field>_<language> keys
+    @param language: LANGUAGES code or None to keep every translation
+    """
+    if language is None:
+        return dict(text)
+
+    suffixes = tuple(f'_{x}' for x in LANGUAGE_CODES if x != LANGUAGE_EN)
+    return {key: text.get(f'{key}_{language}', value) for key, value in text.items() if not key.endswith(suffixes)}
+
+
+def build_dynamic_help(db, language=None):
+    images = {text['image'] for texts in DYNAMIC_HELP.values() for text in texts.values() if text.get('image')}
+    # order_by(): the default ordering of Files is on a field it does not have
+    files = Files.objects.using(db).filter(name__in=images).order_by()
+    urls = {x.name: x.file.url if x.file else None for x in files}
+
+    bodies = {}
+    for ui_component, texts in DYNAMIC_HELP.items():
+        result = {}
+        for key, text in texts.items():
+            result[key] = localize_help_text(text, language)
+            if text.get('image') in urls:
+                result[key]['image'] = urls[text['image']]
+        # same rendering as the rest framework JSON renderer
+        bodies[ui_component] = json.dumps({'result': result}, cls=DjangoJSONEncoder, ensure_ascii=False,
+                                          separators=(',', ':')).encode()
+    return DynamicHelpSnapshot(bodies)
+
+
+def get_dynamic_help(db, language=None):
+    return dynamic_help_cache.get(f'{db}:{language}', lambda: build_dynamic_help(db, language), version_key=db)
+
+
+def invalidate_dynamic_help(db):
+    dynamic_help_cache.invalidate(db)
@@ -0,0 +1,183 @@
+"""
+    Operation envelopes of a Table1 compiled once into polygons in the (temperature °C, relative humidity %) plane
+    and used to classify batches of readings in a single vectorized call
+"""
+from apps.core.models import Table1
+from utils.cache import VersionedLocalCache
+from utils.constants import (ENVELOPE_UNKNOWN, ENVELOPE_RECOMMENDED, ENVELOPE_ALLOWED, ENVELOPE_OUTSIDE,
+                             RECOMMENDED_OPERATION_ENVELOPES, ALLOWED_OPERATION_ENVELOPES)
+
+# Table1 fields that define its envelopes
+ENVELOPE_FIELDS = ('custom_recommended_operation_limit_area', 'custom_allowed_operation_limit_area',
+                   'area_recommended_operation', 'area_allowed_operation')
+
+# temperature step (°C) used to follow the dew point limits of the default envelopes
+ENVELOPE_CURVE_STEP = 0.25
+
+# readings this close (°C, RH %) to the edge of an envelope are inside, the limits are inclusive
+ENVELOPE_EDGE_TOLERANCE = 1e-3
+
+envelope_cache = VersionedLocalCache('core:envelopes')
+
+
+def get_limits_polygon(limits, step=ENVELOPE_CURVE_STEP):
+    """
+    Polygon of an envelope given by its temperature, dew point and relative humidity limits. The humidity bounds
+    at each temperature are the tightest of the RH limit and the RH of the dew point limit
+    @param limits: (min temperature, max temperature, min dew point, max dew point, min RH %, max RH %)
+    @return: (N x 2) array of (temperature, RH %) vertices
+    """
+    import numpy as np
+    from utils.psychrometrics import sat_vapor_pressure
+
+    t_min, t_max, dp_min, dp_max, rh_min, rh_max = limits
+    temperatures = np.append(np.arange(t_min, t_max, step), t_max)
+    saturation = sat_vapor_pressure(temperatures)
+    upper = np.minimum(rh_max, 100 * sat_vapor_pressure(dp_max) / saturation)
+    lower = np.maximum(rh_min, 100 * sat_vapor_pressure(dp_min) / saturation)
+    return np.concatenate((np.column_stack((temperatures, upper)), np.column_stack((temperatures, lower))[::-1]))
+
+
+def within_limits(limits, points, tolerance=ENVELOPE_EDGE_TOLERANCE):
+    """
+    Exact, inclusive test of the limits of get_limits_polygon, the dew point bounds are evaluated at the
+    temperature of each point instead of on the ENVELOPE_CURVE_STEP vertices
+    @param limits: (min temperature, max temperature, min dew point, max dew point, min RH %, max RH %)
+    @param points: (N x 2) array of (temperature, RH %)
+    @return: bool array
+    """
+    import numpy as np
+    from utils.psychrometrics import sat_vapor_pressure
+
+    t_min, t_max, dp_min, dp_max, rh_min, rh_max = limits
+    temperatures, humidities = points[:, 0], points[:, 1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        saturation = sat_vapor_pressure(temperatures)
+        upper = np.minimum(rh_max, 100 * sat_vapor_pressure(dp_max) / saturation)
+        lower = np.maximum(rh_min, 100 * sat_vapor_pressure(dp_min) / saturation)
+        return ((temperatures >= t_min - tolerance) & (temperatures <= t_max + tolerance)
+                & (humidities >= lower - tolerance) & (humidities <= upper + tolerance))
+
+
+def parse_polygon(area):
+    """
+    Custom limit area stored in Table1: list of [temperature, humidity] pairs or of {x, y} /
+    {temperature, humidity} points, optionally under a 'points' key
+    @return: (N x 2) array or None when the area is empty or invalid
+    """
+    import numpy as np
+
+    if isinstance(area, dict):
+        area = area.get('points')
+    if not area:
+        return None
+
+    vertices = []
+    for point in area:
+        if isinstance(point, dict):
+            point = (point.get('x', point.get('temperature')), point.get('y', point.get('humidity')))
+        vertices.append(point)
+    try:
+        vertices = np.asarray(vertices, dtype=float)
+    except (TypeError, ValueError):
+        return None
+    if vertices.ndim != 2 or vertices.shape[1] != 2 or len(vertices) < 3 or not np.isfinite(vertices).all():
+        return None
+    return vertices
+
+
+def contains_points(path, points, tolerance=ENVELOPE_EDGE_TOLERANCE):
+    """
+    Inclusive Path.contains_points: the points on the edges are inside. The sign of the radius that grows the path
+    depends on the orientation of its vertices, both are tested
+    @return: bool array
+    """
+    return path.contains_points(points, radius=tolerance) | path.contains_points(points, radius=-tolerance)
+
+
+class CompiledEnvelopes:
+    """
+    Recommended and allowed envelopes of a Table1 as prepared matplotlib paths. The envelopes given by their limits
+    (the defaults of the operation classes) are tested against the limits directly
+    """
+
+    def __init__(self, recommended, allowed, recommended_limits=None, allowed_limits=None):
+        """
+        @param recommended: (N x 2) polygon of the recommended envelope
+        @param allowed: (N x 2) polygon of the allowed envelope
+        @param recommended_limits: limits the recommended polygon was built from (see get_limits_polygon), if any
+        @param allowed_limits: limits the allowed polygon was built from, if any
+        """
+        from matplotlib.path import Path
+
+        self.recommended = recommended
+        self.allowed = allowed
+        self.recommended_limits = recommended_limits
+        self.allowed_limits = allowed_limits
+        self._recommended_path = Path(recommended, closed=False)
+        self._allowed_path = Path(allowed, closed=False)
+
+    @staticmethod
+    def _contains(path, limits, points):
+        return contains_points(path, points) if limits is None else within_limits(limits, points)
+
+    def classify(self, temperatures, humidities):
+        """
+        @param temperatures: array of temperatures (°C)
+        @param humidities: array of relative humidities (%)
+        @return: int8 array of ENVELOPE_RECOMMENDED, ENVELOPE_ALLOWED, ENVELOPE_OUTSIDE or ENVELOPE_UNKNOWN
+        (missing values)
+        """
+        import numpy as np
+
+        points = np.column_stack((np.asarray(temperatures, dtype=float).ravel(),
+                                  np.asarray(humidities, dtype=float).ravel()))
+        classes = np.full(len(points), ENVELOPE_OUTSIDE, dtype=np.int8)
+        valid = np.isfinite(points).all(axis=1)
+        if valid.any():
+            valid_points = points[valid]
+            valid_classes = classes[valid]
+            valid_classes[self._contains(self._allowed_path, self.allowed_limits, valid_points)] = ENVELOPE_ALLOWED
+            valid_classes[self._contains(self._recommended_path, self.recommended_limits,
+                                         valid_points)] = ENVELOPE_RECOMMENDED
+            classes[valid] = valid_classes
+        classes[~valid] = ENVELOPE_UNKNOWN
+        return classes
+
+    def to_dict(self):
+        return {'recommended': self.recommended.round(3).tolist(), 'allowed': self.allowed.round(3).tolist()}
+
+
+def compile_table1_envelopes(table1_id, db):
+    """
+    @return: CompiledEnvelopes of a Table1, custom areas first, then the defaults of its operation classes
+    """
+    table1 = Table1.objects.using(db).only(*ENVELOPE_FIELDS).get(id=table1_id)
+    recommended, recommended_limits = parse_polygon(table1.custom_recommended_operation_limit_area), None
+    if recommended is None:
+        recommended_limits = RECOMMENDED_OPERATION_ENVELOPES[table1.area_recommended_operation]
+        recommended = get_limits_polygon(recommended_limits)
+    allowed, allowed_limits = parse_polygon(table1.custom_allowed_operation_limit_area), None
+    if allowed is None:
+        allowed_limits = ALLOWED_OPERATION_ENVELOPES[table1.area_allowed_operation]
+        allowed = get_limits_polygon(allowed_limits)
+    return CompiledEnvelopes(recommended, allowed, recommended_limits, allowed_limits)
+
+
+def get_table1_envelopes(table1_id, db):
+    key = f'{db}:{table1_id}'
+    return envelope_cache.get(key, lambda: compile_table1_envelopes(table1_id, db))
+
+
+def invalidate_table1_envelopes(table1_id, db):
+    envelope_cache.invalidate(f'{db}:{table1_id}')
+
+
+def classify_readings(table1_id, db, temperatures, humidities):
+    """
+    Classify readings of a Table1 against its envelopes
+    @param temperatures: array of temperatures (°C)
+    @param humidities: array of relative humidities (%)
+    @return: int8 array of ENVELOPE_* classes
+    """
+    return get_table1_envelopes(table1_id, db).classify(temperatures, humidities)
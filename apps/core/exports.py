@@ -0,0 +1,179 @@
+"""
+    Streaming exports of the rows of a company as CSV or Parquet. Rows are read with a server side cursor and
+    written chunk by chunk, so the memory does not depend on the number of rows.
+
+    pyarrow is imported when a Parquet export starts
+"""
+import csv
+import datetime
+import io
+
+from django.db import models
+
+from apps.core.models import Event, Feedback, Data
+
+EXPORT_CSV = 'csv'
+EXPORT_PARQUET = 'parquet'
+
+EXPORT_CONTENT_TYPES = {
+    EXPORT_CSV: 'text/csv',
+    EXPORT_PARQUET: 'application/vnd.apache.parquet',
+}
+
+# rows fetched from the cursor (and written as a Parquet row group) at once
+EXPORT_CHUNK_SIZE = 5000
+
+EXPORTS = {
+    'events': (Event, ('id', 'table1_id', 'created_by', 'text', 'language', 'created_at', 'updated_at')),
+    'feedbacks': (Feedback, ('id', 'created_by', 'rating', 'type', 'comment', 'component', 'page', 'created_at',
+                             'updated_at')),
+    'sensors': (Data, ('id', 'mac_address', 'name', 'source', 'type', 'firmware_version', 'table1_id',
+                       'related_table1_id', 'related_table2_id', 'related_table3_id', 'x', 'y', 'z', 'created_at',
+                       'updated_at')),
+}
+
+
+def get_export_queryset(kind, db, time_filter=None):
+    """
+    @param kind: key of EXPORTS
+    @param db: company database
+    @param time_filter: Q on created_at (see apps.core.filters.get_time_filter)
+    @return: (queryset of tuples, field names)
+    """
+    model, fields = EXPORTS[kind]
+    queryset = model.objects.using(db).all()
+    if time_filter:
+        queryset = queryset.filter(time_filter)
+    return queryset.order_by('created_at', 'id').values_list(*fields), fields
+
+
+def iter_row_chunks(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Group the rows of a single server side cursor in lists. The exports keep their created_at order, unlike the
+    keyset iteration by primary key of utils.querysets.iter_chunks
+    """
+    chunk = []
+    for row in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+def stream_csv(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    @return: generator of CSV text, one piece per chunk of rows
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for chunk in iter_row_chunks(queryset, chunk_size):
+        writer.writerows([_csv_value(x) for x in row] for row in chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+class _ParquetSink:
+    """
+    Writable file that keeps the bytes until they are taken, so a Parquet file can be sent while it is written
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.buffer += data
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def get_arrow_type(field):
+    import pyarrow as pa
+
+    if isinstance(field, models.ForeignKey):
+        field = field.target_field
+    if isinstance(field, models.DateTimeField):
+        return pa.timestamp('us', tz='UTC')
+    if isinstance(field, models.DateField):
+        return pa.date32()
+    if isinstance(field, models.FloatField):
+        return pa.float64()
+    if isinstance(field, models.BooleanField):
+        return pa.bool_()
+    if isinstance(field, (models.IntegerField, models.AutoField)):
+        return pa.int64()
+    return pa.string()
+
+
+def get_arrow_schema(model, fields):
+    import pyarrow as pa
+
+    return pa.schema([(x, get_arrow_type(model._meta.get_field(x))) for x in fields])
+
+
+def stream_parquet(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    @return: generator of Parquet bytes, one row group per chunk of rows
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = get_arrow_schema(queryset.model, fields)
+    strings = [i for i, x in enumerate(schema.types) if x == pa.string()]
+    sink = _ParquetSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for chunk in iter_row_chunks(queryset, chunk_size):
+            columns = [list(x) for x in zip(*chunk)]
+            for i in strings:
+                # UUIDs and other non text values of text columns
+                columns[i] = [x if x is None or isinstance(x, str) else str(x) for x in columns[i]]
+            writer.write_table(pa.Table.from_arrays([pa.array(x, type=t) for x, t in zip(columns, schema.types)],
+                                                    schema=schema))
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+def stream_export(kind, db, export_format=EXPORT_CSV, time_filter=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    @param kind: key of EXPORTS
+    @param db: company database
+    @param export_format: EXPORT_CSV or EXPORT_PARQUET
+    @param time_filter: Q on created_at
+    @param chunk_size: rows per chunk
+    @return: generator of the file content
+    """
+    queryset, fields = get_export_queryset(kind, db, time_filter)
+    if export_format == EXPORT_PARQUET:
+        return stream_parquet(queryset, fields, chunk_size)
+    return stream_csv(queryset, fields, chunk_size)
@@ -1,5 +1,6 @@
 import datetime
 
+from django.db.models import Q
 from django.utils import timezone
 from rest_framework import filters
 from utils.helpers import convert_str_to_date
@@ -14,30 +15,40 @@ class Relatedtable1IDFilter(filters.BaseFilterBackend):
             return queryset
 
 
+def get_time_filter(params):
+    """
+    Filter of created_at from the time parameters: hrs (last hours), mins (last minutes) or
+    range (dd/mm/yyyy,dd/mm/yyyy)
+    @param params: query parameters
+    @return: Q, empty when there is no time parameter
+    """
+    hrs_filter = params.get('hrs', None)
+    if hrs_filter:
+        last_hrs = timezone.now() - datetime.timedelta(hours=int(hrs_filter))
+        return Q(created_at__gte=last_hrs)
+
+    mins_filter = params.get('mins', None)
+    if mins_filter:
+        last_mins = timezone.now() - datetime.timedelta(minutes=int(mins_filter))
+        return Q(created_at__gte=last_mins)
+
+    range_filter = params.get('range', None)
+    if range_filter:
+        splitted_range = range_filter.split(',')
+        start_date = convert_str_to_date(splitted_range[0])
+        end_date = convert_str_to_date(splitted_range[1])
+        return Q(created_at__date__range=[start_date, end_date])
+
+    return Q()
+
+
 class TimeFilter(filters.BaseFilterBackend):
 
     def filter_queryset(self, request, queryset, view):
         try:
-            hrs_filter = request.GET.get('hrs', None)
-            if hrs_filter:
-                last_hrs = timezone.now() - datetime.timedelta(hours=int(hrs_filter))
-                return queryset.filter(created_at__gte=last_hrs).distinct()
-
-            mins_filter = request.GET.get('mins', None)
-            if mins_filter:
-                last_mins = timezone.now() - datetime.timedelta(minutes=int(mins_filter))
-                return queryset.filter(created_at__gte=last_mins).distinct()
-
-            range_filter = request.GET.get('range', None)
-            if range_filter:
-                splitted_range = range_filter.split(',')
-                start_date = convert_str_to_date(splitted_range[0])
-                end_date = convert_str_to_date(splitted_range[1])
-                return queryset.filter(created_at__date__range=[start_date, end_date]).distinct()
-
-            return queryset
+            time_filter = get_time_filter(request.GET)
+            if not time_filter:
+                return queryset
+            return queryset.filter(time_filter).distinct()
         except Exception:
             return queryset
-
-
-
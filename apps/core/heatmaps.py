@@ -0,0 +1,240 @@
+"""
+    Heatmaps of a room: the floor is split in square_size cells and every cell is interpolated (IDW) from the
+    rollups of the room sensors.
+    The inverse distance weights of the cells to their HEATMAP_NEIGHBORS nearest sensors only depend on the layout, so
+    they are computed once per layout as a sparse matrix. Each grid keeps the IDW numerator and denominator of every
+    cell and only the columns of the sensors whose value changed are applied on update, the grid of a new bucket
+    starts from the grid of the previous bucket when it is still in memory.
+
+    numpy/scipy are imported when a heatmap is built, signals import this module at startup
+"""
+import math
+import threading
+from datetime import timedelta
+
+from django.db.models import Max
+
+from apps.core.models import Data, RelatedTable1, RelatedTable3, MeasurementRollup
+from apps.core.spatial import get_room_spatial_versions
+from utils.cache import VersionedLocalCache
+from utils.constants import IDW_DEFAULT_POWER
+
+# fields of a room that change its grid
+ROOM_HEATMAP_FIELDS = ('x_max', 'y_max', 'square_size')
+
+# cell side (cm) of rooms without square_size: a raised floor tile
+HEATMAP_DEFAULT_SQUARE_SIZE = 60
+# distance (m) used for the sensors placed on the center of a cell, their weight dominates the cell
+HEATMAP_MIN_DISTANCE = 1e-3
+# max cells of a grid
+HEATMAP_MAX_CELLS = 250000
+# sensors weighted in each cell, bounds the weights to cells x HEATMAP_NEIGHBORS (~48MB for the largest grid) however
+# many sensors the room has. The weight of the farther sensors is negligible with the default power
+HEATMAP_NEIGHBORS = 16
+
+heatmap_cache = VersionedLocalCache('core:heatmaps', max_entries=128)
+
+
+class HeatmapLayout:
+    """
+    Cells of a room and their inverse distance weights to its nearest sensors
+    """
+
+    def __init__(self, x_max, y_max, square_size, sensor_ids, sensor_points, racks, power=IDW_DEFAULT_POWER,
+                 neighbors=HEATMAP_NEIGHBORS):
+        """
+        @param x_max: room width (m)
+        @param y_max: room depth (m)
+        @param square_size: cell side (cm)
+        @param sensor_ids: Data ids
+        @param sensor_points: (N x 2) sensor positions (m)
+        @param racks: list of (x_center, y_center, x_size, y_size) in m, their cells are left empty
+        @param power: exponent of the distance
+        @param neighbors: sensors weighted in each cell, the cells whose neighbors have no value are nan
+        """
+        import numpy as np
+        from scipy.sparse import csc_matrix
+        from scipy.spatial import cKDTree
+
+        self.cell_size = (square_size or HEATMAP_DEFAULT_SQUARE_SIZE) / 100
+        self.columns = max(math.ceil((x_max or 0) / self.cell_size), 1)
+        self.rows = max(math.ceil((y_max or 0) / self.cell_size), 1)
+        if self.columns * self.rows > HEATMAP_MAX_CELLS:
+            raise ValueError(f'Heatmap of {self.rows} x {self.columns} cells is too large, increase square_size')
+
+        x = (np.arange(self.columns) + 0.5) * self.cell_size
+        y = (np.arange(self.rows) + 0.5) * self.cell_size
+        cx, cy = (v.ravel() for v in np.meshgrid(x, y))
+
+        self.empty = np.zeros(cx.shape, dtype=bool)
+        for x_center, y_center, x_size, y_size in racks:
+            self.empty |= (np.abs(cx - x_center) <= x_size / 2) & (np.abs(cy - y_center) <= y_size / 2)
+
+        points = np.asarray(sensor_points, dtype=float).reshape(-1, 2)
+        valid = np.all(np.isfinite(points), axis=1)
+        self.sensor_ids = [x for x, ok in zip(sensor_ids, valid) if ok]
+        self.sensor_columns = {x: i for i, x in enumerate(self.sensor_ids)}
+        points = points[valid]
+
+        # (cells x sensors) float64, CSC to take the columns of the changed sensors. The weights reach 1e6 near a sensor,
+        # float32 sums would leave residuals in the denominators when sensors are removed
+        k = min(neighbors, len(points))
+        if k:
+            distances, columns = cKDTree(points).query(np.column_stack((cx, cy)), k=k)
+            weights = np.maximum(distances.reshape(-1, k), HEATMAP_MIN_DISTANCE) ** -float(power)
+            self.weights = csc_matrix((weights.ravel(),
+                                       (np.repeat(np.arange(len(cx)), k), columns.reshape(-1, k).ravel())),
+                                      shape=(len(cx), len(points)))
+        else:
+            self.weights = csc_matrix((len(cx), 0), dtype=np.float64)
+
+    @property
+    def shape(self):
+        return self.rows, self.columns
+
+
+class HeatmapGrid:
+    """
+    Interpolated values of the cells of a layout for one bucket
+    """
+
+    def __init__(self, layout, previous=None):
+        """
+        @param layout: HeatmapLayout
+        @param previous: grid of the same layout (previous bucket) to start from, the next update only applies the
+        sensors whose value differs from it
+        """
+        import numpy as np
+
+        self.layout = layout
+        self._lock = threading.Lock()
+        if previous is not None and previous.layout is layout:
+            with previous._lock:
+                self.values = previous.values.copy()
+                self.numerator = previous.numerator.copy()
+                self.denominator = previous.denominator.copy()
+                self.counts = previous.counts.copy()
+        else:
+            self.values = np.full(len(layout.sensor_ids), np.nan)
+            self.numerator = np.zeros(layout.weights.shape[0])
+            self.denominator = np.zeros(layout.weights.shape[0])
+            # neighbors of each cell with a value, the cells without any are nan whatever the float residuals
+            self.counts = np.zeros(layout.weights.shape[0], dtype=np.int32)
+
+    def update(self, readings):
+        """
+        @param readings: dict sensor id -> value (None when the sensor has no value)
+        @return: number of sensors whose value changed
+        """
+        import numpy as np
+
+        columns = [self.layout.sensor_columns[x] for x in readings if x in self.layout.sensor_columns]
+        new = np.array([readings[self.layout.sensor_ids[i]] for i in columns], dtype=float)
+
+        with self._lock:
+            old = self.values[columns]
+            changed = ~((old == new) | (np.isnan(old) & np.isnan(new)))
+            columns, old, new = np.asarray(columns, dtype=int)[changed], old[changed], new[changed]
+            if not len(columns):
+                return 0
+
+            self.values[columns] = new
+            if 2 * len(columns) > len(self.values):
+                # cheaper (and exact) to start again
+                valid = np.flatnonzero(np.isfinite(self.values))
+                weights = self.layout.weights[:, valid]
+                self.numerator = weights @ self.values[valid]
+                self.denominator = np.asarray(weights.sum(axis=1, dtype=np.float64)).ravel()
+                self.counts = np.diff(weights.tocsr().indptr).astype(np.int32)
+            else:
+                weights = self.layout.weights[:, columns]
+                present = np.isfinite(new).astype(np.int32) - np.isfinite(old)
+                self.numerator += weights @ (np.nan_to_num(new) - np.nan_to_num(old))
+                self.denominator += weights @ present.astype(np.float64)
+                self.counts += (weights != 0).astype(np.int32) @ present
+                # drop the residuals of the cells left without neighbors
+                alone = self.counts == 0
+                self.numerator[alone] = 0
+                self.denominator[alone] = 0
+            return len(columns)
+
+    def to_array(self):
+        """
+        @return: (rows x columns) float32 array, nan on rack cells and when no sensor has a value
+        """
+        import numpy as np
+
+        with self._lock:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                grid = (self.numerator / self.denominator).astype(np.float32)
+            grid[self.counts == 0] = np.nan
+        grid[self.layout.empty] = np.nan
+        return grid.reshape(self.layout.shape)
+
+
+def _version_key(room_id, db):
+    return f'{db}:{room_id}'
+
+
+def build_room_heatmap_layout(room_id, db):
+    room = RelatedTable1.objects.using(db).only(*ROOM_HEATMAP_FIELDS).get(id=room_id)
+    sensors = list(Data.objects.using(db).filter(related_table1_id=room_id).values_list('id', 'x', 'y'))
+    racks = RelatedTable3.objects.using(db).filter(
+        related_table2__related_table1_id=room_id, x_center__isnull=False, y_center__isnull=False,
+        x_size__isnull=False, y_size__isnull=False).values_list('x_center', 'y_center', 'x_size', 'y_size')
+    nan = float('nan')
+    return HeatmapLayout(room.x_max, room.y_max, room.square_size, [x[0] for x in sensors],
+                         [(nan if x[1] is None else x[1], nan if x[2] is None else x[2]) for x in sensors],
+                         list(racks))
+
+
+def get_room_heatmap_layout(room_id, db):
+    version_key = _version_key(room_id, db)
+    key = (version_key, *get_room_spatial_versions(room_id, db))
+    return heatmap_cache.get(key, lambda: build_room_heatmap_layout(room_id, db), version_key=version_key)
+
+
+def get_latest_bucket(room_id, db, variable, resolution):
+    return MeasurementRollup.objects.using(db).filter(
+        sensor__related_table1_id=room_id, variable=variable, resolution=resolution).aggregate(x=Max('bucket'))['x']
+
+
+def get_room_heatmap(room_id, db, variable, resolution, bucket=None):
+    """
+    Heatmap of a room for a rollup bucket. The grid of the bucket is kept in memory and only the sensors whose
+    rollup changed since the last call are applied
+    @param room_id: related_table1 id
+    @param db: database
+    @param variable: MEASUREMENT_* variable
+    @param resolution: ROLLUP_* resolution
+    @param bucket: datetime, latest bucket of the room by default
+    @return: (HeatmapGrid, bucket), bucket is None when the room has no rollups
+    """
+    if bucket is None:
+        bucket = get_latest_bucket(room_id, db, variable, resolution)
+
+    version_key = _version_key(room_id, db)
+    key = (version_key, *get_room_spatial_versions(room_id, db), variable, resolution, bucket)
+
+    def build():
+        # consecutive buckets differ by the few sensors whose rollup changed
+        previous = None
+        if bucket is not None:
+            previous = heatmap_cache.peek((*key[:-1], bucket - timedelta(seconds=resolution)),
+                                          heatmap_cache.get_version(version_key))
+        return HeatmapGrid(get_room_heatmap_layout(room_id, db), previous)
+    grid = heatmap_cache.get(key, build, version_key=version_key)
+
+    if bucket is not None:
+        readings = dict.fromkeys(grid.layout.sensor_ids)
+        readings.update(MeasurementRollup.objects.using(db)
+                        .filter(sensor__related_table1_id=room_id, variable=variable, resolution=resolution,
+                                bucket=bucket)
+                        .values_list('sensor_id', 'mean'))
+        grid.update(readings)
+    return grid, bucket
+
+
+def invalidate_room_heatmaps(room_id, db):
+    if room_id:
+        heatmap_cache.invalidate(_version_key(room_id, db))
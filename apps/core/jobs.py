@@ -0,0 +1,391 @@
+"""
+    Background jobs (heavy calculations, dataframes) with pluggable execution backends:
+        database: pending jobs are claimed and run by the run_jobs command in a process pool
+        local: same process pool, started from the web worker as soon as the job is submitted
+        stepfunctions: the job is an execution of the AWS state machine of its kind
+    Every backend tracks the status in the Job table of the company, retries failed jobs with back off and
+    keeps at most JOBS_TENANT_CONCURRENCY jobs running per company.
+"""
+import datetime
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from apps.core.models import Job
+from apps.core.timeseries import refresh_rollups
+from code_setting.settings import (JOBS_BACKEND, JOBS_WORKERS, JOBS_TENANT_CONCURRENCY, JOBS_MAX_ATTEMPTS,
+                                   JOBS_RETRY_DELAY, JOBS_TIMEOUT, JOB_HANDLERS, JOB_STATE_MACHINES)
+from utils.constants import JOB_PENDING, JOB_RUNNING, JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELED
+
+logger = logging.getLogger(__name__)
+
+# lock serializing the claims of a company database (each company has its own database)
+JOBS_CLAIM_LOCK = 7407
+
+
+# # # # # STATUS # # # # #
+
+def claim_jobs(db, backend, limit=None):
+    """
+    Mark as running the pending jobs that can start now, without exceeding JOBS_TENANT_CONCURRENCY
+    @param db: company database
+    @param backend: name of the backend running them
+    @param limit: max jobs to claim
+    @return: list of claimed jobs
+    """
+    now = timezone.now()
+    jobs = Job.objects.using(db)
+    with transaction.atomic(using=db):
+        if connections[db].vendor == 'postgresql':
+            with connections[db].cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', [JOBS_CLAIM_LOCK])
+
+        free = JOBS_TENANT_CONCURRENCY - jobs.filter(status=JOB_RUNNING).count()
+        if limit is not None:
+            free = min(free, limit)
+        if free <= 0:
+            return []
+
+        claimed = list(jobs.select_for_update(skip_locked=True)
+                       .filter(status=JOB_PENDING, available_at__lte=now)
+                       .order_by('available_at')[:free])
+        jobs.filter(id__in=[x.id for x in claimed]).update(status=JOB_RUNNING, started_at=now, backend=backend,
+                                                           attempts=F('attempts') + 1, updated_at=now)
+    for job in claimed:
+        job.status, job.started_at, job.backend, job.attempts = JOB_RUNNING, now, backend, job.attempts + 1
+    return claimed
+
+
+def release_jobs(db, job_ids):
+    """
+    Give back claimed jobs that could not be started
+    """
+    Job.objects.using(db).filter(id__in=job_ids, status=JOB_RUNNING).update(
+        status=JOB_PENDING, attempts=F('attempts') - 1, started_at=None, updated_at=timezone.now())
+
+
+def finish_job(db, job_id, result=None):
+    # canceled jobs keep their status
+    now = timezone.now()
+    Job.objects.using(db).filter(id=job_id, status=JOB_RUNNING).update(status=JOB_SUCCEEDED, result=result,
+                                                                       error=None, finished_at=now, updated_at=now)
+
+
+def fail_job(db, job_id, error):
+    """
+    Retry a failed job later (JOBS_RETRY_DELAY doubled on each attempt) or mark it as failed
+    @return: seconds before the retry, None when the job failed for good (or was canceled meanwhile)
+    """
+    now = timezone.now()
+    job = Job.objects.using(db).only('attempts', 'max_attempts').get(id=job_id)
+    running = Job.objects.using(db).filter(id=job_id, status=JOB_RUNNING)
+    if job.attempts < job.max_attempts:
+        delay = JOBS_RETRY_DELAY * 2 ** max(job.attempts - 1, 0)
+        retried = running.update(status=JOB_PENDING, error=error, external_id=None, updated_at=now,
+                                 available_at=now + datetime.timedelta(seconds=delay))
+        return delay if retried else None
+
+    running.update(status=JOB_FAILED, error=error, finished_at=now, updated_at=now)
+    return None
+
+
+def recover_lost_jobs(db, backend, exclude=()):
+    """
+    Jobs of a backend running for longer than JOBS_TIMEOUT (e.g. their worker died) are retried or failed
+    @param exclude: ids of jobs known to be still running
+    @return: number of recovered jobs
+    """
+    lost = Job.objects.using(db).filter(status=JOB_RUNNING, backend=backend,
+                                        started_at__lt=timezone.now() - datetime.timedelta(seconds=JOBS_TIMEOUT))\
+        .exclude(id__in=list(exclude))
+    lost_ids = list(lost.values_list('id', flat=True))
+    for job_id in lost_ids:
+        fail_job(db, job_id, f'Job timed out after {JOBS_TIMEOUT} s')
+    return len(lost_ids)
+
+
+# # # # # EXECUTION # # # # #
+
+def setup_job_worker():
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'code_setting.settings')
+    django.setup()
+
+
+def execute_job(db, job_id):
+    """
+    Run a claimed job with its handler (JOB_HANDLERS) and store the result. Runs in the worker processes
+    @return: seconds before the retry when it failed and will be retried, else None
+    """
+    from code_setting.middleware import db_ctx
+    from code_setting.tenants import tenant_registry
+
+    tenant_registry.activate(db)
+    db_ctx.set(db)
+    try:
+        job = Job.objects.using(db).get(id=job_id)
+        try:
+            handler = import_string(JOB_HANDLERS[job.kind])
+            result = handler(db, **(job.payload or {}))
+            json.dumps(result)
+        except Exception:
+            logger.exception('Job %s of %s failed', job_id, db)
+            return fail_job(db, job_id, traceback.format_exc(limit=20))
+
+        finish_job(db, job_id, result)
+        return None
+    finally:
+        connections.close_all()
+
+
+class ProcessPoolJobRunner:
+    """
+    Run the claimed jobs in a pool of spawned processes (no database connection is inherited)
+    """
+    name = 'database'
+
+    def __init__(self, workers=JOBS_WORKERS):
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+        # (db, job id) -> future of the jobs submitted by this runner and not done yet
+        self._running = {}
+
+    def get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'),
+                                                     initializer=setup_job_worker)
+            return self._executor
+
+    def _reset_executor(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def dispatch(self, db):
+        """
+        Start the pending jobs of a company that fit in its concurrency limit
+        @return: number of started jobs
+        """
+        claimed = claim_jobs(db, self.name)
+        for i, job in enumerate(claimed):
+            try:
+                try:
+                    future = self.get_executor().submit(execute_job, db, str(job.id))
+                except BrokenProcessPool:
+                    self._reset_executor()
+                    future = self.get_executor().submit(execute_job, db, str(job.id))
+            except Exception:
+                # e.g. the pool is shutting down: leave the jobs for the next dispatch
+                release_jobs(db, [x.id for x in claimed[i:]])
+                raise
+            with self._lock:
+                self._running[(db, job.id)] = future
+            future.add_done_callback(lambda x, db=db, job_id=job.id: self._done(db, job_id, x))
+        return len(claimed)
+
+    def _done(self, db, job_id, future):
+        with self._lock:
+            self._running.pop((db, job_id), None)
+        try:
+            retry_in = future.result()
+        except Exception as ex:
+            # the worker died before storing the status
+            if isinstance(ex, BrokenProcessPool):
+                self._reset_executor()
+            try:
+                retry_in = fail_job(db, job_id, f'Worker failed: {ex}')
+            except Exception:
+                logger.exception('Job %s of %s can not be updated', job_id, db)
+                retry_in = None
+            finally:
+                connections.close_all()
+
+        if retry_in is not None:
+            timer = threading.Timer(retry_in, self._dispatch_in_thread, args=(db, ))
+            timer.daemon = True
+            timer.start()
+        self._dispatch_in_thread(db)
+
+    def _dispatch_in_thread(self, db):
+        # callbacks and timers run in their own threads, give their connections back when done
+        try:
+            self.dispatch(db)
+        except Exception:
+            logger.exception('Jobs dispatch of %s failed', db)
+        finally:
+            connections.close_all()
+
+    def get_running(self, db):
+        """
+        @return: ids of the jobs of a company still running in this pool
+        """
+        with self._lock:
+            return [job_id for (job_db, job_id), future in self._running.items()
+                    if job_db == db and not future.done()]
+
+    def sync(self, db):
+        # jobs longer than JOBS_TIMEOUT still running in this pool are not lost
+        return recover_lost_jobs(db, self.name, exclude=self.get_running(db))
+
+    def submit(self, job):
+        pass
+
+    def stop(self, db, job):
+        # a job running in a worker process can not be interrupted
+        return False
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+
+
+class LocalJobBackend(ProcessPoolJobRunner):
+    name = 'local'
+
+    def submit(self, job):
+        self.dispatch(job._state.db)
+
+
+class StepFunctionsJobBackend:
+    """
+    Jobs executed by the state machine of their kind (JOB_STATE_MACHINES). The input of the execution is
+    {job_id, db, kind, payload}, its output is stored as the job result
+    """
+    name = 'stepfunctions'
+    FAILED_STATUSES = ('FAILED', 'TIMED_OUT', 'ABORTED')
+
+    @staticmethod
+    def get_client():
+        from utils.aws import get_stepfunctions_client
+        return get_stepfunctions_client()
+
+    def dispatch(self, db):
+        claimed = claim_jobs(db, self.name)
+        for job in claimed:
+            try:
+                execution = self.get_client().start_execution(
+                    stateMachineArn=JOB_STATE_MACHINES[job.kind],
+                    name=f'{db}-{job.id}-{job.attempts}',
+                    input=json.dumps({'job_id': str(job.id), 'db': db, 'kind': job.kind, 'payload': job.payload}))
+            except Exception as ex:
+                fail_job(db, job.id, f'Execution not started: {ex}')
+                continue
+            Job.objects.using(db).filter(id=job.id).update(external_id=execution['executionArn'])
+        return len(claimed)
+
+    def sync(self, db):
+        """
+        Update the running jobs with the status of their executions, executions still running are not retried
+        even after JOBS_TIMEOUT (the state machine has its own timeouts)
+        @return: number of finished jobs
+        """
+        finished = 0
+        still_running = []
+        running = Job.objects.using(db).filter(status=JOB_RUNNING, backend=self.name, external_id__isnull=False)
+        for job_id, execution_arn in running.values_list('id', 'external_id'):
+            execution = self.get_client().describe_execution(executionArn=execution_arn)
+            if execution['status'] == 'SUCCEEDED':
+                finish_job(db, job_id, json.loads(execution.get('output') or 'null'))
+            elif execution['status'] in self.FAILED_STATUSES:
+                fail_job(db, job_id, f"Execution {execution['status']}: {execution.get('error', '')} "
+                                     f"{execution.get('cause', '')}".strip())
+            else:
+                still_running.append(job_id)
+                continue
+            finished += 1
+        return finished + recover_lost_jobs(db, self.name, exclude=still_running)
+
+    def submit(self, job):
+        self.dispatch(job._state.db)
+
+    def stop(self, db, job):
+        if not job.external_id:
+            return False
+        self.get_client().stop_execution(executionArn=job.external_id, cause='Job canceled')
+        return True
+
+
+JOB_BACKENDS = {
+    ProcessPoolJobRunner.name: ProcessPoolJobRunner,
+    LocalJobBackend.name: LocalJobBackend,
+    StepFunctionsJobBackend.name: StepFunctionsJobBackend,
+}
+
+_backend = None
+
+
+def get_job_backend():
+    global _backend
+    if _backend is None:
+        _backend = JOB_BACKENDS[JOBS_BACKEND]()
+    return _backend
+
+
+def cancel_job(db, job_id):
+    """
+    Cancel a pending job, or a running one when its backend can stop it (stepfunctions)
+    @param db: company database
+    @param job_id: Job id
+    @return: True when the job was canceled
+    """
+    now = timezone.now()
+    jobs = Job.objects.using(db)
+    if jobs.filter(id=job_id, status=JOB_PENDING).update(status=JOB_CANCELED, finished_at=now, updated_at=now):
+        return True
+
+    job = jobs.filter(id=job_id, status=JOB_RUNNING).first()
+    if job is None or job.backend not in JOB_BACKENDS or not JOB_BACKENDS[job.backend]().stop(db, job):
+        return False
+    return bool(jobs.filter(id=job_id, status=JOB_RUNNING).update(status=JOB_CANCELED, finished_at=now,
+                                                                  updated_at=now))
+
+
+def get_job_kinds():
+    return sorted(JOB_STATE_MACHINES if JOBS_BACKEND == StepFunctionsJobBackend.name else JOB_HANDLERS)
+
+
+def submit_job(kind, db, payload=None, max_attempts=JOBS_MAX_ATTEMPTS, created_by=None):
+    """
+    Create a job and hand it to the configured backend
+    @param kind: key of JOB_HANDLERS (or JOB_STATE_MACHINES with the stepfunctions backend)
+    @param db: company database
+    @param payload: JSON serializable keyword arguments of the handler
+    @param max_attempts: runs before the job fails for good
+    @param created_by: user email
+    @return: Job
+    """
+    if kind not in get_job_kinds():
+        raise ValueError(f'Unknown job kind {kind}, must be one of {", ".join(get_job_kinds())}')
+
+    now = timezone.now()
+    job = Job(kind=kind, payload=payload or {}, max_attempts=max(max_attempts, 1), available_at=now,
+              created_by=created_by, created_at=now, updated_at=now)
+    job.save(using=db)
+    transaction.on_commit(lambda: get_job_backend().submit(job), using=db)
+    return job
+
+
+# # # # # HANDLERS # # # # #
+
+def refresh_rollups_job(db, minutes=120):
+    """
+    Refresh the measurement rollups of the last minutes
+    """
+    end = timezone.now()
+    refresh_rollups(db, end - datetime.timedelta(minutes=minutes), end)
+    return {'start': (end - datetime.timedelta(minutes=minutes)).isoformat(), 'end': end.isoformat()}
@@ -0,0 +1,92 @@
+import time
+import tracemalloc
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from code_setting.tenants import get_tenant_databases
+from utils.querysets import iter_chunks, load_columns, bulk_update_values, merge_calculation_vars
+
+
+class Command(BaseCommand):
+    help = 'Measure memory and throughput of the data access helpers (utils.querysets) against plain querysets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=None, help='Company database (default: the first one)')
+        parser.add_argument('--model', default='core.Data', help='Model to read (app_label.Model)')
+        parser.add_argument('--fields', default='x,y,z', help='Fields loaded as columns')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--writes', type=int, default=2000,
+                            help='Rows updated by the write benchmarks, rolled back afterwards (0 to skip)')
+
+    def measure(self, name, func, memory=True):
+        """
+        Time a run of func, then run it again under tracemalloc for its peak memory (tracing slows it down)
+        """
+        start = time.perf_counter()
+        rows = func()
+        seconds = time.perf_counter() - start
+        line = f'{name:<28} {rows:>9} rows {seconds * 1000:>10.1f} ms {rows / max(seconds, 1e-9):>12.0f} rows/s'
+
+        if memory:
+            tracemalloc.start()
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            line += f' {peak / 2 ** 20:>8.1f} MiB peak'
+        self.stdout.write(line)
+
+    def handle(self, *args, **options):
+        import numpy as np
+
+        databases = get_tenant_databases([options['database']] if options['database'] else None)
+        if not databases:
+            raise CommandError('No company database')
+        db = databases[0]
+        try:
+            model = apps.get_model(options['model'])
+        except (LookupError, ValueError) as ex:
+            raise CommandError(ex)
+        fields = [x for x in options['fields'].split(',') if x]
+        chunk_size = options['chunk_size']
+        queryset = model.objects.using(db).all()
+        self.stdout.write(f'database {db}, {model._meta.label}, fields {", ".join(fields)}')
+
+        # queryset.all(): a fresh clone for every run, the result cache of queryset is never filled
+        self.measure('list(queryset)', lambda: len(list(queryset.all())))
+        self.measure('queryset.iterator()', lambda: sum(1 for _ in queryset.iterator(chunk_size=chunk_size)))
+        self.measure('iter_chunks (instances)', lambda: sum(len(x) for x in iter_chunks(queryset, chunk_size)))
+        self.measure('iter_chunks (values)',
+                     lambda: sum(len(x) for x in iter_chunks(queryset, chunk_size, fields=fields)))
+
+        def instances_to_numpy():
+            objs = list(queryset.all())
+            columns = {x: np.array([getattr(obj, x) for obj in objs]) for x in fields}
+            return len(next(iter(columns.values()))) if columns else len(objs)
+
+        def columns_to_numpy():
+            columns = load_columns(queryset, fields, chunk_size=chunk_size)
+            return len(next(iter(columns.values()))) if columns else 0
+
+        self.measure('instances -> numpy', instances_to_numpy)
+        self.measure('load_columns', columns_to_numpy)
+
+        if not options['writes']:
+            return
+        pks = list(queryset.values_list('pk', flat=True)[:options['writes']])
+        values = {pk: {'calculation_vars': {'benchmark': i}} for i, pk in enumerate(pks)}
+
+        def save_each():
+            for obj in model.objects.using(db).filter(pk__in=pks):
+                obj.calculation_vars = {**(obj.calculation_vars or {}), 'benchmark': 0}
+                obj.save(using=db, update_fields=['calculation_vars'])
+            return len(pks)
+
+        for name, func in (('save() per row', save_each),
+                           ('bulk_update_values', lambda: bulk_update_values(model, db, values)),
+                           ('merge_calculation_vars', lambda: merge_calculation_vars(
+                               model, db, {k: v['calculation_vars'] for k, v in values.items()}))):
+            with transaction.atomic(using=db):
+                self.measure(name, func, memory=False)
+                transaction.set_rollback(True, using=db)
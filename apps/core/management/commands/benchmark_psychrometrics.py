@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Compare the vectorized psychrometrics (utils.psychrometrics) with per-scalar PsychroLib calls'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--states', type=int, default=100000, help='Number of states')
+        parser.add_argument('--distinct', type=int, default=None,
+                            help='Number of distinct states (default: all distinct)')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        import numpy as np
+        import psychrolib
+
+        from utils.psychrometrics import psychrometrics
+
+        psychrolib.SetUnitSystem(psychrolib.SI)
+        rng = np.random.default_rng(options['seed'])
+        n = options['states']
+        distinct = options['distinct'] or n
+        # sensor like readings: temperature with 0.1 °C and humidity with 0.1 % resolution
+        states = rng.integers(0, distinct, n)
+        temperature = np.round(rng.uniform(15, 45, distinct), 1)[states]
+        humidity = np.round(rng.uniform(0.2, 0.8, distinct), 3)[states]
+        pressure = 101325.
+
+        start = time.perf_counter()
+        vectorized = psychrometrics(temperature, humidity, pressure)
+        vectorized_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        dew_points, enthalpies = np.empty(n), np.empty(n)
+        for i in range(n):
+            vapor_pressure = psychrolib.GetVapPresFromRelHum(temperature[i], humidity[i])
+            humidity_ratio = psychrolib.GetHumRatioFromVapPres(vapor_pressure, pressure)
+            dew_points[i] = psychrolib.GetTDewPointFromVapPres(temperature[i], vapor_pressure)
+            enthalpies[i] = psychrolib.GetMoistAirEnthalpy(temperature[i], humidity_ratio)
+            psychrolib.GetMoistAirVolume(temperature[i], humidity_ratio, pressure)
+        scalar_seconds = time.perf_counter() - start
+
+        dew_point_error = float(np.max(np.abs(vectorized['dew_point'] - dew_points)))
+        enthalpy_error = float(np.max(np.abs(vectorized['enthalpy'] - enthalpies)))
+        self.stdout.write(f'{n} states ({len(np.unique(np.column_stack((temperature, humidity)), axis=0))} distinct)')
+        self.stdout.write(f'psychrolib per scalar: {scalar_seconds * 1000:.1f} ms')
+        self.stdout.write(f'vectorized:            {vectorized_seconds * 1000:.1f} ms '
+                          f'({scalar_seconds / vectorized_seconds:.0f}x)')
+        self.stdout.write(f'max error: dew point {dew_point_error:.2e} °C, enthalpy {enthalpy_error:.2e} J/kg')
+        if dew_point_error > 1e-6 or enthalpy_error > 1e-6:
+            raise CommandError('the vectorized results differ from PsychroLib')
@@ -0,0 +1,62 @@
+import timeit
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import router
+from django.test import RequestFactory
+from django.urls import set_script_prefix
+
+from code_setting.middleware import WhichDatabaseToUseMIddleware, db_ctx
+from code_setting.tenants import get_tenant_databases
+
+
+class Command(BaseCommand):
+    help = 'Measure the per-query overhead of the database routers and the per-request cost of the tenant middleware'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=None, help='Company database (default: the first one)')
+        parser.add_argument('--number', type=int, default=100000, help='Calls per measure')
+
+    def report(self, name, func, number):
+        seconds = min(timeit.repeat(func, number=number, repeat=3))
+        self.stdout.write(f'{name:<40} {seconds / number * 1e9:>10.0f} ns/call')
+
+    def handle(self, *args, **options):
+        databases = get_tenant_databases([options['database']] if options['database'] else None)
+        db = databases[0] if databases else 'default'
+        number = options['number']
+        core_models = list(apps.get_app_config('core').get_models())
+        other_model = apps.get_model('contenttypes', 'ContentType')
+
+        db_ctx.set(db)
+        self.stdout.write(f'database {db}, {number} calls per measure')
+        self.report('db_for_read (company model)', lambda: router.db_for_read(core_models[0]), number)
+        self.report('db_for_write (company model)', lambda: router.db_for_write(core_models[0]), number)
+        self.report('db_for_read (other model)', lambda: router.db_for_read(other_model), number)
+        self.report('allow_migrate (company model)',
+                    lambda: router.allow_migrate(db, 'core', model_name=core_models[0]._meta.model_name), number)
+
+        factory = RequestFactory()
+        company_request = factory.get(f'/{db}/core/table/')
+        master_request = factory.get('/auth/token/')
+        middleware = WhichDatabaseToUseMIddleware(lambda request: None)
+
+        def reset(request, path):
+            # every call starts as a new request: the middleware appends the company to the script prefix
+            set_script_prefix('/')
+            db_ctx.set('default')
+            request.path_info = path
+
+        def resolve(request, path):
+            reset(request, path)
+            middleware.process_request(request)
+
+        try:
+            self.report('request reset (included below)', lambda: reset(company_request, f'/{db}/core/table/'),
+                        number // 10)
+            self.report('middleware (company path)', lambda: resolve(company_request, f'/{db}/core/table/'),
+                        number // 10)
+            self.report('middleware (master path)', lambda: resolve(master_request, '/auth/token/'), number // 10)
+        finally:
+            set_script_prefix('/')
+            db_ctx.set(db)
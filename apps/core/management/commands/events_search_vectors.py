@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.models import Event
+from apps.core.search import update_event_search_vectors
+from code_setting.tenants import get_tenant_databases
+
+
+class Command(BaseCommand):
+    help = 'Store the search vector of the events that do not have one yet (or of all of them with --all)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', action='append', dest='databases',
+                            help='Company database, all of them by default')
+        parser.add_argument('--all', action='store_true', help='Rebuild every search vector')
+
+    def handle(self, *args, **options):
+        for db in get_tenant_databases(options['databases']):
+            events = Event.objects.using(db).all()
+            if not options['all']:
+                events = events.filter(search_vector__isnull=True)
+            self.stdout.write(f'{db}: {update_event_search_vectors(events)} events updated')
@@ -0,0 +1,43 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.core.models import MeasurementRollup
+from apps.core.timeseries import (create_measurement_table, ensure_measurement_partitions, refresh_rollups,
+                                  drop_measurement_partitions)
+from code_setting.settings import (MEASUREMENTS_RETENTION_DAYS, MEASUREMENTS_PARTITIONS_AHEAD_DAYS)
+from code_setting.tenants import get_tenant_databases
+from utils.constants import ROLLUP_1_MIN
+
+
+class Command(BaseCommand):
+    help = 'Create the next measurement partitions, refresh the rollups and drop the partitions out of retention'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', action='append', dest='databases',
+                            help='Company database, all of them by default')
+        parser.add_argument('--rollup-minutes', type=int, default=120,
+                            help='Refresh the rollups of the last minutes')
+        parser.add_argument('--retention-days', type=int, default=MEASUREMENTS_RETENTION_DAYS,
+                            help='Days of raw readings to keep')
+        parser.add_argument('--rollup-1min-retention-days', type=int, default=7,
+                            help='Days of 1 min rollups to keep')
+        parser.add_argument('--ahead-days', type=int, default=MEASUREMENTS_PARTITIONS_AHEAD_DAYS,
+                            help='Days of partitions to create in advance')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+
+        for db in get_tenant_databases(options['databases']):
+            create_measurement_table(db)
+            ensure_measurement_partitions(db, now, now + datetime.timedelta(days=options['ahead_days']))
+            refresh_rollups(db, now - datetime.timedelta(minutes=options['rollup_minutes']), now)
+
+            dropped = drop_measurement_partitions(db, now - datetime.timedelta(days=options['retention_days']))
+            deleted, _ = MeasurementRollup.objects.using(db).filter(
+                resolution=ROLLUP_1_MIN,
+                bucket__lt=now - datetime.timedelta(days=options['rollup_1min_retention_days'])
+            ).delete()
+
+            self.stdout.write(f'{db}: {len(dropped)} partitions dropped, {deleted} 1 min rollups deleted')
@@ -0,0 +1,71 @@
+import os
+import re
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from code_setting.settings import BASE_DIR
+
+# modules that must not be imported to boot a worker (they are imported by the code that uses them)
+DEFERRED_MODULES = ('numpy', 'scipy', 'pandas', 'matplotlib', 'psychrochart', 'psychrolib', 'PIL', 'boto3',
+                    'pyarrow')
+
+IMPORT_TIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)')
+
+
+def parse_import_times(stderr):
+    """
+    @param stderr: output of python -X importtime
+    @return: list of (module, self us, cumulative us, depth)
+    """
+    imports = []
+    for line in stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            imports.append((match.group(4), int(match.group(1)), int(match.group(2)), (len(match.group(3)) - 1) // 2))
+    return imports
+
+
+class Command(BaseCommand):
+    help = 'Profile the imports needed to boot a worker (python -X importtime) and check them against a budget'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--statement', default='import code_setting.wsgi',
+                            help='Python code profiled in a new interpreter')
+        parser.add_argument('--urls', action='store_true', help='Also load the url patterns (first request)')
+        parser.add_argument('--top', type=int, default=20, help='Slowest imports reported')
+        parser.add_argument('--budget-ms', type=float, default=None,
+                            help='Fail when the total import time is bigger')
+        parser.add_argument('--allow', action='append', default=[],
+                            help='Deferred module allowed to be imported (see DEFERRED_MODULES)')
+
+    def handle(self, *args, **options):
+        statement = options['statement']
+        if options['urls']:
+            statement += '; from django.urls import get_resolver; get_resolver().url_patterns'
+
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE',
+                                                                      'code_setting.settings')}
+        process = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], cwd=BASE_DIR, env=env,
+                                 capture_output=True, text=True)
+        imports = parse_import_times(process.stderr)
+        if process.returncode:
+            errors = '\n'.join(x for x in process.stderr.splitlines() if not x.startswith('import time:'))
+            raise CommandError(f'{statement} failed:\n{errors}')
+
+        total = sum(x[2] for x in imports if x[3] == 0)
+        self.stdout.write(f'{len(imports)} modules imported in {total / 1000:.1f} ms ({statement})')
+        self.stdout.write(f'{"cumulative ms":>14} {"self ms":>9}  module')
+        for module, self_us, cumulative_us, depth in sorted(imports, key=lambda x: -x[2])[:options['top']]:
+            self.stdout.write(f'{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {module}')
+
+        errors = []
+        imported = {x[0].split('.')[0] for x in imports}
+        deferred = sorted(x for x in DEFERRED_MODULES if x in imported and x not in options['allow'])
+        if deferred:
+            errors.append(f'deferred modules imported at startup: {", ".join(deferred)}')
+        if options['budget_ms'] is not None and total / 1000 > options['budget_ms']:
+            errors.append(f'import time {total / 1000:.1f} ms is over the budget of {options["budget_ms"]} ms')
+        if errors:
+            raise CommandError('; '.join(errors))
@@ -0,0 +1,39 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.core.row_medians import refresh_row_medians, check_row_medians
+from code_setting.tenants import get_tenant_databases
+
+
+class Command(BaseCommand):
+    help = 'Refresh the row medians from the readings of the kept windows, or check their accuracy'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', action='append', dest='databases',
+                            help='Company database, all of them by default')
+        parser.add_argument('--check', action='store_true',
+                            help='Compare the sketches with the exact Median of the last minutes')
+        parser.add_argument('--minutes', type=int, default=15,
+                            help='Minutes of readings used by --check')
+        parser.add_argument('--tolerance', type=float, default=None,
+                            help='With --check, fail when an error is bigger')
+
+    def handle(self, *args, **options):
+        for db in get_tenant_databases(options['databases']):
+            if not options['check']:
+                self.stdout.write(f'{db}: {refresh_row_medians(db)} rows updated')
+                continue
+
+            end = timezone.now()
+            report = check_row_medians(db, end - datetime.timedelta(minutes=options['minutes']), end)
+            errors = [x['error'] for x in report if x['error'] is not None]
+            self.stdout.write(f'{db}: {len(report)} medians, '
+                              f'max error {max(errors, default=0):.4f}, '
+                              f'mean error {sum(errors) / len(errors) if errors else 0:.4f}')
+            for item in report[:10]:
+                self.stdout.write(f"  {item['row']} {item['field']}: sketch {item['sketch']} exact {item['exact']}")
+
+            if options['tolerance'] is not None and max(errors, default=0) > options['tolerance']:
+                raise SystemExit(1)
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from apps.core.jobs import get_job_backend
+from code_setting.tenants import get_tenant_databases
+
+
+class Command(BaseCommand):
+    help = 'Run the pending jobs of the companies (database backend) or sync them with their external executions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', action='append', dest='databases',
+                            help='Company database, all of them by default')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls')
+        parser.add_argument('--once', action='store_true', help='Poll once and wait for the started jobs')
+
+    def handle(self, *args, **options):
+        backend = get_job_backend()
+        self.stdout.write(f'Running jobs with the {backend.name} backend')
+        try:
+            while True:
+                for db in get_tenant_databases(options['databases']):
+                    recovered = backend.sync(db)
+                    started = backend.dispatch(db)
+                    if recovered or started:
+                        self.stdout.write(f'{db}: {started} jobs started, {recovered} updated')
+                connections.close_all()
+
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if hasattr(backend, 'shutdown'):
+                backend.shutdown(wait=True)
@@ -1,6 +1,11 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
-from utils.constants import (CHOISES_CLASSES, CHOISE_0, CHOISE_1)
+from code_setting.settings import LANGUAGES, LANGUAGE_EN
+
+from utils.constants import (CHOISES_CLASSES, CHOISE_0, CHOISE_1, MEASUREMENT_VARIABLES, ROLLUP_RESOLUTIONS,
+                             JOB_STATUSES, JOB_PENDING)
 from utils.helpers import (BaseModel)
 
 
@@ -118,6 +123,10 @@ class Data(BaseModel):
     firmware_version = models.CharField(max_length=32, blank=True, null=True)
 
     # Location
+    table1 = models.ForeignKey(Table1, blank=True, null=True, on_delete=models.SET_NULL)
+    related_table1 = models.ForeignKey(RelatedTable1, blank=True, null=True, on_delete=models.SET_NULL)
+    related_table2 = models.ForeignKey(RelatedTable2, blank=True, null=True, on_delete=models.SET_NULL)
+    related_table3 = models.ForeignKey(RelatedTable3, blank=True, null=True, on_delete=models.SET_NULL)
     x = models.FloatField(blank=True, null=True)
     y = models.FloatField(blank=True, null=True)
     z = models.FloatField(blank=True, null=True)
@@ -133,6 +142,51 @@ class Data(BaseModel):
                            ('mesh', 'unicast_address'))
 
 
+class Measurement(models.Model):
+    """
+    Raw sensor readings. The table is range partitioned by day on timestamp and it is created and maintained
+    by apps.core.timeseries, not by migrations.
+    """
+    id = models.BigAutoField(primary_key=True)
+    sensor = models.ForeignKey(Data, on_delete=models.DO_NOTHING, db_constraint=False)
+    timestamp = models.DateTimeField()
+    temperature = models.FloatField(blank=True, null=True)
+    humidity = models.FloatField(blank=True, null=True)
+    pressure = models.FloatField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.sensor_id} - {self.timestamp}"
+
+    class Meta:
+        verbose_name = 'Measurement'
+        verbose_name_plural = 'Measurements'
+        db_table = 'core_measurements'
+        managed = False
+
+
+class MeasurementRollup(models.Model):
+    id = models.BigAutoField(primary_key=True)
+    sensor = models.ForeignKey(Data, on_delete=models.CASCADE)
+    resolution = models.PositiveIntegerField(choices=ROLLUP_RESOLUTIONS)
+    variable = models.PositiveSmallIntegerField(choices=MEASUREMENT_VARIABLES)
+    bucket = models.DateTimeField()
+    count = models.PositiveIntegerField()
+    minimum = models.FloatField()
+    maximum = models.FloatField()
+    mean = models.FloatField()
+    median = models.FloatField()
+
+    def __str__(self):
+        return f"{self.sensor_id} - {self.get_variable_display()} ({self.get_resolution_display()}) {self.bucket}"
+
+    class Meta:
+        verbose_name = 'Measurement Rollup'
+        verbose_name_plural = 'Measurement Rollups'
+        db_table = 'core_measurement_rollups'
+        unique_together = ('sensor', 'resolution', 'variable', 'bucket')
+        indexes = [models.Index(fields=['resolution', 'bucket'])]
+
+
 class ConfigurationVariable(BaseModel):
     element = models.PositiveSmallIntegerField(choices=CHOISES_CLASSES, blank=True, null=True)
     name = models.CharField(max_length=100, unique=True)
@@ -166,12 +220,16 @@ class Feedback(BaseModel):
         verbose_name_plural = 'Feedbacks'
         db_table = 'core_feedbacks'
         ordering = ('-created_at', )
+        indexes = [models.Index(fields=['created_at', 'id'], name='core_feedbacks_keyset')]
 
 
 class Event(BaseModel):
     created_by = models.CharField(max_length=255, blank=True, null=True)
     table1 = models.ForeignKey(Table1, blank=True, null=True, on_delete=models.CASCADE)
     text = models.TextField(blank=True, null=True)
+    language = models.CharField(max_length=2, choices=LANGUAGES, default=LANGUAGE_EN)
+    # kept up to date by apps.core.search on every save
+    search_vector = SearchVectorField(blank=True, null=True, editable=False)
 
     def __str__(self):
         return f"{self.id}({self.created_by})"
@@ -181,6 +239,9 @@ class Event(BaseModel):
         verbose_name_plural = 'Events'
         db_table = 'core_events'
         ordering = ('-created_at', )
+        indexes = [models.Index(fields=['created_at', 'id'], name='core_events_keyset'),
+                   GinIndex(fields=['search_vector'], name='core_events_search'),
+                   GinIndex(fields=['text'], name='core_events_text_trgm', opclasses=['gin_trgm_ops'])]
 
 
 class Files(BaseModel):
@@ -195,3 +256,31 @@ class Files(BaseModel):
         verbose_name_plural = 'Files'
         db_table = 'files'
         ordering = ('type', )
+
+
+class Job(BaseModel):
+    kind = models.CharField(max_length=50)
+    status = models.PositiveSmallIntegerField(choices=JOB_STATUSES, default=JOB_PENDING)
+    payload = models.JSONField(blank=True, null=True)
+    result = models.JSONField(blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=1)
+    # pending jobs are not run before this date (retries back off)
+    available_at = models.DateTimeField(blank=True, null=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    backend = models.CharField(max_length=20, blank=True, null=True)
+    # execution of the job in an external service (e.g. Step Functions execution ARN)
+    external_id = models.CharField(max_length=255, blank=True, null=True)
+    created_by = models.CharField(max_length=255, blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.kind}({self.id})"
+
+    class Meta:
+        verbose_name = 'Job'
+        verbose_name_plural = 'Jobs'
+        db_table = 'core_jobs'
+        ordering = ('-created_at', )
+        indexes = [models.Index(fields=['status', 'available_at'], name='core_jobs_queue')]
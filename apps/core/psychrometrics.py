@@ -0,0 +1,69 @@
+"""
+    Psychrometric state of the rows of a room
+"""
+from apps.core.models import RelatedTable2, MeasurementRollup
+from apps.core.row_medians import ROW_MEDIAN_FIELDS
+from apps.core.site_model import SITE_ROW_SIDES, get_site_model
+from utils.constants import MEASUREMENT_HUMIDITY, ROLLUP_15_MIN
+
+
+def get_latest_humidities(sensor_ids, db, resolution=ROLLUP_15_MIN):
+    """
+    @return: dict sensor id -> median humidity (%) of its latest rollup
+    """
+    return dict(MeasurementRollup.objects.using(db)
+                .filter(sensor_id__in=sensor_ids, resolution=resolution, variable=MEASUREMENT_HUMIDITY)
+                .order_by('sensor_id', '-bucket')
+                .distinct('sensor_id')
+                .values_list('sensor_id', 'median'))
+
+
+def get_room_psychrometrics(room_id, db, pressure=None, resolution=ROLLUP_15_MIN):
+    """
+    Psychrometric properties of the cold and hot aisle of every row of a room, all computed in one vectorized call.
+    The temperature of an aisle is its row median, its humidity the median of the latest rollups of its sensors
+    @param room_id: related_table1 id
+    @param db: database
+    @param pressure: atmospheric pressure (Pa), standard sea level pressure by default
+    @param resolution: rollup resolution of the humidities
+    @return: list of {row, name, side, temperature, humidity, vapor_pressure, humidity_ratio, dew_point, enthalpy,
+             volume, density}
+    """
+    import numpy as np
+    from utils.psychrometrics import STANDARD_PRESSURE, PSYCHROMETRIC_FIELDS, psychrometrics
+
+    rows = list(RelatedTable2.objects.using(db).filter(related_table1_id=room_id)
+                .values('id', 'name', 'related_table1__table1_id', *(v for k, v in ROW_MEDIAN_FIELDS.items()
+                                                                   if k[1] == 'temperature')))
+    if not rows:
+        return []
+
+    # aisle of every sensor of the site in one vectorized call, see SiteModel.get_sensor_row_sides
+    site = get_site_model(rows[0]['related_table1__table1_id'], db)
+    row_indexes = site.row_ids.get([x['id'] for x in rows])
+    sensor_rows, sides = site.sensors['row'], site.get_sensor_row_sides()
+    sensors = np.flatnonzero(np.isin(sensor_rows, row_indexes[row_indexes >= 0]) & (sides >= 0))
+    humidities = site.to_array('sensors', get_latest_humidities([site.sensor_ids[i] for i in sensors], db,
+                                                                resolution))
+
+    results = []
+    for row, row_index in zip(rows, row_indexes):
+        for code, side in enumerate(SITE_ROW_SIDES):
+            values = humidities[(sensor_rows == row_index) & (sides == code)]
+            values = values[np.isfinite(values)]
+            results.append({'row': row['id'],
+                            'name': row['name'],
+                            'side': side,
+                            'temperature': row[ROW_MEDIAN_FIELDS[(side, 'temperature')]],
+                            'humidity': float(np.median(values)) if len(values) else None})
+
+    nan = float('nan')
+    states = psychrometrics([nan if x['temperature'] is None else x['temperature'] for x in results],
+                            # sensors report relative humidity in %
+                            [nan if x['humidity'] is None else x['humidity'] / 100 for x in results],
+                            STANDARD_PRESSURE if pressure is None else pressure)
+    for i, result in enumerate(results):
+        for field in PSYCHROMETRIC_FIELDS:
+            value = float(states[field][i])
+            result[field] = None if value != value else round(value, 4)
+    return results
@@ -1,16 +1,22 @@
 from rest_framework_nested import routers
 
 from apps.core.viewsets import (FeedbackViewSet, DynamicHelpViewSet, EventViewSet,
-                                EventSearchesViewSet, TableViewSet)
+                                EventSearchesViewSet, TableViewSet, SensorBulkViewSet, ReadingBulkViewSet,
+                                MeasurementViewSet, JobViewSet, HeatmapViewSet, ExportViewSet)
 
 core_router = routers.SimpleRouter()
 
 core_router.register(r'feedbacks', FeedbackViewSet, basename='feedbacks')
 core_router.register(r'dynamic-help', DynamicHelpViewSet, basename='dynamic-help')
+core_router.register(r'sensors-bulk', SensorBulkViewSet, basename='sensors-bulk')
+core_router.register(r'readings-bulk', ReadingBulkViewSet, basename='readings-bulk')
+core_router.register(r'jobs', JobViewSet, basename='jobs')
+core_router.register(r'exports', ExportViewSet, basename='exports')
 
 # Datacenters nested viewsets
 core_router.register(r'table', TableViewSet, basename='table')
 core_datacenter_router = routers.NestedSimpleRouter(core_router, r'table', lookup='table')
 core_datacenter_router.register(r'events', EventViewSet, basename='events')
 core_datacenter_router.register(r'events-searches', EventSearchesViewSet, basename='events-searches')
-
+core_datacenter_router.register(r'measurements', MeasurementViewSet, basename='measurements')
+core_datacenter_router.register(r'heatmaps', HeatmapViewSet, basename='heatmaps')
@@ -0,0 +1,204 @@
+"""
+    Incremental medians of the cold and hot rows (RelatedTable2 *_row_*_median)
+"""
+import datetime
+
+from django.utils import timezone
+
+from apps.core.models import Data, RelatedTable2, Measurement
+from utils.constants import ROLLUP_15_MIN
+from utils.helpers import Median
+from utils.querysets import bulk_update_values
+from utils.sketches import P2Quantile
+
+ROW_SIDE_COLD = 'cold'
+ROW_SIDE_HOT = 'hot'
+
+# (row side, measurement field) -> RelatedTable2 field
+ROW_MEDIAN_FIELDS = {
+    (ROW_SIDE_COLD, 'temperature'): 'cold_row_temperature_median',
+    (ROW_SIDE_HOT, 'temperature'): 'hot_row_temperature_median',
+    (ROW_SIDE_COLD, 'pressure'): 'cold_row_pressure_median',
+    (ROW_SIDE_HOT, 'pressure'): 'hot_row_pressure_median',
+}
+
+ROW_MEDIANS_READINGS_BATCH = 5000
+
+
+def get_row_side(y, cold_pos, hot_pos):
+    """
+    Rows run along x with their cold and hot aisles at y = cold_pos and y = hot_pos, a sensor belongs to the
+    closest one
+    @return: ROW_SIDE_COLD, ROW_SIDE_HOT or None if it can not be known
+    """
+    if y is None or cold_pos is None or hot_pos is None:
+        return None
+    return ROW_SIDE_COLD if abs(y - cold_pos) <= abs(y - hot_pos) else ROW_SIDE_HOT
+
+
+class RowMedianTracker:
+    """
+    Streaming median sketches per row, field and time window, fed with the readings and written back to
+    RelatedTable2 in batches. Memory grows with the rows and windows, not with the readings.
+    """
+
+    def __init__(self, db, window=ROLLUP_15_MIN, keep_windows=2):
+        self.db = db
+        self.window = window
+        self.keep_windows = keep_windows
+        self.sketches = {}
+        self.dirty = set()
+        self._sensors = {}
+
+    def get_window_start(self, timestamp):
+        epoch = int(timestamp.timestamp())
+        return epoch - epoch % self.window
+    def _locate_sensors(self, sensor_ids):
+        missing = set(sensor_ids) - self._sensors.keys()
+        if not missing:
+            return
+
+        for sensor_id, row_id, y, cold_pos, hot_pos in Data.objects.using(self.db).filter(id__in=missing).values_list(
+                'id', 'related_table2_id', 'y', 'related_table2__cold_pos', 'related_table2__hot_pos'):
+            side = get_row_side(y, cold_pos, hot_pos)
+            self._sensors[sensor_id] = (row_id, side) if row_id and side else None
+        for sensor_id in missing:
+            self._sensors.setdefault(sensor_id, None)
+
+    def get_sensors(self, row_id, side):
+        return [k for k, v in self._sensors.items() if v == (row_id, side)]
+
+    def add_readings(self, readings):
+        """
+        @param readings: list of (sensor_id, timestamp, temperature, pressure)
+        """
+        self._locate_sensors({x[0] for x in readings})
+
+        for sensor_id, timestamp, temperature, pressure in readings:
+            location = self._sensors.get(sensor_id)
+            if location is None:
+                continue
+
+            row_id, side = location
+            window = self.get_window_start(timestamp)
+            for variable, value in (('temperature', temperature), ('pressure', pressure)):
+                if value is None:
+                    continue
+                key = (row_id, ROW_MEDIAN_FIELDS[(side, variable)], window)
+                sketch = self.sketches.get(key)
+                if sketch is None:
+                    sketch = self.sketches[key] = P2Quantile()
+                sketch.add(value)
+
+            self.dirty.add(row_id)
+
+    def get_medians(self, row_ids=None):
+        """
+        Medians of the latest window of every row and field
+        @param row_ids: rows, all of them by default
+        @return: dict row_id -> {field: median}
+        """
+        latest = {}
+        for row_id, field, window in self.sketches:
+            if row_ids is None or row_id in row_ids:
+                key = (row_id, field)
+                latest[key] = max(latest.get(key, window), window)
+
+        medians = {}
+        for (row_id, field), window in latest.items():
+            medians.setdefault(row_id, {})[field] = self.sketches[(row_id, field, window)].value()
+        return medians
+
+    def flush(self):
+        """
+        Write the medians of the rows with readings, one bulk update per set of fields
+        @return: number of updated rows
+        """
+        bulk_update_values(RelatedTable2, self.db, self.get_medians(self.dirty))
+
+        updated = len(self.dirty)
+        self.dirty = set()
+        self._prune()
+        return updated
+
+    def _prune(self):
+        if not self.sketches:
+            return
+        oldest = max(x[2] for x in self.sketches) - (self.keep_windows - 1) * self.window
+        self.sketches = {k: v for k, v in self.sketches.items() if k[2] >= oldest}
+
+
+def _iter_readings(db, start, end=None):
+    """
+    @param start: oldest timestamp (included)
+    @param end: newest timestamp (excluded), no limit by default
+    @return: generator of lists of (sensor_id, timestamp, temperature, pressure) in id order
+    """
+    readings = Measurement.objects.using(db).filter(timestamp__gte=start)
+    if end is not None:
+        readings = readings.filter(timestamp__lt=end)
+    readings = (readings.order_by('id')
+                .values_list('sensor_id', 'timestamp', 'temperature', 'pressure')
+                .iterator(chunk_size=ROW_MEDIANS_READINGS_BATCH))
+
+    batch = []
+    for reading in readings:
+        batch.append(reading)
+        if len(batch) >= ROW_MEDIANS_READINGS_BATCH:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def refresh_row_medians(db, window=ROLLUP_15_MIN):
+    """
+    Rebuild the sketches of the kept windows from their start and write the row medians
+    Measurement ids are taken at insert but committed out of order (a bulk upload commits at the end of its
+    request), so an id or time watermark would skip the readings committed late. Feeding the kept windows again
+    counts them, older readings can not change any kept median. The cost grows with the kept windows, not with
+    history.
+    @param db: database
+    @param window: window of the medians in seconds
+    @return: number of updated rows
+    """
+    tracker = RowMedianTracker(db, window)
+    oldest = datetime.datetime.fromtimestamp(
+        tracker.get_window_start(timezone.now()) - (tracker.keep_windows - 1) * window, tz=datetime.timezone.utc)
+
+    for batch in _iter_readings(db, oldest):
+        tracker.add_readings(batch)
+
+    return tracker.flush()
+
+
+def check_row_medians(db, start, end):
+    """
+    Accuracy harness: medians of the sketches against the exact Median aggregate for the same readings
+    @param db: database
+    @param start: datetime
+    @param end: datetime
+    @return: list of dicts with row, field, sketch, exact and error, worst first
+    """
+    # a window longer than the epoch puts every reading in the same window
+    tracker = RowMedianTracker(db, window=10 ** 12)
+    for batch in _iter_readings(db, start, end):
+        tracker.add_readings(batch)
+
+    report = []
+    for row_id, values in tracker.get_medians().items():
+        for (side, variable), field in ROW_MEDIAN_FIELDS.items():
+            if field not in values:
+                continue
+            exact = Measurement.objects.using(db).filter(
+                timestamp__gte=start, timestamp__lt=end, sensor_id__in=tracker.get_sensors(row_id, side)
+            ).aggregate(median=Median(variable))['median']
+            report.append({
+                'row': row_id,
+                'field': field,
+                'sketch': values[field],
+                'exact': exact,
+                'error': abs(values[field] - exact) if exact is not None else None
+            })
+
+    return sorted(report, key=lambda x: -(x['error'] or 0))
@@ -0,0 +1,68 @@
+"""
+    Full-text search of events with stored, language-aware search vectors
+"""
+from django.contrib.postgres.search import SearchVector, SearchQuery, SearchRank
+from django.db.models import Q, Case, When, F, FloatField
+
+from code_setting.settings import LANGUAGE_EN, LANGUAGE_ES, LANGUAGE_PT
+
+# PostgreSQL text search configuration by language
+SEARCH_CONFIGS = {
+    LANGUAGE_EN: 'english',
+    LANGUAGE_ES: 'spanish',
+    LANGUAGE_PT: 'portuguese',
+}
+
+SEARCH_MIN_RANK = 0.1
+
+
+def get_search_config(language):
+    return SEARCH_CONFIGS.get(language, SEARCH_CONFIGS[LANGUAGE_EN])
+
+
+def get_event_search_vector(language):
+    return SearchVector('text', weight='A', config=get_search_config(language))
+
+
+def update_event_search_vectors(queryset):
+    """
+    Store the search vector of the events of a queryset, one UPDATE per language
+    @param queryset: Event queryset
+    @return: number of updated events
+    """
+    updated = 0
+    for language in SEARCH_CONFIGS:
+        updated += queryset.filter(language=language).update(search_vector=get_event_search_vector(language))
+    updated += queryset.exclude(language__in=list(SEARCH_CONFIGS)).update(
+        search_vector=get_event_search_vector(LANGUAGE_EN))
+    return updated
+
+
+def update_event_search_vector(event, db):
+    """
+    Store the search vector of one event with a single UPDATE, the configuration comes from its language
+    @param event: Event instance
+    @param db: database
+    """
+    type(event).objects.using(db).filter(pk=event.pk).update(search_vector=get_event_search_vector(event.language))
+
+
+def search_events(queryset, query):
+    """
+    Events matching a query, each one parsed with the configuration of its language, ranked with the stored
+    vectors (GIN index)
+    @param queryset: Event queryset, already scoped (e.g. by table1)
+    @param query: text to search
+    @return: queryset annotated with rank, best first
+    """
+    matches = Q()
+    ranks = []
+    for language, config in SEARCH_CONFIGS.items():
+        search_query = SearchQuery(query, config=config)
+        matches |= Q(language=language, search_vector=search_query)
+        ranks.append(When(language=language, then=SearchRank(F('search_vector'), search_query)))
+
+    return queryset.filter(matches)\
+        .annotate(rank=Case(*ranks, default=0, output_field=FloatField()))\
+        .filter(rank__gte=SEARCH_MIN_RANK)\
+        .order_by('-rank', '-created_at')
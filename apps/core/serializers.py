@@ -1,6 +1,7 @@
 from rest_framework import serializers
 
-from apps.core.models import Table1, Feedback, Country, Event
+from apps.core.models import Table1, Feedback, Country, Event, RelatedTable3, Job
+from utils.constants import CHOISES_CLASSES
 
 
 class CountrySerializer(serializers.ModelSerializer):
@@ -19,6 +20,37 @@ class Table1Serializer(serializers.ModelSerializer):
                   'area_allowed_operation', 'is_active', 'created_at')
 
 
+class RelatedTable3LiteSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = RelatedTable3
+        fields = ('id', 'name', 'type', 'total_units', 'x_center', 'y_center',
+                  'x_size', 'y_size', 'power_on')
+
+
+class DataBulkSerializer(serializers.Serializer):
+    mac_address = serializers.CharField(max_length=100)
+    name = serializers.CharField(max_length=100)
+    source = serializers.ChoiceField(choices=CHOISES_CLASSES, required=False, allow_null=True)
+    type = serializers.ChoiceField(choices=CHOISES_CLASSES, required=False, allow_null=True)
+    firmware_version = serializers.CharField(max_length=32, required=False, allow_null=True)
+    table1 = serializers.UUIDField(required=False, allow_null=True)
+    related_table1 = serializers.UUIDField(required=False, allow_null=True)
+    related_table2 = serializers.UUIDField(required=False, allow_null=True)
+    related_table3 = serializers.UUIDField(required=False, allow_null=True)
+    x = serializers.FloatField(required=False, allow_null=True)
+    y = serializers.FloatField(required=False, allow_null=True)
+    z = serializers.FloatField(required=False, allow_null=True)
+
+
+class ReadingBulkSerializer(serializers.Serializer):
+    mac_address = serializers.CharField(max_length=100)
+    timestamp = serializers.DateTimeField()
+    temperature = serializers.FloatField(required=False, allow_null=True)
+    humidity = serializers.FloatField(required=False, allow_null=True)
+    pressure = serializers.FloatField(required=False, allow_null=True)
+
+
 class FeedbackSerializer(serializers.ModelSerializer):
     type = serializers.SerializerMethodField()
     component = serializers.SerializerMethodField()
@@ -67,4 +99,13 @@ class EventLiteSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Event
-        fields = ('text',)
\ No newline at end of file
+        fields = ('text',)
+
+
+class JobSerializer(serializers.ModelSerializer):
+    status = serializers.CharField(source='get_status_display')
+
+    class Meta:
+        model = Job
+        fields = ('id', 'kind', 'status', 'payload', 'result', 'error', 'attempts', 'max_attempts',
+                  'available_at', 'started_at', 'finished_at', 'created_by', 'created_at')
@@ -0,0 +1,206 @@
+from django.db import connections
+from django.db.models.signals import pre_save, post_save, post_delete, pre_migrate, post_migrate
+from django.dispatch import receiver
+
+from apps.core.charts import invalidate_table1_chart
+from apps.core.dynamic_help import invalidate_dynamic_help
+from apps.core.envelopes import ENVELOPE_FIELDS, invalidate_table1_envelopes
+from apps.core.heatmaps import ROOM_HEATMAP_FIELDS, invalidate_room_heatmaps
+from apps.core.models import Country, Table1, RelatedTable1, RelatedTable2, RelatedTable3, Data, Event, Files, Feedback
+from apps.core.search import update_event_search_vector
+from apps.core.site_model import SITE_SENSOR_FIELDS, get_table1_of_rooms, invalidate_site_model
+from apps.core.suggestions import invalidate_event_suggestions
+from apps.core.spatial import (SENSOR_SPATIAL_FIELDS, RACK_SPATIAL_FIELDS, get_changed_spatial_values,
+                               get_rooms_of_related_table2, invalidate_room_sensor_index,
+                               invalidate_room_rack_index)
+from apps.core.structure import invalidate_table1_structure
+from apps.core.timeseries import create_measurement_table
+from utils.conditional import bump_model_version
+
+
+# # # # # STRUCTURE CACHE AND SITE MODEL # # # # #
+
+@receiver([post_save, post_delete], sender=Table1)
+def invalidate_structure_by_table1(sender, instance, using, **kwargs):
+    invalidate_table1_structure(instance.id, using)
+    invalidate_site_model(instance.id, using)
+
+
+@receiver([post_save, post_delete], sender=RelatedTable1)
+def invalidate_structure_by_related_table1(sender, instance, using, **kwargs):
+    invalidate_table1_structure(instance.table1_id, using)
+    invalidate_site_model(instance.table1_id, using)
+
+
+@receiver([post_save, post_delete], sender=RelatedTable2)
+def invalidate_structure_by_related_table2(sender, instance, using, **kwargs):
+    table1_id = RelatedTable1.objects.using(using).filter(id=instance.related_table1_id)\
+        .values_list('table1_id', flat=True).first()
+    invalidate_table1_structure(table1_id, using)
+    invalidate_site_model(table1_id, using)
+
+
+@receiver([post_save, post_delete], sender=RelatedTable3)
+def invalidate_structure_by_related_table3(sender, instance, using, **kwargs):
+    table1_id = RelatedTable2.objects.using(using).filter(id=instance.related_table2_id)\
+        .values_list('related_table1__table1_id', flat=True).first()
+    invalidate_table1_structure(table1_id, using)
+    invalidate_site_model(table1_id, using)
+
+
+@receiver(post_save, sender=Data)
+def invalidate_site_model_by_sensor_on_save(sender, instance, using, **kwargs):
+    for table1_id in get_table1_of_rooms(getattr(instance, '_site_rooms', ()), using):
+        invalidate_site_model(table1_id, using)
+
+
+@receiver(post_delete, sender=Data)
+def invalidate_site_model_by_sensor_on_delete(sender, instance, using, **kwargs):
+    for table1_id in get_table1_of_rooms({instance.related_table1_id}, using):
+        invalidate_site_model(table1_id, using)
+
+
+# # # # # SPATIAL INDEXES # # # # #
+
+@receiver(pre_save, sender=Data)
+def track_sensor_location(sender, instance, using, update_fields=None, **kwargs):
+    # one query for the site model and the spatial index: SITE_SENSOR_FIELDS holds SENSOR_SPATIAL_FIELDS and both end
+    # with the room
+    changed = get_changed_spatial_values(instance, SITE_SENSOR_FIELDS, using, update_fields)
+    instance._site_rooms = {x[-1] for x in changed if x} if changed else set()
+    instance._spatial_rooms = set()
+    if changed:
+        positions = [SITE_SENSOR_FIELDS.index(x) for x in SENSOR_SPATIAL_FIELDS]
+        old, new = (None if x is None else tuple(x[i] for i in positions) for x in changed)
+        if old != new:
+            instance._spatial_rooms = {x[-1] for x in (old, new) if x}
+
+
+@receiver(post_save, sender=Data)
+def invalidate_sensor_index_on_save(sender, instance, using, **kwargs):
+    for room_id in getattr(instance, '_spatial_rooms', ()):
+        invalidate_room_sensor_index(room_id, using)
+
+
+@receiver(post_delete, sender=Data)
+def invalidate_sensor_index_on_delete(sender, instance, using, **kwargs):
+    invalidate_room_sensor_index(instance.related_table1_id, using)
+
+
+@receiver(pre_save, sender=RelatedTable3)
+def track_rack_location(sender, instance, using, update_fields=None, **kwargs):
+    changed = get_changed_spatial_values(instance, RACK_SPATIAL_FIELDS, using, update_fields)
+    instance._spatial_rooms = get_rooms_of_related_table2({x[-1] for x in changed if x}, using) if changed else set()
+
+
+@receiver(post_save, sender=RelatedTable3)
+def invalidate_rack_index_on_save(sender, instance, using, **kwargs):
+    for room_id in getattr(instance, '_spatial_rooms', ()):
+        invalidate_room_rack_index(room_id, using)
+
+
+@receiver(post_delete, sender=RelatedTable3)
+def invalidate_rack_index_on_delete(sender, instance, using, **kwargs):
+    for room_id in get_rooms_of_related_table2({instance.related_table2_id}, using):
+        invalidate_room_rack_index(room_id, using)
+
+
+@receiver(post_save, sender=RelatedTable2)
+def invalidate_rack_index_by_related_table2(sender, instance, using, update_fields=None, **kwargs):
+    # moving a row moves all its racks
+    if update_fields is None or 'related_table1' in update_fields:
+        invalidate_room_rack_index(instance.related_table1_id, using)
+
+
+# # # # # CONDITIONAL RESPONSES # # # # #
+
+@receiver([post_save, post_delete], sender=Table1)
+@receiver([post_save, post_delete], sender=Feedback)
+@receiver([post_save, post_delete], sender=Event)
+def bump_conditional_version(sender, instance, using, **kwargs):
+    bump_model_version(sender, using)
+
+
+@receiver([post_save, post_delete], sender=Country)
+def bump_conditional_version_by_country(sender, instance, using, **kwargs):
+    # Table1Serializer nests the country, and deleting one sets table1.country NULL without signals
+    bump_model_version(Table1, using)
+
+
+# # # # # DYNAMIC HELP # # # # #
+
+@receiver([post_save, post_delete], sender=Files)
+def invalidate_dynamic_help_by_files(sender, instance, using, **kwargs):
+    invalidate_dynamic_help(using)
+
+
+# # # # # HEATMAPS # # # # #
+
+@receiver(pre_save, sender=RelatedTable1)
+def track_room_heatmap_fields(sender, instance, using, update_fields=None, **kwargs):
+    changed = get_changed_spatial_values(instance, ROOM_HEATMAP_FIELDS, using, update_fields)
+    instance._heatmaps_changed = changed is not None
+
+
+@receiver(post_save, sender=RelatedTable1)
+def invalidate_heatmaps_on_save(sender, instance, using, **kwargs):
+    if getattr(instance, '_heatmaps_changed', True):
+        invalidate_room_heatmaps(instance.id, using)
+
+
+@receiver(post_delete, sender=RelatedTable1)
+def invalidate_heatmaps_on_delete(sender, instance, using, **kwargs):
+    invalidate_room_heatmaps(instance.id, using)
+
+
+# # # # # MEASUREMENTS # # # # #
+
+@receiver(pre_migrate)
+def create_postgres_extensions(sender, using, **kwargs):
+    # the trigram index of the event texts needs pg_trgm
+    if sender.name == 'apps.core' and connections[using].vendor == 'postgresql':
+        with connections[using].cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+
+@receiver(post_migrate)
+def create_measurements_storage(sender, using, **kwargs):
+    # the partitioned table is not managed by migrations
+    if sender.name == 'apps.core' and using != 'default':
+        create_measurement_table(using)
+
+
+# # # # # EVENTS SEARCH # # # # #
+
+@receiver(post_save, sender=Event)
+def store_event_search_vector(sender, instance, using, update_fields=None, **kwargs):
+    if update_fields is None or {'text', 'language'} & set(update_fields):
+        update_event_search_vector(instance, using)
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def invalidate_event_suggestions_cache(sender, instance, using, **kwargs):
+    if instance.table1_id:
+        invalidate_event_suggestions(instance.table1_id, using)
+
+
+# # # # # OPERATION ENVELOPES # # # # #
+
+@receiver(pre_save, sender=Table1)
+def track_table1_envelopes(sender, instance, using, update_fields=None, **kwargs):
+    changed = get_changed_spatial_values(instance, ENVELOPE_FIELDS, using, update_fields)
+    instance._envelopes_changed = changed is not None
+
+
+@receiver(post_save, sender=Table1)
+def invalidate_envelopes_on_save(sender, instance, using, **kwargs):
+    if getattr(instance, '_envelopes_changed', True):
+        invalidate_table1_envelopes(instance.id, using)
+        invalidate_table1_chart(instance.id, using)
+
+
+@receiver(post_delete, sender=Table1)
+def invalidate_envelopes_on_delete(sender, instance, using, **kwargs):
+    invalidate_table1_envelopes(instance.id, using)
+    invalidate_table1_chart(instance.id, using)
@@ -0,0 +1,264 @@
+"""
+    Compact model of a Table1 site for calculations: rooms, rows, racks and sensors as numpy structured arrays.
+    UUIDs are kept once per level as 16 byte arrays, every reference between levels is the integer index of the
+    parent (-1 for none) and NULL numbers are nan, so the calculations run on whole columns.
+
+    numpy is imported when a model is built, signals import this module at startup
+"""
+import uuid
+
+from apps.core.models import RelatedTable1, RelatedTable2, RelatedTable3, Data
+from apps.core.row_medians import ROW_SIDE_COLD, ROW_SIDE_HOT
+from utils.cache import VersionedLocalCache
+from utils.constants import IDW_DEFAULT_POWER
+
+# fields of a sensor kept by the model, the room is the last one (see get_changed_spatial_values)
+SITE_SENSOR_FIELDS = ('x', 'y', 'z', 'related_table2_id', 'related_table3_id', 'related_table1_id')
+
+ROOM_DTYPE = [('x_max', 'f8'), ('y_max', 'f8'), ('z_max', 'f8'), ('square_size', 'f8')]
+ROW_DTYPE = [('room', 'i4'), ('cold_pos', 'f8'), ('hot_pos', 'f8')]
+RACK_DTYPE = [('room', 'i4'), ('row', 'i4'), ('x_center', 'f8'), ('y_center', 'f8'), ('x_size', 'f8'),
+              ('y_size', 'f8'), ('power_on', '?')]
+# row side of each code of SiteModel.get_sensor_row_sides
+SITE_ROW_SIDES = (ROW_SIDE_COLD, ROW_SIDE_HOT)
+
+SENSOR_DTYPE = [('room', 'i4'), ('row', 'i4'), ('rack', 'i4'), ('x', 'f8'), ('y', 'f8'), ('z', 'f8')]
+
+site_model_cache = VersionedLocalCache('core:site-model', max_entries=64)
+
+
+def _float(value):
+    return float('nan') if value is None else value
+
+
+class IdIndex:
+    """
+    UUIDs of a level as a (N) array of 16 bytes with a sorted copy, the position of many ids is found with one
+    searchsorted instead of a dict of UUID objects
+    """
+    __slots__ = ('ids', '_order', '_sorted')
+
+    def __init__(self, ids):
+        import numpy as np
+
+        self.ids = np.array([uuid.UUID(str(x)).bytes for x in ids], dtype='S16')
+        self._order = np.argsort(self.ids, kind='stable').astype(np.int32)
+        self._sorted = self.ids[self._order]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        # S arrays drop the trailing zero bytes of their items
+        return uuid.UUID(bytes=self.ids[i].ljust(16, b'\0'))
+
+    def get(self, ids):
+        """
+        @param ids: iterable of ids (UUID, str or None)
+        @return: int32 array of positions, -1 for the ids that are not in the index
+        """
+        import numpy as np
+
+        keys = np.array([b'' if x is None else uuid.UUID(str(x)).bytes for x in ids], dtype='S16')
+        if not len(self.ids) or not len(keys):
+            return np.full(len(keys), -1, dtype=np.int32)
+        positions = np.minimum(np.searchsorted(self._sorted, keys), len(self.ids) - 1)
+        return np.where(self._sorted[positions] == keys, self._order[positions], -1).astype(np.int32)
+
+    @property
+    def nbytes(self):
+        return self.ids.nbytes + self._order.nbytes + self._sorted.nbytes
+
+
+class SiteModel:
+    """
+    Rooms, rows, racks and sensors of a site. The arrays of every level are aligned with the IdIndex of the level
+    """
+    __slots__ = ('table1_id', 'room_ids', 'row_ids', 'rack_ids', 'sensor_ids', 'rooms', 'rows', 'racks', 'sensors')
+
+    def __init__(self, table1_id, rooms, rows, racks, sensors):
+        """
+        @param table1_id: table1 id
+        @param rooms: list of (id, x_max, y_max, z_max, square_size)
+        @param rows: list of (id, related_table1_id, cold_pos, hot_pos)
+        @param racks: list of (id, related_table2_id, x_center, y_center, x_size, y_size, power_on)
+        @param sensors: list of (id, x, y, z, related_table2_id, related_table3_id, related_table1_id)
+        """
+        import numpy as np
+
+        self.table1_id = table1_id
+        self.room_ids = IdIndex([x[0] for x in rooms])
+        self.row_ids = IdIndex([x[0] for x in rows])
+        self.rack_ids = IdIndex([x[0] for x in racks])
+        self.sensor_ids = IdIndex([x[0] for x in sensors])
+
+        self.rooms = np.empty(len(rooms), dtype=ROOM_DTYPE)
+        for i, name in enumerate(self.rooms.dtype.names, 1):
+            self.rooms[name] = [_float(x[i]) for x in rooms]
+
+        self.rows = np.empty(len(rows), dtype=ROW_DTYPE)
+        self.rows['room'] = self.room_ids.get(x[1] for x in rows)
+        self.rows['cold_pos'] = [_float(x[2]) for x in rows]
+        self.rows['hot_pos'] = [_float(x[3]) for x in rows]
+
+        self.racks = np.empty(len(racks), dtype=RACK_DTYPE)
+        self.racks['row'] = self.row_ids.get(x[1] for x in racks)
+        self.racks['room'] = self._parent_room(self.racks['row'])
+        for i, name in enumerate(('x_center', 'y_center', 'x_size', 'y_size'), 2):
+            self.racks[name] = [_float(x[i]) for x in racks]
+        self.racks['power_on'] = [bool(x[6]) for x in racks]
+
+        self.sensors = np.empty(len(sensors), dtype=SENSOR_DTYPE)
+        for i, name in enumerate(('x', 'y', 'z'), 1):
+            self.sensors[name] = [_float(x[i]) for x in sensors]
+        self.sensors['row'] = self.row_ids.get(x[4] for x in sensors)
+        self.sensors['rack'] = self.rack_ids.get(x[5] for x in sensors)
+        self.sensors['room'] = self.room_ids.get(x[6] for x in sensors)
+
+    def _parent_room(self, rows):
+        import numpy as np
+
+        rooms = np.full(len(rows), -1, dtype=np.int32)
+        known = rows >= 0
+        rooms[known] = self.rows['room'][rows[known]]
+        return rooms
+
+    @property
+    def nbytes(self):
+        return sum(x.nbytes for x in (self.rooms, self.rows, self.racks, self.sensors, self.room_ids, self.row_ids,
+                                      self.rack_ids, self.sensor_ids))
+
+    def to_array(self, level, values, default=float('nan')):
+        """
+        Align a dict keyed by id with the rows of a level
+        @param level: 'rooms', 'rows', 'racks' or 'sensors'
+        @param values: dict id -> value, ids outside the site are ignored, None values are nan
+        @param default: value of the ids missing from values
+        @return: float array aligned with the ids of the level
+        """
+        import numpy as np
+
+        index = getattr(self, level[:-1] + '_ids')
+        result = np.full(len(index), default, dtype=float)
+        positions = index.get(values)
+        found = positions >= 0
+        result[positions[found]] = np.array([_float(x) for x in values.values()], dtype=float)[found]
+        return result
+
+    def get_sensor_positions(self, room=None, dimensions=3):
+        """
+        @param room: room index, all the sensors by default
+        @return: (sensor indexes, (N x dimensions) positions)
+        """
+        import numpy as np
+
+        indexes = np.arange(len(self.sensors)) if room is None else np.flatnonzero(self.sensors['room'] == room)
+        fields = ('x', 'y', 'z')[:dimensions]
+        return indexes, np.stack([self.sensors[x][indexes] for x in fields], axis=1)
+
+    def get_sensor_row_sides(self):
+        """
+        Vectorized apps.core.row_medians.get_row_side of every sensor
+        @return: int8 array, 0 cold aisle, 1 hot aisle (see SITE_ROW_SIDES), -1 unknown (no row, y or aisle positions)
+        """
+        import numpy as np
+
+        rows = self.sensors['row']
+        known = rows >= 0
+        cold, hot = np.full(len(rows), np.nan), np.full(len(rows), np.nan)
+        cold[known] = self.rows['cold_pos'][rows[known]]
+        hot[known] = self.rows['hot_pos'][rows[known]]
+        y = self.sensors['y']
+        with np.errstate(invalid='ignore'):
+            sides = (np.abs(y - cold) > np.abs(y - hot)).astype(np.int8)
+        sides[~(np.isfinite(y) & np.isfinite(cold) & np.isfinite(hot))] = -1
+        return sides
+
+    def get_rack_footprints(self, room=None):
+        """
+        @param room: room index, all the racks by default
+        @return: (rack indexes, (N x 4) array of x_min, y_min, x_max, y_max), racks without geometry are left out
+        """
+        import numpy as np
+
+        racks = self.racks
+        x, y, half_x, half_y = racks['x_center'], racks['y_center'], racks['x_size'] / 2, racks['y_size'] / 2
+        valid = np.isfinite(x) & np.isfinite(y) & np.isfinite(half_x) & np.isfinite(half_y)
+        if room is not None:
+            valid &= racks['room'] == room
+        indexes = np.flatnonzero(valid)
+        return indexes, np.stack([x - half_x, y - half_y, x + half_x, y + half_y], axis=1)[indexes]
+
+    def interpolate(self, room, values, targets, power=IDW_DEFAULT_POWER):
+        """
+        IDW of the sensors of a room at any points
+        @param room: room index
+        @param values: array aligned with the sensors (see to_array), nan for sensors without value
+        @param targets: (M x D) points, D is 2 (x, y) or 3 (x, y, z)
+        @return: (M) array
+        """
+        import numpy as np
+        from utils.interpolation import idw_interpolate
+
+        targets = np.atleast_2d(np.asarray(targets, dtype=float))
+        indexes, positions = self.get_sensor_positions(room, targets.shape[1])
+        return idw_interpolate(positions, np.asarray(values, dtype=float)[indexes], targets, power)
+
+    def interpolate_racks(self, values, power=IDW_DEFAULT_POWER):
+        """
+        IDW of the sensors of every room at the center of its racks, in plan (x, y)
+        @param values: array aligned with the sensors, nan for sensors without value
+        @return: array aligned with the racks, nan for racks without geometry or sensors
+        """
+        import numpy as np
+
+        result = np.full(len(self.racks), np.nan)
+        for room in np.unique(self.racks['room']):
+            if room < 0:
+                continue
+            racks = np.flatnonzero(self.racks['room'] == room)
+            centers = np.stack([self.racks['x_center'][racks], self.racks['y_center'][racks]], axis=1)
+            known = np.all(np.isfinite(centers), axis=1)
+            if known.any():
+                result[racks[known]] = self.interpolate(room, values, centers[known], power)
+        return result
+
+
+def build_site_model(table1_id, db):
+    """
+    Load a site with one values_list query per level, no model instances are created
+    @param table1_id: table1 id
+    @param db: database
+    @return: SiteModel
+    """
+    rooms = RelatedTable1.objects.using(db).filter(table1_id=table1_id).order_by('name')\
+        .values_list('id', 'x_max', 'y_max', 'z_max', 'square_size')
+    rows = RelatedTable2.objects.using(db).filter(related_table1__table1_id=table1_id).order_by('name')\
+        .values_list('id', 'related_table1_id', 'cold_pos', 'hot_pos')
+    racks = RelatedTable3.objects.using(db).filter(related_table2__related_table1__table1_id=table1_id)\
+        .order_by('name').values_list('id', 'related_table2_id', 'x_center', 'y_center', 'x_size', 'y_size',
+                                      'power_on')
+    sensors = Data.objects.using(db).filter(related_table1__table1_id=table1_id).order_by('name')\
+        .values_list('id', *SITE_SENSOR_FIELDS)
+    return SiteModel(table1_id, list(rooms), list(rows), list(racks), list(sensors))
+
+
+def _version_key(table1_id, db):
+    # normalize the id so request kwargs and signal instances share the same key
+    return f'{db}:{uuid.UUID(str(table1_id))}'
+
+
+def get_site_model(table1_id, db):
+    key = _version_key(table1_id, db)
+    return site_model_cache.get(key, lambda: build_site_model(table1_id, db))
+
+
+def invalidate_site_model(table1_id, db):
+    if table1_id:
+        site_model_cache.invalidate(_version_key(table1_id, db))
+
+
+def get_table1_of_rooms(room_ids, db):
+    return set(RelatedTable1.objects.using(db)
+               .filter(id__in=[x for x in room_ids if x])
+               .values_list('table1_id', flat=True))
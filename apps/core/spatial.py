@@ -0,0 +1,107 @@
+"""
+    Spatial indexes of sensors and racks per room
+
+    numpy/scipy are imported when an index is built, signals import this module at startup
+"""
+from apps.core.models import Data, RelatedTable2, RelatedTable3
+from utils.cache import VersionedLocalCache
+
+SPATIAL_INDEX_SENSORS = 'sensors'
+SPATIAL_INDEX_RACKS = 'racks'
+
+# fields that move a sensor or a rack inside (or out of) a room, the room/row is the last one
+SENSOR_SPATIAL_FIELDS = ('x', 'y', 'z', 'related_table1_id')
+RACK_SPATIAL_FIELDS = ('x_center', 'y_center', 'x_size', 'y_size', 'related_table2_id')
+
+spatial_index_cache = VersionedLocalCache('core:spatial-index')
+
+
+def _version_key(kind, room_id, db):
+    return f'{db}:{room_id}:{kind}'
+
+
+def build_room_sensor_index(room_id, db, dimensions=3):
+    """
+    Build the index of the sensors of a room
+    @param room_id: related_table1 id
+    @param db: database
+    @param dimensions: 3 -> (x, y, z), 2 -> (x, y)
+    @return: SpatialIndex with Data ids
+    """
+    import numpy as np
+    from utils.spatial import SpatialIndex
+
+    fields = ('x', 'y', 'z')[:dimensions]
+    rows = list(Data.objects.using(db).filter(related_table1_id=room_id).values_list('id', *fields))
+    return SpatialIndex([x[0] for x in rows], [x[1:] for x in rows] or np.empty((0, dimensions)))
+
+
+def build_room_rack_index(room_id, db):
+    """
+    Build the index of the rack centers of a room
+    @param room_id: related_table1 id
+    @param db: database
+    @return: SpatialIndex with RelatedTable3 ids
+    """
+    import numpy as np
+    from utils.spatial import SpatialIndex
+
+    rows = list(RelatedTable3.objects.using(db)
+                .filter(related_table2__related_table1_id=room_id)
+                .values_list('id', 'x_center', 'y_center'))
+    return SpatialIndex([x[0] for x in rows], [x[1:] for x in rows] or np.empty((0, 2)))
+
+
+def get_room_sensor_index(room_id, db, dimensions=3):
+    version_key = _version_key(SPATIAL_INDEX_SENSORS, room_id, db)
+    return spatial_index_cache.get((version_key, dimensions),
+                                   lambda: build_room_sensor_index(room_id, db, dimensions),
+                                   version_key=version_key)
+
+
+def get_room_rack_index(room_id, db):
+    version_key = _version_key(SPATIAL_INDEX_RACKS, room_id, db)
+    return spatial_index_cache.get(version_key, lambda: build_room_rack_index(room_id, db))
+
+
+def get_room_spatial_versions(room_id, db):
+    """
+    @return: (sensors version, racks version) of a room, they change whenever its sensors or racks move
+    """
+    return (spatial_index_cache.get_version(_version_key(SPATIAL_INDEX_SENSORS, room_id, db)),
+            spatial_index_cache.get_version(_version_key(SPATIAL_INDEX_RACKS, room_id, db)))
+
+
+def invalidate_room_sensor_index(room_id, db):
+    if room_id:
+        spatial_index_cache.invalidate(_version_key(SPATIAL_INDEX_SENSORS, room_id, db))
+
+
+def invalidate_room_rack_index(room_id, db):
+    if room_id:
+        spatial_index_cache.invalidate(_version_key(SPATIAL_INDEX_RACKS, room_id, db))
+
+
+def get_changed_spatial_values(instance, fields, using, update_fields=None):
+    """
+    Compare the spatial fields of an instance about to be saved with the stored ones
+    @param instance: model instance
+    @param fields: spatial attribute names
+    @param using: database
+    @param update_fields: update_fields of the save, if any
+    @return: (old values or None for new rows, new values) or None when nothing spatial changes
+    """
+    if update_fields is not None and not {instance._meta.get_field(x).name for x in fields} & set(update_fields):
+        return None
+
+    new = tuple(getattr(instance, x) for x in fields)
+    old = type(instance).objects.using(using).filter(pk=instance.pk).values_list(*fields).first()
+    if old == new:
+        return None
+    return old, new
+
+
+def get_rooms_of_related_table2(related_table2_ids, db):
+    return set(RelatedTable2.objects.using(db)
+               .filter(id__in=[x for x in related_table2_ids if x])
+               .values_list('related_table1_id', flat=True))
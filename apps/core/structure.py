@@ -0,0 +1,86 @@
+"""
+    Datacenter structure: Table1 -> Rooms -> Rows -> Racks
+"""
+import uuid
+
+from django.core.cache import cache
+
+from apps.core.models import RelatedTable1, RelatedTable2, RelatedTable3
+from apps.core.serializers import RelatedTable3LiteSerializer
+from code_setting.settings import STRUCTURE_CACHE_TIMEOUT
+
+STRUCTURE_CACHE_KEY = 'core:structure:{db}:{table1_id}'
+
+
+def get_structure_cache_key(table1_id, db):
+    # normalize the id so request kwargs and signal instances share the same key
+    return STRUCTURE_CACHE_KEY.format(db=db, table1_id=uuid.UUID(str(table1_id)))
+
+
+def build_table1_structure(table1_id, db):
+    """
+    Load the whole Table1 tree with one query per level (rooms, rows and racks)
+    and reassemble it in Python
+    @param table1_id: table1 id
+    @param db: database
+    @return: list of rooms with their rows and racks
+    """
+    rooms = list(RelatedTable1.objects.using(db)
+                 .filter(table1_id=table1_id)
+                 .only('id', 'name')
+                 .order_by('name'))
+
+    rows = list(RelatedTable2.objects.using(db)
+                .filter(related_table1__table1_id=table1_id)
+                .only('id', 'name', 'cold_pos', 'hot_pos', 'related_table1_id')
+                .order_by('name'))
+
+    racks = list(RelatedTable3.objects.using(db)
+                 .filter(related_table2__related_table1__table1_id=table1_id)
+                 .only('id', 'name', 'type', 'total_units', 'x_center', 'y_center',
+                       'x_size', 'y_size', 'power_on', 'related_table2_id')
+                 .order_by('name'))
+
+    racks_by_row = {}
+    for rack, rack_data in zip(racks, RelatedTable3LiteSerializer(racks, many=True).data):
+        racks_by_row.setdefault(rack.related_table2_id, []).append(rack_data)
+
+    rows_by_room = {}
+    for row in rows:
+        rows_by_room.setdefault(row.related_table1_id, []).append({
+            'name': row.name,
+            'id': row.id,
+            'cold_pos': row.cold_pos,
+            'hot_pos': row.hot_pos,
+            'racks': racks_by_row.get(row.id, [])
+        })
+
+    return [{
+        'name': room.name,
+        'id': room.id,
+        'rows': rows_by_room.get(room.id, [])
+    } for room in rooms]
+
+
+def get_table1_structure(table1_id, db):
+    """
+    Get the Table1 structure from cache or build it
+    @param table1_id: table1 id
+    @param db: database
+    @return: list of rooms with their rows and racks
+    """
+    key = get_structure_cache_key(table1_id, db)
+    structure = cache.get(key)
+    if structure is None:
+        structure = build_table1_structure(table1_id, db)
+        cache.set(key, structure, STRUCTURE_CACHE_TIMEOUT)
+    return structure
+
+
+def get_cached_table1_structure(table1_id, db):
+    return cache.get(get_structure_cache_key(table1_id, db))
+
+
+def invalidate_table1_structure(table1_id, db):
+    if table1_id:
+        cache.delete(get_structure_cache_key(table1_id, db))
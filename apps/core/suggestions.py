@@ -0,0 +1,88 @@
+"""
+    Type-ahead suggestions of event texts, backed by a pg_trgm GIN index and a per-tenant cache of recent prefixes
+"""
+import threading
+
+from django.db.models import Value
+from django.db.models.functions import Length, Lower, StrIndex
+
+from apps.core.models import Event
+from utils.cache import VersionedLocalCache
+# registers the text__trigram_icontains lookup
+from utils.querysets import TrigramIContains  # noqa: F401
+
+SUGGESTIONS_LIMIT = 10
+SUGGESTIONS_MAX_LIMIT = 50
+SUGGESTIONS_CACHE_ENTRIES = 512
+# trigram indexes can not be used by queries shorter than a trigram
+SUGGESTIONS_TRIGRAM_LENGTH = 3
+SUGGESTIONS_RECENT_EVENTS = 5000
+
+_suggestions_caches = {}
+_suggestions_caches_lock = threading.Lock()
+
+
+def get_suggestions_cache(db):
+    with _suggestions_caches_lock:
+        if db not in _suggestions_caches:
+            _suggestions_caches[db] = VersionedLocalCache(f'core:event-suggestions:{db}',
+                                                          max_entries=SUGGESTIONS_CACHE_ENTRIES)
+        return _suggestions_caches[db]
+
+
+def invalidate_event_suggestions(table1_id, db):
+    get_suggestions_cache(db).invalidate(str(table1_id))
+
+
+def get_suggestion_rank(text, q):
+    """
+    Same order as the database: prefix completions first, then earlier matches, then shorter texts
+    """
+    return text.lower().find(q), len(text), text
+
+
+def query_event_suggestions(table1_id, q, db, limit):
+    """
+    @return: (texts, complete) complete is True when texts are all the texts of table1 containing q
+    """
+    events = Event.objects.using(db).filter(table1_id=table1_id)
+    recent_only = len(q) < SUGGESTIONS_TRIGRAM_LENGTH
+    if recent_only:
+        events = events.filter(id__in=events.order_by('-created_at').values('id')[:SUGGESTIONS_RECENT_EVENTS])
+
+    texts = list(events.filter(text__trigram_icontains=q)
+                 .annotate(position=StrIndex(Lower('text'), Value(q)), length=Length('text'))
+                 .order_by('position', 'length', 'text')
+                 .values_list('text', flat=True)
+                 .distinct()[:limit])
+    return texts, not recent_only and len(texts) < limit
+
+
+def get_event_suggestions(table1_id, q, db, limit=SUGGESTIONS_LIMIT):
+    """
+    Distinct event texts of a table1 containing q (case insensitive). A complete result cached for a shorter
+    prefix is refined in memory instead of going back to the database
+    @param table1_id: Table1 id
+    @param q: text typed so far
+    @param db: company database
+    @param limit: max suggestions
+    @return: list of texts
+    """
+    q = q.strip().lower()
+    if not q:
+        return []
+    limit = min(max(int(limit), 1), SUGGESTIONS_MAX_LIMIT)
+
+    cache = get_suggestions_cache(db)
+    version_key = str(table1_id)
+    version = cache.get_version(version_key)
+
+    def build():
+        for n in range(len(q) - 1, 0, -1):
+            shorter = cache.peek((version_key, q[:n], limit), version)
+            if shorter is not None and shorter[1]:
+                texts = sorted((x for x in shorter[0] if q in x.lower()), key=lambda x: get_suggestion_rank(x, q))
+                return texts, True
+        return query_event_suggestions(table1_id, q, db, limit)
+
+    return cache.get((version_key, q, limit), build, version_key=version_key, version=version)[0]
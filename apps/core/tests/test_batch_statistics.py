@@ -0,0 +1,89 @@
+import math
+import random
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from utils.batch_statistics import (OUTLIERS_SIGMA, describe_frame, frame_to_padded, reject_outliers_frame,
+                                    round_values, to_padded, stdev)
+from utils.helpers import calculate_deviation, round_function
+
+
+class PaddedTest(SimpleTestCase):
+
+    def test_stdev_matches_list_helper(self):
+        groups = [[20.1, 21.4, 0, None, 22.8], [19.5], [18.2, float('inf'), 18.9, 19.3]]
+        result = stdev(to_padded(groups))
+        for value, group in zip(result, groups):
+            expected = calculate_deviation([x for x in group if x is None or math.isfinite(x)])
+            if expected is None:
+                self.assertTrue(np.isnan(value))
+            else:
+                self.assertEqual(value, expected)
+
+
+    def test_stdev_matches_list_helper_on_random_groups(self):
+        rng = random.Random(3)
+        groups = [[round(rng.uniform(15, 30), rng.choice((1, 2, 3))) for _ in range(rng.randint(2, 12))]
+                  for _ in range(5000)]
+        self.assertEqual(stdev(to_padded(groups)).tolist(), [calculate_deviation(x) for x in groups])
+
+
+class RoundValuesTest(SimpleTestCase):
+
+    def test_matches_round_function(self):
+        self.assertEqual(round_values([2.255, 22.555, -83.525]).tolist(), [2.25, 22.55, -83.53])
+        rng = random.Random(5)
+        values = [round(rng.uniform(-100, 100), 3) for _ in range(50000)]
+        self.assertEqual(round_values(values).tolist(), [round_function(x) for x in values])
+
+    def test_missing_values(self):
+        result = round_values([[1.005, None], [float('inf'), 3.14159]])
+        self.assertEqual(result.shape, (2, 2))
+        self.assertTrue(np.isnan(result[0, 1]) and np.isnan(result[1, 0]))
+        self.assertEqual([result[0, 0], result[1, 1]], [round_function(1.005), 3.14])
+
+
+class FrameTest(SimpleTestCase):
+
+    def setUp(self):
+        import pandas as pd
+
+        # sensors without row have a null related_table2_id
+        self.frame = pd.DataFrame({
+            'related_table2_id': ['b', None, 'a', 'b', None, 'a', 'a', 'a', 'a', 'a'],
+            'temperature': [21.0, 40.0, 20.0, 23.0, 19.0, 20.5, 19.5, None, 20.2, 35.0],
+        })
+
+    def test_null_keys_belong_to_no_group(self):
+        index, padded, (groups, columns) = frame_to_padded(self.frame, 'related_table2_id', 'temperature')
+        self.assertEqual(list(index), ['a', 'b'])
+        self.assertEqual(padded.shape, (2, 6))
+        self.assertEqual(groups.tolist(), [1, -1, 0, 1, -1, 0, 0, 0, 0, 0])
+        self.assertEqual(columns.tolist(), [0, -1, 0, 1, -1, 1, 2, 3, 4, 5])
+
+    def test_only_null_keys(self):
+        frame = self.frame.assign(related_table2_id=None)
+        index, padded, (groups, _) = frame_to_padded(frame, 'related_table2_id', 'temperature')
+        self.assertEqual(len(index), 0)
+        self.assertEqual(padded.shape, (0, 0))
+        self.assertTrue((groups == -1).all())
+
+    def test_several_group_columns(self):
+        frame = self.frame.assign(side=['cold', 'hot', 'cold', 'cold', 'hot', None, 'cold', 'cold', 'hot', 'hot'])
+        index, _, (groups, _) = frame_to_padded(frame, ['related_table2_id', 'side'], 'temperature')
+        self.assertEqual(list(index), [('a', 'cold'), ('a', 'hot'), ('b', 'cold')])
+        self.assertEqual(groups[5], -1)
+
+    def test_describe_frame(self):
+        result = describe_frame(self.frame, 'related_table2_id', 'temperature')
+        self.assertEqual(list(result.index), ['a', 'b'])
+        self.assertEqual(result.loc['b', 'count'], 2)
+        self.assertEqual(result.loc['b', 'mean'], 22.0)
+        self.assertEqual(result.loc['a', 'count'], 5)
+        self.assertEqual(result.loc['a', 'max'], 35.0)
+
+    def test_reject_outliers_frame(self):
+        result = reject_outliers_frame(self.frame, 'related_table2_id', 'temperature', OUTLIERS_SIGMA, 1.5)
+        # 35 is an outlier of row a, rows without group and missing values are kept
+        self.assertEqual(result.index.tolist(), [0, 1, 2, 3, 4, 5, 6, 7, 8])
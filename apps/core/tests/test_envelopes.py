@@ -0,0 +1,58 @@
+from django.test import SimpleTestCase
+
+from apps.core.envelopes import CompiledEnvelopes, get_limits_polygon
+from utils.constants import (ENVELOPE_UNKNOWN, ENVELOPE_RECOMMENDED, ENVELOPE_ALLOWED, ENVELOPE_OUTSIDE,
+                             RECOMMENDED_OPERATION_ENVELOPES, ALLOWED_OPERATION_ENVELOPES, CHOISE_0)
+
+
+def default_envelopes():
+    recommended, allowed = RECOMMENDED_OPERATION_ENVELOPES[CHOISE_0], ALLOWED_OPERATION_ENVELOPES[CHOISE_0]
+    return CompiledEnvelopes(get_limits_polygon(recommended), get_limits_polygon(allowed), recommended, allowed)
+
+
+class DefaultEnvelopesTest(SimpleTestCase):
+
+    def _assert_classes(self, envelopes, readings, expected):
+        temperatures, humidities = zip(*readings)
+        self.assertEqual(envelopes.classify(temperatures, humidities).tolist(), [expected] * len(readings))
+
+    def test_boundaries_are_inclusive(self):
+        envelopes = default_envelopes()
+        self._assert_classes(envelopes, [(18, 40), (27, 40), (22, 60), (22, 40)], ENVELOPE_RECOMMENDED)
+        self._assert_classes(envelopes, [(15, 50), (32, 40), (25, 8), (16, 80)], ENVELOPE_ALLOWED)
+
+    def test_dew_point_edge(self):
+        from utils.psychrometrics import sat_vapor_pressure
+
+        # RH of the 15°C max dew point at 26.1°C, the polygon only follows this curve every ENVELOPE_CURVE_STEP
+        humidity = float(100 * sat_vapor_pressure(15) / sat_vapor_pressure(26.1))
+        classes = default_envelopes().classify([26.1, 26.1], [humidity, humidity + 0.1])
+        self.assertEqual(classes.tolist(), [ENVELOPE_RECOMMENDED, ENVELOPE_ALLOWED])
+
+    def test_outside(self):
+        envelopes = default_envelopes()
+        self._assert_classes(envelopes, [(14.9, 50), (32.1, 40), (25, 7.9), (32, 50), (20, 8)], ENVELOPE_OUTSIDE)
+
+    def test_missing_values(self):
+        classes = default_envelopes().classify([22, None, float('nan')], [40, 40, 40])
+        self.assertEqual(classes.tolist(), [ENVELOPE_RECOMMENDED, ENVELOPE_UNKNOWN, ENVELOPE_UNKNOWN])
+
+
+class CustomEnvelopesTest(SimpleTestCase):
+
+    def test_edges_are_inclusive_in_both_orientations(self):
+        allowed = [[15, 10], [30, 10], [30, 80], [15, 80]]
+        recommended = [[18, 20], [27, 20], [27, 60], [18, 60]]
+        for orientation in (1, -1):
+            with self.subTest(orientation=orientation):
+                envelopes = CompiledEnvelopes(get_array(recommended[::orientation]),
+                                              get_array(allowed[::orientation]))
+                classes = envelopes.classify([18, 27, 22, 15, 30, 31], [40, 60, 20, 50, 10, 50])
+                self.assertEqual(classes.tolist(), [ENVELOPE_RECOMMENDED] * 3 + [ENVELOPE_ALLOWED] * 2
+                                 + [ENVELOPE_OUTSIDE])
+
+
+def get_array(vertices):
+    import numpy as np
+
+    return np.asarray(vertices, dtype=float)
@@ -0,0 +1,107 @@
+import random
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from apps.core.heatmaps import HeatmapLayout, HeatmapGrid, HEATMAP_MIN_DISTANCE
+from utils.constants import IDW_DEFAULT_POWER
+
+
+def make_layout(sensors, neighbors=16, size=12):
+    rng = random.Random(5)
+    points = [(rng.uniform(0, size), rng.uniform(0, size)) for _ in range(sensors)]
+    return HeatmapLayout(size, size, 60, list(range(sensors)), points, [(6, 6, 1.2, 0.6)], neighbors=neighbors), points
+
+
+def dense_idw(layout, points, values):
+    x = (np.arange(layout.columns) + 0.5) * layout.cell_size
+    y = (np.arange(layout.rows) + 0.5) * layout.cell_size
+    cx, cy = (v.ravel() for v in np.meshgrid(x, y))
+    points, values = np.asarray(points), np.asarray(values, dtype=float)
+    weights = np.maximum(np.hypot(cx[:, None] - points[:, 0], cy[:, None] - points[:, 1]),
+                         HEATMAP_MIN_DISTANCE) ** -float(IDW_DEFAULT_POWER)
+    valid = np.isfinite(values)
+    grid = weights[:, valid] @ values[valid] / weights[:, valid].sum(axis=1)
+    grid[layout.empty] = np.nan
+    return grid.reshape(layout.shape)
+
+
+class HeatmapTest(SimpleTestCase):
+
+    def test_weights_are_bounded_by_neighbors(self):
+        layout, _ = make_layout(200, neighbors=8)
+        self.assertEqual(layout.weights.shape, (layout.rows * layout.columns, 200))
+        self.assertEqual(layout.weights.nnz, layout.rows * layout.columns * 8)
+        self.assertEqual(layout.weights.dtype, np.float64)
+
+    def test_matches_dense_idw_when_every_sensor_is_a_neighbor(self):
+        layout, points = make_layout(10)
+        values = [20 + i for i in range(10)]
+        values[3] = None
+        grid = HeatmapGrid(layout)
+        grid.update(dict(enumerate(values)))
+        expected = dense_idw(layout, points, [np.nan if x is None else x for x in values])
+        np.testing.assert_allclose(grid.to_array(), expected, rtol=1e-5)
+
+    def test_incremental_updates_match_a_new_grid(self):
+        layout, _ = make_layout(50, neighbors=8)
+        rng = random.Random(9)
+        readings = {i: rng.uniform(18, 30) for i in range(50)}
+        grid = HeatmapGrid(layout)
+        grid.update(readings)
+        for i in rng.sample(range(50), 5):
+            readings[i] = None if i % 2 else rng.uniform(18, 30)
+        grid.update(readings)
+
+        fresh = HeatmapGrid(layout)
+        fresh.update(readings)
+        np.testing.assert_allclose(grid.to_array(), fresh.to_array(), rtol=1e-5)
+
+    def test_incremental_updates_with_sensors_going_to_none(self):
+        layout, _ = make_layout(50, neighbors=8)
+        rng = random.Random(13)
+        readings = {i: rng.uniform(18, 30) for i in range(50)}
+        grid = HeatmapGrid(layout)
+        grid.update(readings)
+        for _ in range(2000):
+            i = rng.randrange(50)
+            readings[i] = None if rng.random() < 0.3 else rng.uniform(18, 30)
+            grid.update({i: readings[i]})
+
+        # every sensor drops out but one
+        readings = dict.fromkeys(range(50))
+        readings[7] = 25.0
+        for i in range(50):
+            grid.update({i: readings[i]})
+        fresh = HeatmapGrid(layout)
+        fresh.update(readings)
+        result, expected = grid.to_array(), fresh.to_array()
+        np.testing.assert_array_equal(np.isfinite(result), np.isfinite(expected))
+        np.testing.assert_allclose(result[np.isfinite(result)], 25.0, rtol=1e-6)
+
+    def test_flapping_sensor_does_not_drift(self):
+        layout, _ = make_layout(30, neighbors=8)
+        readings = {i: 20 + i / 10 for i in range(30)}
+        grid = HeatmapGrid(layout)
+        grid.update(readings)
+        for n in range(1000):
+            grid.update({4: 35.0 if n % 2 else None})
+        readings[4] = 35.0
+        fresh = HeatmapGrid(layout)
+        fresh.update(readings)
+        np.testing.assert_allclose(grid.to_array(), fresh.to_array(), atol=1e-4)
+
+    def test_new_bucket_starts_from_previous(self):
+        layout, _ = make_layout(30, neighbors=8)
+        readings = {i: 20 + i / 10 for i in range(30)}
+        previous = HeatmapGrid(layout)
+        previous.update(readings)
+
+        readings[4] = 35
+        grid = HeatmapGrid(layout, previous)
+        self.assertEqual(grid.update(readings), 1)
+        fresh = HeatmapGrid(layout)
+        fresh.update(readings)
+        np.testing.assert_allclose(grid.to_array(), fresh.to_array(), rtol=1e-5)
+        # the previous bucket is left as it was
+        self.assertEqual(previous.values[4], 20.4)
@@ -0,0 +1,58 @@
+import datetime
+import io
+import json
+from unittest import skipUnless
+
+from django.db import connections
+from django.test import TestCase
+
+from apps.core.bulk import insert_readings
+from apps.core.models import Data, MeasurementRollup
+from apps.core.timeseries import create_measurement_table
+from code_setting.settings import CLIENT_DB
+from utils.constants import MEASUREMENT_TEMPERATURE, ROLLUP_1_MIN, ROLLUP_1_HOUR
+from utils.parsers import NDJSONStreamParser
+
+
+@skipUnless(connections[CLIENT_DB].vendor == 'postgresql', 'the measurements store needs PostgreSQL')
+class ReadingsIngestionTest(TestCase):
+    databases = {CLIENT_DB}
+
+    def setUp(self):
+        create_measurement_table(CLIENT_DB)
+        self.sensor = Data.objects.using(CLIENT_DB).create(name='s1', mac_address='aa:bb:cc:00:00:01')
+
+    def _rows(self, readings):
+        body = '\n'.join(x if isinstance(x, str) else json.dumps(x) for x in readings).encode()
+        return NDJSONStreamParser().parse(io.BytesIO(body))
+
+    def test_readings_are_stored_and_rolled_up(self):
+        mac = self.sensor.mac_address
+        result = insert_readings(self._rows([
+            {'mac_address': mac, 'timestamp': '2026-01-05T10:00:10Z', 'temperature': 20, 'humidity': 40},
+            {'mac_address': mac, 'timestamp': '2026-01-05T10:00:40Z', 'temperature': 22},
+            {'mac_address': mac, 'timestamp': '2026-01-05T10:01:05Z', 'temperature': 30},
+            {'mac_address': mac, 'timestamp': '2026-01-05T10:00:40Z', 'temperature': 99},
+            {'mac_address': 'unknown', 'timestamp': '2026-01-05T10:00:10Z', 'temperature': 20},
+            {'mac_address': mac, 'timestamp': 'yesterday'},
+            '{not json',
+        ]), CLIENT_DB, batch_size=3)
+
+        self.assertEqual((result.inserted, result.duplicated, result.failed), (3, 1, 3))
+        rollups = MeasurementRollup.objects.using(CLIENT_DB).filter(sensor=self.sensor,
+                                                                    variable=MEASUREMENT_TEMPERATURE)
+        minutes = rollups.filter(resolution=ROLLUP_1_MIN).order_by('bucket')
+        self.assertEqual([(x.bucket.minute, x.count, x.mean) for x in minutes], [(0, 2, 21), (1, 1, 30)])
+        hour = rollups.get(resolution=ROLLUP_1_HOUR)
+        self.assertEqual((hour.bucket, hour.count, hour.minimum, hour.maximum),
+                         (datetime.datetime(2026, 1, 5, 10, tzinfo=datetime.timezone.utc), 3, 20, 30))
+
+    def test_late_readings_refresh_their_bucket(self):
+        mac = self.sensor.mac_address
+        insert_readings(self._rows([{'mac_address': mac, 'timestamp': '2026-01-06T08:00:00Z', 'temperature': 20}]),
+                        CLIENT_DB)
+        insert_readings(self._rows([{'mac_address': mac, 'timestamp': '2026-01-06T08:00:30Z', 'temperature': 24}]),
+                        CLIENT_DB)
+        minute = MeasurementRollup.objects.using(CLIENT_DB).get(sensor=self.sensor, resolution=ROLLUP_1_MIN,
+                                                                variable=MEASUREMENT_TEMPERATURE)
+        self.assertEqual((minute.count, minute.mean), (2, 22))
@@ -0,0 +1,42 @@
+import datetime
+from concurrent.futures import Future
+
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.core.jobs import ProcessPoolJobRunner
+from apps.core.models import Job
+from code_setting.settings import CLIENT_DB, JOBS_TIMEOUT
+from utils.constants import JOB_RUNNING, JOB_PENDING, JOB_FAILED
+
+
+class ProcessPoolJobRunnerSyncTest(TestCase):
+    databases = {'default', CLIENT_DB}
+
+    def setUp(self):
+        self.runner = ProcessPoolJobRunner()
+        started_at = timezone.now() - datetime.timedelta(seconds=JOBS_TIMEOUT + 60)
+        self.job = Job.objects.using(CLIENT_DB).create(kind='row_medians', status=JOB_RUNNING, attempts=1,
+                                                       max_attempts=1, backend=self.runner.name,
+                                                       started_at=started_at)
+
+    def test_jobs_running_in_the_pool_are_not_lost(self):
+        future = Future()
+        self.runner._running[(CLIENT_DB, self.job.id)] = future
+
+        self.assertEqual(self.runner.sync(CLIENT_DB), 0)
+        self.job.refresh_from_db(using=CLIENT_DB)
+        self.assertEqual(self.job.status, JOB_RUNNING)
+
+        # the worker died without calling back: the job is lost once its future is done
+        future.set_result(None)
+        self.assertEqual(self.runner.sync(CLIENT_DB), 1)
+        self.job.refresh_from_db(using=CLIENT_DB)
+        self.assertEqual(self.job.status, JOB_FAILED)
+
+    def test_jobs_of_other_processes_are_recovered(self):
+        Job.objects.using(CLIENT_DB).filter(id=self.job.id).update(max_attempts=2)
+
+        self.assertEqual(self.runner.sync(CLIENT_DB), 1)
+        self.job.refresh_from_db(using=CLIENT_DB)
+        self.assertEqual(self.job.status, JOB_PENDING)
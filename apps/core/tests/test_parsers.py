@@ -0,0 +1,34 @@
+import json
+
+from django.test import SimpleTestCase
+from rest_framework import status
+from rest_framework.test import APIRequestFactory
+
+from apps.core.viewsets import SensorBulkViewSet, ReadingBulkViewSet
+from utils.parsers import StreamRowError
+
+
+class StreamUploadTest(SimpleTestCase):
+    body = b'{"mac_address": "aa:bb:cc:00:00:01"}\n{"mac_address": "aa:bb:cc:00:00:02"}\nnot json\n'
+
+    def _request(self, view, chunked=False):
+        request = APIRequestFactory().generic('POST', '/', self.body, content_type='application/x-ndjson')
+        if chunked:
+            # what the WSGI server hands over for Transfer-Encoding: chunked
+            del request.META['CONTENT_LENGTH']
+            request.META['HTTP_TRANSFER_ENCODING'] = 'chunked'
+        view.args, view.kwargs, view.action_map = (), {}, {'post': 'create'}
+        return view.initialize_request(request)
+
+    def test_chunked_uploads_are_rejected(self):
+        for view in (SensorBulkViewSet(), ReadingBulkViewSet()):
+            response = view.create(self._request(view, chunked=True))
+            self.assertEqual(response.status_code, status.HTTP_411_LENGTH_REQUIRED)
+            self.assertEqual(response.data['result'], 'ERROR')
+
+    def test_rows_are_streamed(self):
+        view = SensorBulkViewSet()
+        rows = list(self._request(view).data)
+        self.assertEqual(rows[:2], [(n, json.loads(x)) for n, x in enumerate(self.body.decode().splitlines()[:2], 1)])
+        self.assertEqual(rows[2][0], 3)
+        self.assertIsInstance(rows[2][1], StreamRowError)
@@ -0,0 +1,54 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from apps.core.models import Data, Event, RelatedTable3
+from utils.querysets import get_field_dtype, load_columns
+
+
+class RowsQuerySet:
+    """
+    values_list of a model answered with fixed rows
+    """
+
+    def __init__(self, model, rows):
+        self.model = model
+        self.rows = rows
+
+    def values_list(self, *fields):
+        return self
+
+    def iterator(self, chunk_size=None):
+        return iter(self.rows)
+
+
+class FieldDtypeTest(SimpleTestCase):
+
+    def test_field_dtypes(self):
+        self.assertEqual(get_field_dtype(RelatedTable3._meta.get_field('power_on')), 'bool')
+        self.assertEqual(get_field_dtype(RelatedTable3._meta.get_field('total_units')), 'int64')
+        self.assertEqual(get_field_dtype(RelatedTable3._meta.get_field('total_units'), null=True), 'float64')
+        self.assertEqual(get_field_dtype(Data._meta.get_field('x')), 'float64')
+
+    def test_lookups_across_nullable_foreign_keys(self):
+        fields = ('related_table3__power_on', 'related_table3__total_units', 'related_table3__x_center')
+        rows = [(True, 42, 1.5), (None, None, None), (False, 40, None)]
+        columns = load_columns(RowsQuerySet(Data, rows), fields, chunk_size=2)
+        np.testing.assert_array_equal(columns['related_table3__power_on'], [1, np.nan, 0])
+        np.testing.assert_array_equal(columns['related_table3__total_units'], [42, np.nan, 40])
+        np.testing.assert_array_equal(columns['related_table3__x_center'], [1.5, np.nan, np.nan])
+
+
+class TrigramIContainsTest(SimpleTestCase):
+
+    def _compile(self, queryset, connection):
+        return queryset.query.get_compiler(connection=connection).as_sql()
+
+    def test_postgresql_uses_ilike_on_the_column(self):
+        from django.db import connections
+        from django.db.backends.postgresql.base import DatabaseWrapper
+
+        connection = DatabaseWrapper(dict(connections['default'].settings_dict), 'trigram')
+        sql, params = self._compile(Event.objects.filter(text__trigram_icontains='50%_load'), connection)
+        self.assertIn('"core_events"."text" ILIKE %s', sql)
+        self.assertNotIn('UPPER', sql)
+        self.assertEqual(params, ('%50\\%\\_load%',))
@@ -0,0 +1,52 @@
+import datetime
+from unittest import skipUnless
+
+from django.db import connections
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.core.models import Data, Measurement, RelatedTable1, RelatedTable2, Table1
+from apps.core.row_medians import refresh_row_medians
+from apps.core.timeseries import create_measurement_table, insert_measurements
+from code_setting.settings import CLIENT_DB
+from utils.constants import ROLLUP_15_MIN
+
+
+@skipUnless(connections[CLIENT_DB].vendor == 'postgresql', 'the measurements store needs PostgreSQL')
+class RowMediansRefreshTest(TestCase):
+    databases = {'default', CLIENT_DB}
+
+    def setUp(self):
+        create_measurement_table(CLIENT_DB)
+        room = RelatedTable1.objects.using(CLIENT_DB).create(
+            table1=Table1.objects.using(CLIENT_DB).create(name='site'), name='room')
+        self.row = RelatedTable2.objects.using(CLIENT_DB).create(related_table1=room, name='row', cold_pos=0,
+                                                                 hot_pos=10)
+        self.sensor = Data.objects.using(CLIENT_DB).create(name='s1', mac_address='aa:bb:cc:00:00:01',
+                                                           related_table2=self.row, y=1)
+        epoch = int(timezone.now().timestamp())
+        self.window = datetime.datetime.fromtimestamp(epoch - epoch % ROLLUP_15_MIN, tz=datetime.timezone.utc)
+
+    def _median(self):
+        self.row.refresh_from_db(using=CLIENT_DB)
+        return self.row.cold_row_temperature_median
+
+    def test_readings_committed_late_are_counted(self):
+        # a reading whose id was taken before the refresh but committed after it
+        with connections[CLIENT_DB].cursor() as cursor:
+            cursor.execute("SELECT nextval(pg_get_serial_sequence('core_measurements', 'id'))")
+            late_id = cursor.fetchone()[0]
+
+        insert_measurements([(self.sensor.id, self.window + datetime.timedelta(seconds=1), 20, None, None)],
+                            CLIENT_DB)
+        self.assertEqual(refresh_row_medians(CLIENT_DB), 1)
+        self.assertEqual(self._median(), 20)
+
+        Measurement.objects.using(CLIENT_DB).create(id=late_id, sensor=self.sensor, timestamp=self.window,
+                                                    temperature=30)
+        self.assertEqual(refresh_row_medians(CLIENT_DB), 1)
+        self.assertEqual(self._median(), 25)
+
+        # nothing is counted twice
+        refresh_row_medians(CLIENT_DB)
+        self.assertEqual(self._median(), 25)
@@ -0,0 +1,98 @@
+import datetime
+import random
+import uuid
+from unittest import mock, skipUnless
+
+from django.db import connections
+from django.test import SimpleTestCase, TestCase
+
+from apps.core.models import Data, MeasurementRollup, RelatedTable1, RelatedTable2, Table1
+from apps.core.psychrometrics import get_room_psychrometrics
+from apps.core.row_medians import get_row_side
+from apps.core.site_model import (SITE_ROW_SIDES, IdIndex, SiteModel, get_site_model, invalidate_site_model,
+                                  site_model_cache)
+from code_setting.settings import CLIENT_DB
+from utils.constants import MEASUREMENT_HUMIDITY, ROLLUP_15_MIN
+
+
+class IdIndexTest(SimpleTestCase):
+
+    def test_positions_of_ids(self):
+        # the last one ends with zero bytes, dropped by numpy S arrays
+        ids = [uuid.uuid4() for _ in range(50)] + [uuid.UUID(bytes=b'\x01' * 8 + b'\0' * 8)]
+        index = IdIndex(ids)
+
+        self.assertEqual(len(index), len(ids))
+        self.assertEqual([index[i] for i in range(len(ids))], ids)
+        self.assertEqual(list(index.get(ids)), list(range(len(ids))))
+        self.assertEqual(list(index.get([str(ids[7]), uuid.uuid4(), None, ids[-1]])), [7, -1, -1, len(ids) - 1])
+
+    def test_empty_index(self):
+        self.assertEqual(list(IdIndex([]).get([uuid.uuid4(), None])), [-1, -1])
+        self.assertEqual(len(IdIndex([uuid.uuid4()]).get([])), 0)
+
+
+class SiteModelTest(SimpleTestCase):
+
+    def test_row_sides_match_get_row_side(self):
+        generator = random.Random(7)
+        room = uuid.uuid4()
+        positions = (None, 0.0, 1.5, 4.0, 6.0)
+        rows = [(uuid.uuid4(), room, generator.choice(positions), generator.choice(positions)) for _ in range(10)]
+        sensors = [(uuid.uuid4(), 1.0, generator.choice((None, 0.0, 0.75, 2.0, 2.75, 5.0, 7.0)), 1.0,
+                    generator.choice(rows + [(None, )])[0], None, room) for _ in range(300)]
+        site = SiteModel(uuid.uuid4(), [(room, 10, 10, 3, 1)], rows, [], sensors)
+
+        by_id = {x[0]: x for x in rows}
+        expected = []
+        for sensor in sensors:
+            row = by_id.get(sensor[4])
+            side = get_row_side(sensor[2], row[2], row[3]) if row else None
+            expected.append(SITE_ROW_SIDES.index(side) if side else -1)
+        self.assertEqual(site.get_sensor_row_sides().tolist(), expected)
+
+
+class SiteModelCacheTest(TestCase):
+    # the versions live in the default cache
+    databases = {'default'}
+
+    def test_invalidation_rebuilds_the_site(self):
+        table1_id, other_id = uuid.uuid4(), uuid.uuid4()
+        with mock.patch('apps.core.site_model.build_site_model', side_effect=lambda *args: object()) as build:
+            first = get_site_model(table1_id, CLIENT_DB)
+            self.assertIs(get_site_model(str(table1_id), CLIENT_DB), first)
+
+            invalidate_site_model(other_id, CLIENT_DB)
+            self.assertIs(get_site_model(table1_id, CLIENT_DB), first)
+            self.assertEqual(build.call_count, 1)
+
+            invalidate_site_model(str(table1_id), CLIENT_DB)
+            self.assertIsNot(get_site_model(table1_id, CLIENT_DB), first)
+            self.assertEqual(build.call_count, 2)
+        site_model_cache.clear()
+
+
+@skipUnless(connections[CLIENT_DB].vendor == 'postgresql', 'the latest rollups need PostgreSQL')
+class RoomPsychrometricsTest(TestCase):
+    databases = {'default', CLIENT_DB}
+
+    def test_aisle_humidities(self):
+        table1 = Table1.objects.using(CLIENT_DB).create(name='site')
+        room = RelatedTable1.objects.using(CLIENT_DB).create(table1=table1, name='room')
+        row = RelatedTable2.objects.using(CLIENT_DB).create(related_table1=room, name='row', cold_pos=0, hot_pos=4,
+                                                            cold_row_temperature_median=20,
+                                                            hot_row_temperature_median=35)
+        bucket = datetime.datetime(2026, 1, 5, 10, tzinfo=datetime.timezone.utc)
+        for i, (y, humidity) in enumerate(((0.5, 40), (1, 50), (1.5, 45), (3, 30), (None, 99))):
+            sensor = Data.objects.using(CLIENT_DB).create(name=f's{i}', mac_address=f'aa:bb:cc:00:00:0{i}',
+                                                          table1=table1, related_table1=room, related_table2=row,
+                                                          x=1, y=y)
+            MeasurementRollup.objects.using(CLIENT_DB).create(
+                sensor=sensor, resolution=ROLLUP_15_MIN, variable=MEASUREMENT_HUMIDITY, bucket=bucket, count=1,
+                minimum=humidity, maximum=humidity, mean=humidity, median=humidity)
+
+        cold, hot = get_room_psychrometrics(room.id, CLIENT_DB)
+        self.assertEqual((cold['side'], cold['temperature'], cold['humidity']), (SITE_ROW_SIDES[0], 20, 45))
+        self.assertEqual((hot['side'], hot['temperature'], hot['humidity']), (SITE_ROW_SIDES[1], 35, 30))
+        self.assertIsNotNone(cold['dew_point'])
+        site_model_cache.clear()
@@ -0,0 +1,69 @@
+import math
+import random
+
+from django.test import SimpleTestCase
+
+from utils.sketches import P2Quantile, percentile_cont
+
+
+class PercentileContTest(SimpleTestCase):
+
+    def test_interpolates_between_values(self):
+        self.assertEqual(percentile_cont([1, 2, 3, 4]), 2.5)
+        self.assertEqual(percentile_cont([4, 1, 3]), 3)
+        self.assertAlmostEqual(percentile_cont([0, 10], 0.9), 9)
+
+    def test_empty(self):
+        self.assertIsNone(percentile_cont([]))
+
+
+class P2QuantileTest(SimpleTestCase):
+
+    def _check(self, values, p, tolerance):
+        sketch = P2Quantile(p)
+        sketch.update(values)
+        exact = percentile_cont(values, p)
+        spread = percentile_cont(values, 0.95) - percentile_cont(values, 0.05)
+        self.assertLessEqual(abs(sketch.value() - exact), tolerance * spread, f'p={p}')
+
+    def test_exact_while_buffered(self):
+        values = [random.Random(1).uniform(18, 30) for _ in range(50)]
+        sketch = P2Quantile(buffer_size=64)
+        sketch.update(values)
+        self.assertEqual(sketch.value(), percentile_cont(values))
+
+    def test_against_exact_quantiles(self):
+        rng = random.Random(7)
+        distributions = {
+            'normal': [rng.gauss(22, 2) for _ in range(20000)],
+            'uniform': [rng.uniform(15, 35) for _ in range(20000)],
+            'skewed': [18 + rng.expovariate(0.5) for _ in range(20000)],
+        }
+        for name, values in distributions.items():
+            for p in (0.5, 0.9):
+                with self.subTest(distribution=name, p=p):
+                    self._check(values, p, 0.01)
+
+    def test_drift(self):
+        # the markers lag behind a trend, as the temperature of a row warming up during a window
+        rng = random.Random(11)
+        values = [20 + i / 2000 + rng.gauss(0, 0.3) for i in range(20000)]
+        for p in (0.5, 0.9):
+            with self.subTest(p=p):
+                self._check(values, p, 0.05)
+
+    def test_ignores_missing_values(self):
+        sketch = P2Quantile()
+        sketch.update([1, None, float('nan'), float('inf'), 3])
+        self.assertEqual(sketch.count, 2)
+        self.assertEqual(sketch.value(), 2)
+
+    def test_state_round_trip(self):
+        rng = random.Random(3)
+        sketch = P2Quantile()
+        sketch.update(rng.gauss(22, 2) for _ in range(1000))
+        copy = P2Quantile.from_dict(sketch.to_dict())
+        for value in [rng.gauss(22, 2) for _ in range(1000)]:
+            sketch.add(value)
+            copy.add(value)
+        self.assertTrue(math.isclose(sketch.value(), copy.value()))
@@ -0,0 +1,37 @@
+from django.db import connections
+from django.test import SimpleTestCase
+
+from code_setting.settings import CLIENT_DB
+from code_setting.tenants import TenantRegistry, _set_connection_databases
+
+
+class TenantActivationTest(SimpleTestCase):
+
+    def setUp(self):
+        self.databases = connections.databases
+        self.addCleanup(_set_connection_databases, self.databases)
+
+    def test_aliases_are_added_copy_on_write(self):
+        registry = TenantRegistry()
+        registry._tenants['acme_copy'] = dict(self.databases[CLIENT_DB])
+
+        # a thread iterating the connections keeps its own dict
+        aliases = iter(connections)
+        self.assertTrue(registry.activate('acme_copy'))
+        self.assertEqual(list(aliases), list(self.databases))
+
+        self.assertNotIn('acme_copy', self.databases)
+        self.assertIsNot(connections.databases, self.databases)
+        self.assertEqual(connections.databases['acme_copy']['NAME'], self.databases[CLIENT_DB]['NAME'])
+        self.assertIn('acme_copy', list(connections))
+
+        # already registered: the dict is not copied again
+        databases = connections.databases
+        self.assertTrue(registry.activate('acme_copy'))
+        self.assertIs(connections.databases, databases)
+
+    def test_unknown_aliases_are_not_registered(self):
+        registry = TenantRegistry()
+        registry.get_company_model = lambda: None
+        self.assertFalse(registry.activate('nobody'))
+        self.assertIs(connections.databases, self.databases)
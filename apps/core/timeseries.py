@@ -0,0 +1,229 @@
+"""
+    Time-series store of sensor readings: daily range partitions in PostgreSQL and rollups
+"""
+import datetime
+
+from django.db import connections, transaction
+from psycopg2.errors import CheckViolation
+from psycopg2.extras import execute_values
+
+from apps.core.models import Measurement, MeasurementRollup
+from utils.constants import (MEASUREMENT_FIELDS, ROLLUP_1_MIN, ROLLUP_15_MIN, ROLLUP_1_HOUR)
+
+MEASUREMENTS_PARTITION_FORMAT = '{table}_p{day:%Y%m%d}'
+
+# partitions already created in this process by database. Another process may drop them (retention), inserts
+# that find no partition forget them and create them again
+_known_partitions = {}
+
+
+def _quote(db, name):
+    return connections[db].ops.quote_name(name)
+
+
+def _column(model, db, name):
+    return _quote(db, model._meta.get_field(name).column)
+
+
+def _day(value):
+    return value.date() if isinstance(value, datetime.datetime) else value
+
+
+def create_measurement_table(db):
+    """
+    Create the partitioned measurements table and its indexes if they do not exist
+    @param db: database
+    """
+    table = _quote(db, Measurement._meta.db_table)
+    sensor, timestamp = _column(Measurement, db, 'sensor'), _column(Measurement, db, 'timestamp')
+    with connections[db].cursor() as cursor:
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS {table} ('
+                       f'id bigserial, '
+                       f'{sensor} uuid NOT NULL, '
+                       f'{timestamp} timestamp with time zone NOT NULL, '
+                       f'temperature real, '
+                       f'humidity real, '
+                       f'pressure real, '
+                       f'PRIMARY KEY (id, {timestamp})'
+                       f') PARTITION BY RANGE ({timestamp})')
+        cursor.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS {Measurement._meta.db_table}_sensor_timestamp '
+                       f'ON {table} ({sensor}, {timestamp})')
+
+
+def get_partition_name(day):
+    return MEASUREMENTS_PARTITION_FORMAT.format(table=Measurement._meta.db_table, day=day)
+
+
+def list_measurement_partitions(db):
+    """
+    @param db: database
+    @return: sorted list of (day, partition name)
+    """
+    with connections[db].cursor() as cursor:
+        cursor.execute('SELECT child.relname FROM pg_inherits '
+                       'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+                       'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+                       'WHERE parent.relname = %s', [Measurement._meta.db_table])
+        names = [x[0] for x in cursor.fetchall()]
+
+    prefix = f'{Measurement._meta.db_table}_p'
+    partitions = []
+    for name in names:
+        try:
+            partitions.append((datetime.datetime.strptime(name[len(prefix):], '%Y%m%d').date(), name))
+        except ValueError:
+            continue
+    return sorted(partitions)
+
+
+def ensure_measurement_partitions(db, start, end):
+    """
+    Create the daily partitions covering [start, end]
+    @param db: database
+    @param start: first date or datetime (UTC)
+    @param end: last date or datetime (UTC)
+    """
+    known = _known_partitions.setdefault(db, set())
+    table = _quote(db, Measurement._meta.db_table)
+    day, end = _day(start), _day(end)
+
+    with connections[db].cursor() as cursor:
+        while day <= end:
+            if day not in known:
+                next_day = day + datetime.timedelta(days=1)
+                cursor.execute(f'CREATE TABLE IF NOT EXISTS {_quote(db, get_partition_name(day))} '
+                               f'PARTITION OF {table} '
+                               f"FOR VALUES FROM ('{day.isoformat()} 00:00:00+00') "
+                               f"TO ('{next_day.isoformat()} 00:00:00+00')")
+                known.add(day)
+            day += datetime.timedelta(days=1)
+
+
+def forget_measurement_partitions(db):
+    _known_partitions.pop(db, None)
+
+
+def drop_measurement_partitions(db, before):
+    """
+    Retention: drop the whole daily partitions ending before a date, no row deletes
+    @param db: database
+    @param before: date or datetime (UTC), partitions with data older than it are dropped
+    @return: list of dropped partition names
+    """
+    before = _day(before)
+    dropped = []
+    with connections[db].cursor() as cursor:
+        for day, name in list_measurement_partitions(db):
+            if day + datetime.timedelta(days=1) <= before:
+                cursor.execute(f'DROP TABLE IF EXISTS {_quote(db, name)}')
+                _known_partitions.get(db, set()).discard(day)
+                dropped.append(name)
+    return dropped
+
+
+def insert_measurements(readings, db):
+    """
+    Insert raw readings, the partitions are created when needed and repeated (sensor, timestamp) are ignored
+    @param readings: list of (sensor_id, timestamp, temperature, humidity, pressure)
+    @param db: database
+    @return: number of inserted readings
+    """
+    if not readings:
+        return 0
+
+    timestamps = [x[1] for x in readings]
+    start, end = min(timestamps), max(timestamps)
+    ensure_measurement_partitions(db, start, end)
+
+    table = _quote(db, Measurement._meta.db_table)
+    columns = ', '.join(_column(Measurement, db, x) for x in ('sensor', 'timestamp', 'temperature',
+                                                               'humidity', 'pressure'))
+    conflict = ', '.join(_column(Measurement, db, x) for x in ('sensor', 'timestamp'))
+    sql = f'INSERT INTO {table} ({columns}) VALUES %s ON CONFLICT ({conflict}) DO NOTHING RETURNING 1'
+
+    try:
+        with transaction.atomic(using=db), connections[db].cursor() as cursor:
+            inserted = execute_values(cursor.cursor, sql, readings, page_size=1000, fetch=True)
+    except CheckViolation as ex:
+        # no partition of relation "..." found for row
+        if 'no partition' not in str(ex):
+            raise
+        # a partition known by this process was dropped by another one
+        forget_measurement_partitions(db)
+        ensure_measurement_partitions(db, start, end)
+        with transaction.atomic(using=db), connections[db].cursor() as cursor:
+            inserted = execute_values(cursor.cursor, sql, readings, page_size=1000, fetch=True)
+    return len(inserted)
+
+
+def _floor(value, resolution):
+    epoch = int(value.timestamp())
+    return datetime.datetime.fromtimestamp(epoch - epoch % resolution, tz=datetime.timezone.utc)
+
+
+def refresh_rollups(db, start, end, resolutions=(ROLLUP_1_MIN, ROLLUP_15_MIN, ROLLUP_1_HOUR)):
+    """
+    Compute min/max/mean/median rollups of every variable for the buckets touching [start, end)
+    Buckets are recomputed from the raw readings, so the refresh is idempotent.
+    @param db: database
+    @param start: datetime
+    @param end: datetime
+    @param resolutions: resolutions in seconds
+    """
+    raw = _quote(db, Measurement._meta.db_table)
+    sensor, timestamp = _column(Measurement, db, 'sensor'), _column(Measurement, db, 'timestamp')
+    rollups = _quote(db, MeasurementRollup._meta.db_table)
+    fields = ('sensor', 'resolution', 'variable', 'bucket', 'count', 'minimum', 'maximum', 'mean', 'median')
+    columns = {x: _column(MeasurementRollup, db, x) for x in fields}
+    values = ', '.join(f'({variable}, m.{_quote(db, field)})' for variable, field in MEASUREMENT_FIELDS.items())
+    updates = ', '.join(f'{columns[x]} = EXCLUDED.{columns[x]}' for x in fields[4:])
+
+    with transaction.atomic(using=db), connections[db].cursor() as cursor:
+        for resolution in resolutions:
+            cursor.execute(
+                f'INSERT INTO {rollups} ({", ".join(columns.values())}) '
+                f'SELECT m.{sensor}, %(resolution)s, v.variable, '
+                f'to_timestamp(floor(extract(epoch FROM m.{timestamp}) / %(resolution)s) * %(resolution)s) AS bucket, '
+                f'count(v.value), min(v.value), max(v.value), avg(v.value), '
+                f'percentile_cont(0.5) WITHIN GROUP (ORDER BY v.value) '
+                f'FROM {raw} m CROSS JOIN LATERAL (VALUES {values}) AS v(variable, value) '
+                f'WHERE m.{timestamp} >= %(start)s AND m.{timestamp} < %(end)s AND v.value IS NOT NULL '
+                f'GROUP BY m.{sensor}, v.variable, bucket '
+                f'ON CONFLICT ({columns["sensor"]}, {columns["resolution"]}, {columns["variable"]}, '
+                f'{columns["bucket"]}) DO UPDATE SET {updates}',
+                {'resolution': resolution,
+                 'start': _floor(start, resolution),
+                 'end': _floor(end - datetime.timedelta(microseconds=1), resolution)
+                 + datetime.timedelta(seconds=resolution)})
+
+
+def get_rollup_resolution(start, end):
+    """
+    Coarsest resolution that still gives a detailed chart for the range
+    """
+    span = end - start
+    if span <= datetime.timedelta(hours=6):
+        return ROLLUP_1_MIN
+    if span <= datetime.timedelta(days=7):
+        return ROLLUP_15_MIN
+    return ROLLUP_1_HOUR
+
+
+def get_rollups(db, variable, start, end, resolution=None, **filters):
+    """
+    Rollups to draw dashboards without scanning raw readings
+    @param db: database
+    @param variable: MEASUREMENT_* variable
+    @param start: datetime
+    @param end: datetime
+    @param resolution: ROLLUP_* resolution, chosen from the range by default
+    @param filters: extra filters, e.g. sensor__related_table2_id=...
+    @return: queryset of MeasurementRollup
+    """
+    return MeasurementRollup.objects.using(db).filter(
+        variable=variable,
+        resolution=resolution or get_rollup_resolution(start, end),
+        bucket__gte=start,
+        bucket__lt=end,
+        **filters
+    ).order_by('sensor_id', 'bucket')
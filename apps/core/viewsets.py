@@ -1,19 +1,43 @@
-from django.contrib.postgres.search import SearchVector, SearchQuery, SearchRank
+import base64
+import datetime
+
 from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
-from apps.core.models import (Country, Table1, Feedback, Event, Files)
-from apps.core.serializers import Table1Serializer, FeedbackSerializer, EventLiteSerializer, \
+from apps.core.bulk import upsert_sensors, insert_readings
+from apps.core.charts import render_table1_chart
+from apps.core.dynamic_help import LANGUAGE_CODES, get_dynamic_help
+from apps.core.exports import EXPORTS, EXPORT_CSV, EXPORT_CONTENT_TYPES, stream_export
+from apps.core.filters import get_time_filter
+from apps.core.heatmaps import get_room_heatmap
+from apps.core.jobs import submit_job, cancel_job
+from apps.core.models import (Country, Table1, RelatedTable1, Feedback, Event, Job)
+from apps.core.search import SEARCH_CONFIGS, search_events
+from apps.core.serializers import Table1Serializer, FeedbackSerializer, EventLiteSerializer, JobSerializer, \
     EventSerializer
-from utils.constants import CHOISES_CLASSES, DYNAMIC_HELP
-from utils.helpers import convert_str_to_date
-
-
-class TableViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, GenericViewSet):
+from apps.core.suggestions import SUGGESTIONS_LIMIT, get_event_suggestions
+from apps.core.structure import get_table1_structure, get_cached_table1_structure
+from apps.core.timeseries import get_rollups
+from code_setting.middleware import db_ctx
+from code_setting.settings import LANGUAGE_EN
+from utils.constants import CHOISES_CLASSES, MEASUREMENT_TEMPERATURE, ROLLUP_15_MIN, JOB_STATUSES
+from utils.conditional import ConditionalResponseMixin, etag_matches, not_modified
+from utils.helpers import convert_str_to_date, convert_str_to_datetime_for_services
+from utils.paginations import KeysetPaginationMixin
+from utils.parsers import NDJSONStreamParser, CSVStreamParser, has_content_length
+from utils.permissions import IsAuthorized
+
+
+class TableViewSet(ConditionalResponseMixin, mixins.CreateModelMixin, mixins.ListModelMixin,
+                   mixins.RetrieveModelMixin, GenericViewSet):
 
     queryset = Table1.objects.all()
     serializer_class = Table1Serializer
@@ -104,39 +128,18 @@ class TableViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.Retrie
                     'detail': 'table1_id is missing or empty'
                 }, status=status.HTTP_400_BAD_REQUEST)
 
-            try:
-                table1_id = Table1.objects.get(id=table1_id)
-            except Table1.DoesNotExist:
-                return Response({
-                    'result': 'ERROR',
-                    'detail': f'Table1 does not exist for table1_id: {table1_id}'
-                }, status=status.HTTP_400_BAD_REQUEST)
+            db = db_ctx.get()
+            data_list = get_cached_table1_structure(table1_id, db)
+            if data_list is None:
+                if not Table1.objects.filter(id=table1_id).exists():
+                    return Response({
+                        'result': 'ERROR',
+                        'detail': f'Table1 does not exist for table1_id: {table1_id}'
+                    }, status=status.HTTP_400_BAD_REQUEST)
 
-            results = []
-            data_list = []
-            for obj in table1_id.relatedtable1_set.all():
-                daat2_list = []
-                for int_obj in obj.relatedtable2_set.all():
-                    data3_list = []
-                    for int_obj2 in int_obj.relatedtable3_set.all():
-                        data3_list.append(Table1Serializer(int_obj2).data)
-
-                    daat2_list.append({
-                        'name': int_obj.name,
-                        'id': int_obj.id,
-                        'is_horizontal': int_obj.is_horizontal,
-                        'cold_pos': int_obj.cold_pos,
-                        'hot_pos': int_obj.hot_pos,
-                        'racks': data3_list
-                    })
-
-                data_list.append({
-                    'name': obj.name,
-                    'id': obj.id,
-                    'rows': daat2_list
-                })
+                data_list = get_table1_structure(table1_id, db)
 
-            results.append({'data': data_list})
+            results = [{'data': data_list}]
 
             return Response({
                 'result': 'OK',
@@ -150,8 +153,41 @@ class TableViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.Retrie
                 'detail': ex.__str__()
             }, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(methods=['get'], detail=True)
+    def chart(self, request, *args, **kwargs):
+        """
+        Psychrometric chart (PNG) of the operation envelopes and the current aisle states of a Table1.
+        Answers 202 while its background is being rendered
+        """
+        try:
+            table1_id = kwargs['pk']
+            if not Table1.objects.filter(id=table1_id).exists():
+                return Response({
+                    'result': 'ERROR',
+                    'detail': f'Table1 does not exist for table1_id: {table1_id}'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            png = render_table1_chart(table1_id, db_ctx.get())
+            if png is None:
+                return Response({
+                    'result': 'PENDING',
+                    'detail': 'Chart is being rendered, try again in a few seconds'
+                }, status=status.HTTP_202_ACCEPTED, headers={'Retry-After': '2'})
+
+            return HttpResponse(png, content_type='image/png')
+
+        except Exception as ex:
+            return Response({
+                'result': 'ERROR',
+                'detail': ex.__str__()
+            }, status=status.HTTP_400_BAD_REQUEST)
+
 
-class FeedbackViewSet(mixins.ListModelMixin, mixins.CreateModelMixin, GenericViewSet):
+class FeedbackViewSet(ConditionalResponseMixin, KeysetPaginationMixin, mixins.ListModelMixin, mixins.CreateModelMixin,
+                      GenericViewSet):
+    """
+    list: page number pagination, or keyset pagination (newest first) with ?paging=keyset
+    """
 
     queryset = Feedback.objects.all()
     serializer_class = FeedbackSerializer
@@ -213,19 +249,27 @@ class DynamicHelpViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
 
                 }, status=status.HTTP_400_BAD_REQUEST)
 
-            result = DYNAMIC_HELP[ui_component]
-            try:
-                image = Files.objects.get(name=result['text1']['image'])
-                for key, value in result.items():
-                    if value['image'] == image.name:
-                        value['image'] = f"{image.file.url}" if image.file else None
-            except:
-                image = ''
+            language = request.GET.get('language', None) or None
+            if language is not None and language not in LANGUAGE_CODES:
+                return Response({
+                    'result': 'ERROR',
+                    'detail': f'language must be one of {", ".join(LANGUAGE_CODES)}'
+                }, status=status.HTTP_400_BAD_REQUEST)
 
-            return Response({
-                'result': result,
+            snapshot = get_dynamic_help(db_ctx.get(), language).get(ui_component)
+            if snapshot is None:
+                return Response({
+                    'result': 'ERROR',
+                    'detail': f'ui_component does not exist: {ui_component}'
+                }, status=status.HTTP_400_BAD_REQUEST)
 
-            }, status=status.HTTP_200_OK)
+            etag, body = snapshot
+            if etag_matches(request, etag):
+                return not_modified(etag)
+
+            response = HttpResponse(body, content_type='application/json')
+            response['ETag'] = etag
+            return response
 
         except Exception as ex:
             return Response({
@@ -234,34 +278,37 @@ class DynamicHelpViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
 
 
-class EventViewSet(mixins.ListModelMixin, mixins.CreateModelMixin, GenericViewSet):
+class EventViewSet(ConditionalResponseMixin, mixins.ListModelMixin, mixins.CreateModelMixin, GenericViewSet):
 
     queryset = Event.objects.all()
     serializer_class = EventSerializer
 
+    def get_conditional_queryset(self):
+        return Event.objects.filter(table1_id=self.kwargs['table_pk'])
+
     def list(self, request, *args, **kwargs):
+        return self.conditional_response(self.list_events, request, *args, **kwargs)
+
+    def list_events(self, request, *args, **kwargs):
         try:
-            table1 = Table1.objects.get(id=kwargs['table1_pk'])
+            table1 = Table1.objects.get(id=kwargs['table_pk'])
             query = str(request.GET.get("q", ''))
             date_txt = request.GET.get('date', None)
+            events = Event.objects.filter(table1=table1)
 
             if not date_txt and not query:
-                docs = Event.objects.filter(table1=table1).order_by('-created_at')[:10]
+                docs = events.order_by('-created_at')[:10]
 
             elif date_txt and query:
                 date = convert_str_to_date(date_txt)
-                vector = SearchVector(f'text', weight='A',)
-                searchquery = SearchQuery(query)
-                docs = Event.objects.filter(created_at__date=date, table1=table1).annotate(rank=SearchRank(vector, searchquery)).filter(rank__gte=0.1)
+                docs = search_events(events.filter(created_at__date=date), query)
 
             elif date_txt and not query:
                 date = convert_str_to_date(date_txt)
-                docs = Event.objects.filter(created_at__date=date, table1=table1)
+                docs = events.filter(created_at__date=date)
 
             else:
-                vector = SearchVector(f'text', weight='A', )
-                searchquery = SearchQuery(query)
-                docs = Event.objects.annotate(rank=SearchRank(vector, searchquery)).filter(rank__gte=0.1)[:5]
+                docs = search_events(events, query)[:5]
 
             if not docs:
                 docs = Event.objects.filter(table1=table1).order_by('-created_at')[:5]
@@ -303,9 +350,17 @@ class EventViewSet(mixins.ListModelMixin, mixins.CreateModelMixin, GenericViewSe
                 if not date_txt:
                     date_txt = timezone.now()
 
+                language = request.data.get('language', LANGUAGE_EN)
+                if language not in SEARCH_CONFIGS:
+                    return Response({
+                        'result': 'ERROR',
+                        'detail': f'language must be one of {", ".join(SEARCH_CONFIGS)}'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+
                 event = Event(created_by=request.user.email,
                               table1=table1,
                               text=text,
+                              language=language,
                               created_at=date_txt,
                               updated_at=date_txt)
                 event.save()
@@ -397,13 +452,11 @@ class EventSearchesViewSet(mixins.ListModelMixin, mixins.CreateModelMixin, Gener
 
     def list(self, request, *args, **kwargs):
         try:
-            table1 = Table1.objects.get(id=kwargs['table1_pk'])
+            table1 = Table1.objects.only('id').get(id=kwargs['table_pk'])
             q = request.GET.get('q', '')
-            responses = table1.event_set.filter(text__icontains=q).distinct() if q else None
+            limit = request.GET.get('limit', SUGGESTIONS_LIMIT)
 
-            results = []
-            for response in responses:
-                results.append({'text': response.text})
+            results = [{'text': text} for text in get_event_suggestions(table1.id, q, db_ctx.get(), limit)]
 
             return Response({
                 'result': results
@@ -414,3 +467,275 @@ class EventSearchesViewSet(mixins.ListModelMixin, mixins.CreateModelMixin, Gener
                 'result': 'ERROR',
                 'detail': ex.__str__()
             }, status=status.HTTP_400_BAD_REQUEST)
+
+
+class SensorBulkViewSet(mixins.CreateModelMixin, GenericViewSet):
+    """
+    Register sensors streaming NDJSON (application/x-ndjson) or CSV (text/csv) rows, upserted on mac_address
+    """
+    parser_classes = (NDJSONStreamParser, CSVStreamParser)
+
+    def create(self, request, *args, **kwargs):
+        if not has_content_length(request):
+            return Response({
+                'result': 'ERROR',
+                'detail': 'Content-Length is required, chunked uploads are not supported'
+            }, status=status.HTTP_411_LENGTH_REQUIRED)
+
+        try:
+            result = upsert_sensors(request.data, db_ctx.get())
+
+            return Response({
+                'result': 'OK',
+                'detail': 'Sensors succesfully registered!',
+                **result.to_dict()
+            }, status=status.HTTP_200_OK)
+
+        except Exception as ex:
+            return Response({
+                'result': 'ERROR',
+                'detail': ex.__str__()
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ReadingBulkViewSet(mixins.CreateModelMixin, GenericViewSet):
+    """
+    Store sensor readings streaming NDJSON (application/x-ndjson) or CSV (text/csv) rows of mac_address,
+    timestamp, temperature, humidity and pressure. The rollups of the buckets they touch are refreshed
+    """
+    parser_classes = (NDJSONStreamParser, CSVStreamParser)
+
+    def create(self, request, *args, **kwargs):
+        if not has_content_length(request):
+            return Response({
+                'result': 'ERROR',
+                'detail': 'Content-Length is required, chunked uploads are not supported'
+            }, status=status.HTTP_411_LENGTH_REQUIRED)
+
+        try:
+            result = insert_readings(request.data, db_ctx.get())
+
+            return Response({
+                'result': 'OK',
+                'detail': 'Readings succesfully stored!',
+                **result.to_dict()
+            }, status=status.HTTP_200_OK)
+
+        except Exception as ex:
+            return Response({
+                'result': 'ERROR',
+                'detail': ex.__str__()
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+
+class MeasurementViewSet(mixins.ListModelMixin, GenericViewSet):
+    """
+    Rollups of the sensor readings of a Table1 for dashboards
+    """
+
+    def list(self, request, *args, **kwargs):
+        try:
+            variable = request.GET.get('variable', None)
+            if variable is None:
+                return Response({
+                    'result': 'ERROR',
+                    'detail': 'variable is missing or empty'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            range_filter = request.GET.get('range', None)
+            if range_filter:
+                splitted_range = range_filter.split(',')
+                start = timezone.make_aware(convert_str_to_datetime_for_services(splitted_range[0]))
+                end = timezone.make_aware(convert_str_to_datetime_for_services(splitted_range[1])) \
+                    + datetime.timedelta(days=1)
+            else:
+                end = timezone.now()
+                start = end - datetime.timedelta(hours=int(request.GET.get('hrs', 24)))
+
+            filters = {'sensor__table1_id': kwargs['table_pk']}
+            if request.GET.get('row', None):
+                filters['sensor__related_table2_id'] = request.GET['row']
+            if request.GET.get('sensor', None):
+                filters['sensor_id'] = request.GET['sensor']
+
+            rollups = get_rollups(db_ctx.get(), int(variable), start, end,
+                                  resolution=int(request.GET.get('resolution', 0)) or None, **filters)
+
+            return Response({
+                'result': list(rollups.values('sensor_id', 'bucket', 'count', 'minimum', 'maximum',
+                                              'mean', 'median'))
+            }, status=status.HTTP_200_OK)
+
+        except Exception as ex:
+            return Response({
+                'result': 'ERROR',
+                'detail': ex.__str__()
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+
+class HeatmapViewSet(mixins.RetrieveModelMixin, GenericViewSet):
+    """
+    Interpolated grid of a room (id) for a rollup bucket, as little endian float32 values row by row
+    (application/octet-stream, shape and cell size in the X-Heatmap-* headers) or as base64 in JSON (?format=json)
+    """
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            db = db_ctx.get()
+            room_id = kwargs['pk']
+            if not RelatedTable1.objects.filter(id=room_id, table1_id=kwargs['table_pk']).exists():
+                return Response({
+                    'result': 'ERROR',
+                    'detail': f'Room does not exist for room_id: {room_id}'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            bucket = None
+            bucket_txt = request.GET.get('bucket', None)
+            if bucket_txt:
+                bucket = parse_datetime(bucket_txt)
+                if bucket is None:
+                    return Response({
+                        'result': 'ERROR',
+                        'detail': 'bucket must be an ISO 8601 datetime'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                if timezone.is_naive(bucket):
+                    bucket = timezone.make_aware(bucket)
+
+            grid, bucket = get_room_heatmap(room_id, db,
+                                            int(request.GET.get('variable', MEASUREMENT_TEMPERATURE)),
+                                            int(request.GET.get('resolution', ROLLUP_15_MIN)), bucket)
+            values = grid.to_array().astype('<f4')
+            rows, columns = values.shape
+            bucket_txt = bucket.isoformat() if bucket else ''
+
+            if request.GET.get('format', None) == 'json':
+                return Response({
+                    'result': {'rows': rows,
+                               'columns': columns,
+                               'cell_size': grid.layout.cell_size,
+                               'bucket': bucket_txt or None,
+                               'dtype': '<f4',
+                               'values': base64.b64encode(values.tobytes()).decode()}
+                }, status=status.HTTP_200_OK)
+
+            response = HttpResponse(values.tobytes(), content_type='application/octet-stream')
+            response['X-Heatmap-Shape'] = f'{rows},{columns}'
+            response['X-Heatmap-Cell-Size'] = str(grid.layout.cell_size)
+            response['X-Heatmap-Bucket'] = bucket_txt
+            return response
+
+        except Exception as ex:
+            return Response({
+                'result': 'ERROR',
+                'detail': ex.__str__()
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ExportViewSet(mixins.RetrieveModelMixin, GenericViewSet):
+    """
+    Stream every event, feedback or sensor (id: events, feedbacks, sensors) of the company as CSV or Parquet
+    (?output=csv|parquet), filtered with the TimeFilter parameters (hrs, mins, range)
+    """
+    permission_classes = (IsAuthenticated, IsAuthorized, IsAdminUser)
+    lookup_value_regex = '[a-z]+'
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            kind = kwargs['pk']
+            if kind not in EXPORTS:
+                return Response({
+                    'result': 'ERROR',
+                    'detail': f'export must be one of {", ".join(EXPORTS)}'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            output = request.GET.get('output', EXPORT_CSV)
+            if output not in EXPORT_CONTENT_TYPES:
+                return Response({
+                    'result': 'ERROR',
+                    'detail': f'output must be one of {", ".join(EXPORT_CONTENT_TYPES)}'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            content = stream_export(kind, db_ctx.get(), output, get_time_filter(request.GET))
+            response = StreamingHttpResponse(content, content_type=EXPORT_CONTENT_TYPES[output])
+            response['Content-Disposition'] = f'attachment; filename="{kind}-{timezone.now():%Y%m%d%H%M%S}.{output}"'
+            return response
+
+        except Exception as ex:
+            return Response({
+                'result': 'ERROR',
+                'detail': ex.__str__()
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+
+class JobViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, mixins.CreateModelMixin, GenericViewSet):
+    """
+    Submit background jobs and follow their status
+    """
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        status_txt = self.request.GET.get('status', None)
+        if status_txt:
+            statuses = [str(x[0]) for x in JOB_STATUSES]
+            if status_txt not in statuses:
+                raise ValidationError({
+                    'result': 'ERROR',
+                    'detail': f'status must be one of {", ".join(statuses)}'
+                })
+            queryset = queryset.filter(status=int(status_txt))
+        kind = self.request.GET.get('kind', None)
+        if kind:
+            queryset = queryset.filter(kind=kind)
+        return queryset
+
+    def create(self, request, *args, **kwargs):
+        try:
+            kind = request.data.get('kind', '')
+            if not kind:
+                return Response({
+                    'result': 'ERROR',
+                    'detail': 'kind is missing or empty'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            payload = request.data.get('payload', None) or {}
+            if not isinstance(payload, dict):
+                return Response({
+                    'result': 'ERROR',
+                    'detail': 'payload must be an object'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            job = submit_job(kind, db_ctx.get(), payload, created_by=request.user.email)
+
+            return Response({
+                'result': 'OK',
+                'detail': 'Job submitted!',
+                'id': job.id
+            }, status=status.HTTP_202_ACCEPTED)
+
+        except Exception as ex:
+            return Response({
+                'result': 'ERROR',
+                'detail': ex.__str__()
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(methods=['post'], detail=True)
+    def cancel(self, request, *args, **kwargs):
+        try:
+            if not cancel_job(db_ctx.get(), kwargs['pk']):
+                return Response({
+                    'result': 'ERROR',
+                    'detail': 'Only pending jobs (or running jobs of the stepfunctions backend) can be canceled'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            return Response({
+                'result': 'OK',
+                'detail': 'Job canceled!'
+            }, status=status.HTTP_200_OK)
+
+        except Exception as ex:
+            return Response({
+                'result': 'ERROR',
+                'detail': ex.__str__()
+            }, status=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,40 @@
+"""
+    PostgreSQL backend taking its connections from a process-local pool (see pool.py). Closing the connection
+    (at the end of each request with CONN_MAX_AGE = 0) gives it back to the pool instead of closing it.
+
+    DATABASES = {'company': {'ENGINE': 'code_setting.db_backends.postgresql_pool', 'POOL': {'MAX_SIZE': 10}, ...}}
+"""
+from django.db.backends.postgresql import base
+
+from code_setting.db_backends.postgresql_pool.pool import get_pool, sweep_pools
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    pooled_connection = None
+
+    def get_pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        def connect():
+            connection = super(DatabaseWrapper, self).get_new_connection(conn_params)
+            return connection, self.isolation_level
+
+        self.pooled_connection = self.get_pool().acquire(connect)
+        self.isolation_level = self.pooled_connection.isolation_level
+        return self.pooled_connection.connection
+
+    def _close(self):
+        pooled, self.pooled_connection = self.pooled_connection, None
+        if self.connection is None:
+            return
+        if pooled is None or pooled.connection is not self.connection:
+            return super()._close()
+        with self.wrap_database_errors:
+            if self.in_atomic_block:
+                # django keeps a connection closed inside a transaction until the block exits, do not share it
+                self.get_pool().discard(pooled)
+            else:
+                self.get_pool().release(pooled)
+        sweep_pools()
@@ -0,0 +1,266 @@
+"""
+    Process-local pools of psycopg2 connections, one per database settings (alias, host, port, name, user)
+"""
+import logging
+import os
+import threading
+import time
+
+from psycopg2 import OperationalError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+
+logger = logging.getLogger(__name__)
+
+POOL_DEFAULTS = {
+    # max connections (idle + in use) per database and worker process
+    'MAX_SIZE': 10,
+    # seconds to wait for a free connection before failing
+    'TIMEOUT': 10,
+    # idle connections older than this (seconds) are closed
+    'MAX_IDLE': 300,
+    # connections are recycled after this many seconds
+    'MAX_LIFETIME': 3600,
+    # connections idle for longer than this (seconds) are checked with SELECT 1 before being reused
+    'HEALTH_CHECK': 30,
+}
+
+# seconds between sweeps of the idle connections of every pool of the process
+POOL_SWEEP_INTERVAL = 60
+
+_pools = {}
+_pools_lock = threading.Lock()
+_last_sweep = time.monotonic()
+
+
+class PooledConnection:
+    __slots__ = ('connection', 'isolation_level', 'created_at', 'idle_since')
+
+    def __init__(self, connection, isolation_level):
+        self.connection = connection
+        self.isolation_level = isolation_level
+        self.created_at = self.idle_since = time.monotonic()
+
+
+class ConnectionPool:
+    """
+    Bounded pool of connections of a database. It belongs to the process that created it: gunicorn workers forked
+    after the pool was used get a new one and never touch the parent connections
+    """
+
+    def __init__(self, name, **options):
+        self.name = name
+        self.options = {**POOL_DEFAULTS, **{k.upper(): v for k, v in options.items()}}
+        self.pid = os.getpid()
+        self._idle = []
+        self._size = 0
+        self._cond = threading.Condition()
+        self.metrics = dict.fromkeys(('created', 'reused', 'discarded', 'evicted', 'health_checks', 'waits',
+                                      'timeouts'), 0)
+
+    def _discard(self, pooled, reason):
+        self._size -= 1
+        self.metrics['evicted' if reason == 'idle' else 'discarded'] += 1
+        self._cond.notify()
+        logger.debug('%s: closing connection (%s)', self.name, reason)
+        return pooled
+
+    @staticmethod
+    def _close(pooled):
+        try:
+            pooled.connection.close()
+        except Exception:
+            pass
+
+    def _evict_locked(self, now):
+        """
+        @return: pooled connections to close, idle too long or too old
+        """
+        expired = [x for x in self._idle if now - x.idle_since > self.options['MAX_IDLE']
+                   or now - x.created_at > self.options['MAX_LIFETIME']]
+        if expired:
+            self._idle = [x for x in self._idle if x not in expired]
+            for pooled in expired:
+                self._discard(pooled, 'idle')
+        return expired
+
+    def _is_healthy(self, pooled, now):
+        if pooled.connection.closed:
+            return False
+        if now - pooled.idle_since < self.options['HEALTH_CHECK']:
+            return True
+        self.metrics['health_checks'] += 1
+        try:
+            with pooled.connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not pooled.connection.autocommit:
+                pooled.connection.rollback()
+            return True
+        except Exception:
+            return False
+
+    def acquire(self, connect):
+        """
+        Get an idle healthy connection or open a new one when the pool is not full
+        @param connect: callable returning (connection, isolation_level) for a new connection
+        @return: PooledConnection
+        """
+        deadline = time.monotonic() + self.options['TIMEOUT']
+        while True:
+            with self._cond:
+                to_close = self._evict_locked(time.monotonic())
+                pooled = self._idle.pop() if self._idle else None
+                if pooled is None:
+                    if self._size < self.options['MAX_SIZE']:
+                        self._size += 1
+                    else:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.metrics['timeouts'] += 1
+                            raise OperationalError(f"connection pool of {self.name} exhausted "
+                                                   f"({self.options['MAX_SIZE']} connections)")
+                        self.metrics['waits'] += 1
+                        self._cond.wait(remaining)
+                        continue
+
+            for expired in to_close:
+                self._close(expired)
+
+            if pooled is None:
+                try:
+                    pooled = PooledConnection(*connect())
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self.metrics['created'] += 1
+                return pooled
+
+            if self._is_healthy(pooled, time.monotonic()):
+                with self._cond:
+                    self.metrics['reused'] += 1
+                return pooled
+
+            with self._cond:
+                self._discard(pooled, 'unhealthy')
+            self._close(pooled)
+
+    def release(self, pooled):
+        """
+        Give a connection back, rolling back whatever transaction it left open. Broken connections are closed
+        """
+        if os.getpid() != self.pid:
+            return
+
+        connection = pooled.connection
+        healthy = not connection.closed
+        if healthy:
+            try:
+                status = connection.get_transaction_status()
+                if status == TRANSACTION_STATUS_UNKNOWN:
+                    healthy = False
+                elif status != TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+            except Exception:
+                healthy = False
+
+        with self._cond:
+            now = time.monotonic()
+            if healthy and now - pooled.created_at <= self.options['MAX_LIFETIME']:
+                pooled.idle_since = now
+                self._idle.append(pooled)
+                self._cond.notify()
+                return
+            self._discard(pooled, 'broken' if not healthy else 'lifetime')
+        self._close(pooled)
+
+    def evict_idle(self):
+        """
+        Close the connections idle or alive for too long
+        @return: number of closed connections
+        """
+        with self._cond:
+            expired = self._evict_locked(time.monotonic())
+        for pooled in expired:
+            self._close(pooled)
+        return len(expired)
+
+    def discard(self, pooled):
+        """
+        Close a connection taken from the pool instead of giving it back
+        """
+        if os.getpid() != self.pid:
+            return
+        with self._cond:
+            self._discard(pooled, 'discarded')
+        self._close(pooled)
+
+    def close_idle(self):
+        """
+        Close every idle connection
+        @return: number of closed connections
+        """
+        with self._cond:
+            idle, self._idle = self._idle, []
+            for pooled in idle:
+                self._discard(pooled, 'idle')
+        for pooled in idle:
+            self._close(pooled)
+        return len(idle)
+
+    def get_metrics(self):
+        with self._cond:
+            idle = len(self._idle)
+            return {'name': self.name, 'pid': self.pid, 'max_size': self.options['MAX_SIZE'], 'size': self._size,
+                    'idle': idle, 'in_use': self._size - idle, **self.metrics}
+
+
+def get_pool_key(alias, settings_dict):
+    return (alias, settings_dict.get('HOST'), settings_dict.get('PORT'), settings_dict.get('NAME'),
+            settings_dict.get('USER'))
+
+
+def get_pool(alias, settings_dict):
+    """
+    Pool of a database of this process, created on first use with the POOL options of its settings
+    """
+    key = get_pool_key(alias, settings_dict)
+    pool = _pools.get(key)
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.pid != os.getpid():
+            if pool is not None:
+                # inherited from the parent process: forget its connections without closing them
+                _pools.clear()
+            pool = _pools[key] = ConnectionPool(alias, **(settings_dict.get('POOL') or {}))
+        return pool
+
+
+def get_pools_metrics():
+    return [pool.get_metrics() for pool in list(_pools.values()) if pool.pid == os.getpid()]
+
+
+def close_idle_connections(alias=None):
+    """
+    @param alias: close only the idle connections of this database (default: all of them)
+    @return: number of closed connections
+    """
+    return sum(pool.close_idle() for key, pool in list(_pools.items())
+               if pool.pid == os.getpid() and (alias is None or key[0] == alias))
+
+
+def sweep_pools():
+    """
+    Evict the expired idle connections of every pool, at most once per POOL_SWEEP_INTERVAL. Pools of tenants
+    without traffic would otherwise keep their connections open
+    """
+    global _last_sweep
+    now = time.monotonic()
+    if now - _last_sweep < POOL_SWEEP_INTERVAL:
+        return 0
+    _last_sweep = now
+    return sum(pool.evict_idle() for pool in list(_pools.values()) if pool.pid == os.getpid())
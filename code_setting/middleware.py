@@ -1,19 +1,41 @@
 from _contextvars import ContextVar
 
+from django.http import JsonResponse
+from django.urls import get_script_prefix, set_script_prefix
 from django.utils.deprecation import MiddlewareMixin
 
+from code_setting.settings import TENANT_URLCONF
+from code_setting.tenants import MASTER_PATHS, tenant_registry
+
 db_ctx = ContextVar('var')
 
 
 class WhichDatabaseToUseMIddleware(MiddlewareMixin):
     """
-        Middleware to update the context var with the correct db to be routed to
+        Middleware to update the context var with the correct db to be routed to. The first path segment is
+        a company (validated by the tenant registry) or one of the master paths
     """
     @staticmethod
     def process_request(request):
+        segment = request.path_info[1:].partition('/')[0]
+        if not segment or segment in MASTER_PATHS:
+            db_ctx.set('default')
+            return None
+
         try:
-            path = request.path.split('/')
-            db = 'default' if path[1] in ['master', 'docs', 'auth'] else path[1]
-            db_ctx.set(db)
+            known = tenant_registry.activate(segment)
         except Exception:
-            db_ctx.set('')
+            known = False
+        if not known:
+            db_ctx.set('default')
+            return JsonResponse({
+                'result': 'ERROR',
+                'detail': f'Unknown company {segment}'
+            }, status=404)
+
+        db_ctx.set(segment)
+        # a single set of company urls: /{company}/core/... is resolved as /core/... by TENANT_URLCONF
+        request.path_info = request.path_info[len(segment) + 1:]
+        request.urlconf = TENANT_URLCONF
+        set_script_prefix(f'{get_script_prefix()}{segment}/')
+        return None
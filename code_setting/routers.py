@@ -1,6 +1,34 @@
 from code_setting.middleware import db_ctx
 
-from code_setting.settings import DATABASES, LOCAL_APPLICATIONS
+from code_setting.settings import LOCAL_APPLICATIONS
+
+MASTER_APPLICATIONS = frozenset(('xmaster', ))
+COMPANY_APPLICATIONS = frozenset(LOCAL_APPLICATIONS)
+
+ROUTE_MASTER = 'master'
+ROUTE_COMPANY = 'company'
+
+# model -> route, computed once per model
+_model_routes = {}
+
+
+def get_model_route(model):
+    """
+    @param model: model class
+    @return: ROUTE_MASTER, ROUTE_COMPANY or None for the models of other apps (auth, contenttypes...)
+    """
+    try:
+        return _model_routes[model]
+    except KeyError:
+        app_label = model._meta.app_label
+        if app_label in MASTER_APPLICATIONS:
+            route = ROUTE_MASTER
+        elif app_label in COMPANY_APPLICATIONS:
+            route = ROUTE_COMPANY
+        else:
+            route = None
+        _model_routes[model] = route
+        return route
 
 
 class CodeMasterRouter:
@@ -13,31 +41,25 @@ class CodeMasterRouter:
         """
         Attempts to read auth models go to auth_db.
         """
-        try:
-            if db_ctx.get() == 'default' and model._meta.app_label == 'xmaster':
-                return 'default'
-            return None
-        except:
-            return None
+        if get_model_route(model) is ROUTE_MASTER and db_ctx.get(None) == 'default':
+            return 'default'
+        return None
 
     @staticmethod
     def db_for_write(model, **hints):
         """
         Attempts to write auth models go to auth_db.
         """
-        try:
-            if db_ctx.get() == 'default' and model._meta.app_label == 'xmaster':
-                return 'default'
-            return None
-        except:
-            return None
+        if get_model_route(model) is ROUTE_MASTER and db_ctx.get(None) == 'default':
+            return 'default'
+        return None
 
     @staticmethod
     def allow_relation(obj1, obj2, **hints):
         """
         Allow relations if a model in the auth app is involved.
         """
-        if obj1._meta.app_label == 'xmaster' or obj2._meta.app_label == 'xmaster':
+        if get_model_route(type(obj1)) is ROUTE_MASTER or get_model_route(type(obj2)) is ROUTE_MASTER:
             return True
         return None
 
@@ -46,7 +68,7 @@ class CodeMasterRouter:
         """
         Make sure the auth app only appears in the 'auth_db' database.
         """
-        if app_label == 'xmaster':
+        if app_label in MASTER_APPLICATIONS:
             return db == 'default'
         return None
 
@@ -61,33 +83,29 @@ class TycheToolCompaniesRouter:
         """
         Attempts to read auth models go to auth_db.
         """
-        try:
-            db = db_ctx.get()
-            if db != 'default' and model._meta.app_label in LOCAL_APPLICATIONS:
+        if get_model_route(model) is ROUTE_COMPANY:
+            db = db_ctx.get(None)
+            if db and db != 'default':
                 return db
-            return None
-        except:
-            return None
+        return None
 
     @staticmethod
     def db_for_write(model, **hints):
         """
         Attempts to write auth models go to auth_db.
         """
-        try:
-            db = db_ctx.get()
-            if db != 'default' and model._meta.app_label in LOCAL_APPLICATIONS:
+        if get_model_route(model) is ROUTE_COMPANY:
+            db = db_ctx.get(None)
+            if db and db != 'default':
                 return db
-            return None
-        except:
-            return None
+        return None
 
     @staticmethod
     def allow_relation(obj1, obj2, **hints):
         """
         Allow relations if a model in the auth app is involved.
         """
-        if obj1._meta.app_label in LOCAL_APPLICATIONS or obj2._meta.app_label in LOCAL_APPLICATIONS:
+        if get_model_route(type(obj1)) is ROUTE_COMPANY or get_model_route(type(obj2)) is ROUTE_COMPANY:
             return True
         return None
 
@@ -96,6 +114,7 @@ class TycheToolCompaniesRouter:
         """
         Make sure the auth app only appears in the 'auth_db' database.
         """
-        if app_label in LOCAL_APPLICATIONS:
-            return db in [k for k in DATABASES.keys() if k != 'default']
+        if app_label in COMPANY_APPLICATIONS:
+            # every database but the master one is a company database (see code_setting.tenants)
+            return db != 'default'
         return None
@@ -13,8 +13,8 @@ https://docs.djangoproject.com/en/3.0/ref/settings/
 import os
 from datetime import timedelta
 
-import boto3
 from decouple import config, Csv
+from django.core.exceptions import ImproperlyConfigured
 from django.utils.translation import gettext_lazy as _
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -157,6 +157,19 @@ WSGI_APPLICATION = 'code_setting.wsgi.application'
 
 
 CLIENT_DB = config('DB_LOCAL_DATABASE').split('localdatabase_')[1]
+
+# Company databases connection pool (per gunicorn worker), see code_setting/db_backends/postgresql_pool
+DB_POOL_ENABLED = config('DB_POOL_ENABLED', default=True, cast=bool)
+DB_POOL_ENGINE = 'code_setting.db_backends.postgresql_pool'
+DB_POOL = {
+    'MAX_SIZE': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+    'TIMEOUT': config('DB_POOL_TIMEOUT', default=10, cast=float),
+    'MAX_IDLE': config('DB_POOL_MAX_IDLE', default=300, cast=int),
+    'MAX_LIFETIME': config('DB_POOL_MAX_LIFETIME', default=3600, cast=int),
+    'HEALTH_CHECK': config('DB_POOL_HEALTH_CHECK', default=30, cast=int),
+}
+DB_COMPANY_ENGINE = DB_POOL_ENGINE if DB_POOL_ENABLED and 'postgresql' in config('DB_ENGINE') else config('DB_ENGINE')
+
 DATABASES = {
     'default': {
         'ENGINE': config('DB_ENGINE'),
@@ -168,23 +181,87 @@ DATABASES = {
         "ATOMIC_REQUESTS": True
     },
     CLIENT_DB: {
-        'ENGINE': config('DB_ENGINE'),
+        'ENGINE': DB_COMPANY_ENGINE,
         'PORT': config('DB_PORT', cast=int),
         'NAME': config('DB_LOCAL_DATABASE'),
         'USER': config('DB_LOCAL_USER'),
         'PASSWORD': config('DB_LOCAL_PASSWORD'),
         "HOST": config('DB_LOCAL_HOST'),
-        "ATOMIC_REQUESTS": True
+        "ATOMIC_REQUESTS": True,
+        # connections go back to the pool at the end of each request
+        "CONN_MAX_AGE": 0,
+        "POOL": DB_POOL,
         }
 }
 
+# Company databases registered on first use (code_setting/tenants.py): companies are read from TENANT_MODEL
+# in the master database, their connection is TENANT_DATABASE with NAME formatted with the company db and
+# the TENANT_DATABASE_FIELDS of the company (when the model has them)
+TENANT_MODEL = config('TENANT_MODEL', default='xmaster.Company')
+TENANT_DATABASE_NAME = config('TENANT_DATABASE_NAME', default='localdatabase_{db}')
+TENANT_DATABASE = {k: v for k, v in DATABASES[CLIENT_DB].items() if k != 'NAME'}
+TENANT_DATABASE_FIELDS = {
+    'HOST': 'db_host',
+    'PORT': 'db_port',
+    'NAME': 'db_name',
+    'USER': 'db_user',
+    'PASSWORD': 'db_password',
+}
+# seconds before looking up again a missing company
+TENANT_MISS_TIMEOUT = config('TENANT_MISS_TIMEOUT', default=60, cast=int)
+# seconds without requests before closing the pooled connections of a company
+TENANT_IDLE_TIMEOUT = config('TENANT_IDLE_TIMEOUT', default=600, cast=int)
+TENANT_URLCONF = 'code_setting.tenant_urls'
+
+
+# Cache. Signals invalidate the cached structures, versions and states of every worker through it, and the membership
+# checks, local cache versions and ETag versions read it on every request, so it must be shared by all the processes
+# and cheap to read: Redis (django-redis) by default. The database cache (python manage.py createcachetable) is an
+# explicit opt-in, every read is then a query on the master database. Process local backends are only allowed with
+# DEBUG (a single runserver process)
+CACHE_BACKEND = config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache' if DEBUG
+                       else 'django_redis.cache.RedisCache')
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+if CACHE_BACKEND in PROCESS_LOCAL_CACHE_BACKENDS and not DEBUG:
+    raise ImproperlyConfigured(f'CACHE_BACKEND {CACHE_BACKEND} is not shared by the workers, use Redis '
+                               f'(django_redis.cache.RedisCache) or the database cache')
+CACHE_DEFAULT_LOCATIONS = {
+    'django_redis.cache.RedisCache': 'redis://127.0.0.1:6379/1',
+    'django.core.cache.backends.db.DatabaseCache': 'code_setting_cache',
+}
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': config('CACHE_LOCATION', default=CACHE_DEFAULT_LOCATIONS.get(CACHE_BACKEND, '')),
+    }
+}
+
+# Datacenter structure cache timeout (seconds), entries are invalidated by signals
+STRUCTURE_CACHE_TIMEOUT = config('STRUCTURE_CACHE_TIMEOUT', default=3600, cast=int)
+
+# Measurements (raw readings are kept in daily partitions)
+MEASUREMENTS_RETENTION_DAYS = config('MEASUREMENTS_RETENTION_DAYS', default=90, cast=int)
+MEASUREMENTS_PARTITIONS_AHEAD_DAYS = config('MEASUREMENTS_PARTITIONS_AHEAD_DAYS', default=7, cast=int)
+
 
 DATABASE_ROUTERS = [
     'code_setting.routers.TycheToolCompaniesRouter',
-    'code_setting.routers.TycheToolMasterRouter',
+    'code_setting.routers.CodeMasterRouter',
 ]
 
 
+# Company-User permission checks (utils.permissions.IsAuthorized) are cached for this many seconds, and
+# invalidated when a CompanyUser changes
+MEMBERSHIP_CACHE_TIMEOUT = config('MEMBERSHIP_CACHE_TIMEOUT', default=300, cast=int)
+# name of the JWT claim with the company dbs of the user (disabled when empty). Access tokens keep their companies
+# until they expire and get them again from the database on refresh (utils.tokens), so removing a user from a
+# company takes effect at most ACCESS_TOKEN_LIFETIME later
+JWT_TENANTS_CLAIM = config('JWT_TENANTS_CLAIM', default='')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 AUTH_PASSWORD_VALIDATORS = [
@@ -273,21 +350,37 @@ AWS_S3_CUSTOM_DOMAIN = config('AWS_S3_CUSTOM_DOMAIN')
 DEFAULT_FILE_STORAGE = config('DEFAULT_FILE_STORAGE')
 AWS_DEFAULT_ACL = None
 
-# AWS S3 & Step Function
+# AWS S3 & Step Function (clients are created on first use, see utils.aws)
 if DEBUG:
     AWS_ACCESS_KEY_ID = config('AWS_ACCESS_KEY_ID')
     AWS_SECRET_ACCESS_KEY = config('AWS_SECRET_ACCESS_KEY')
-
-    AWS_STEP_FUNCTION_CLIENT = boto3.client(
-        'stepfunctions',
-        region_name=AWS_S3_REGION_NAME,
-        aws_access_key_id=AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=AWS_SECRET_ACCESS_KEY
-    )
 else:
-    AWS_STEP_FUNCTION_CLIENT = boto3.client(
-        'stepfunctions',
-        region_name=AWS_S3_REGION_NAME
-    )
-
-STATE_MACHINE_BY_DATAFRAME_ARN = config('STATE_MACHINE_BY_DATAFRAME_ARN')
+    AWS_ACCESS_KEY_ID = AWS_SECRET_ACCESS_KEY = None
+
+STATE_MACHINE_BY_DATAFRAME_ARN = config('STATE_MACHINE_BY_DATAFRAME_ARN', default='')
+
+# Jobs (apps.core.jobs). JOBS_BACKEND: 'database' (pending jobs are run by the run_jobs command), 'local' (process
+# pool of the web worker) or 'stepfunctions' (an execution of the state machine of the job kind)
+JOBS_BACKEND = config('JOBS_BACKEND', default='database')
+JOBS_WORKERS = config('JOBS_WORKERS', default=2, cast=int)
+# running jobs per company
+JOBS_TENANT_CONCURRENCY = config('JOBS_TENANT_CONCURRENCY', default=2, cast=int)
+JOBS_MAX_ATTEMPTS = config('JOBS_MAX_ATTEMPTS', default=3, cast=int)
+# seconds before the first retry, doubled on each attempt
+JOBS_RETRY_DELAY = config('JOBS_RETRY_DELAY', default=30, cast=int)
+# running jobs older than this (seconds) are considered lost and retried
+JOBS_TIMEOUT = config('JOBS_TIMEOUT', default=3600, cast=int)
+# job kind -> function(db, **payload) run by the local and database backends
+JOB_HANDLERS = {
+    'measurements_rollups': 'apps.core.jobs.refresh_rollups_job',
+    'row_medians': 'apps.core.row_medians.refresh_row_medians',
+}
+# job kind -> state machine ARN used by the stepfunctions backend, only the kinds with a configured ARN
+JOB_STATE_MACHINES = {}
+if STATE_MACHINE_BY_DATAFRAME_ARN:
+    JOB_STATE_MACHINES['dataframe'] = STATE_MACHINE_BY_DATAFRAME_ARN
+
+# Psychrometric charts (apps.core.charts): processes rendering the backgrounds and seconds before a render that
+# did not finish can be requested again
+CHART_WORKERS = config('CHART_WORKERS', default=1, cast=int)
+CHART_RENDER_TIMEOUT = config('CHART_RENDER_TIMEOUT', default=120, cast=int)
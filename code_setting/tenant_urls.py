@@ -0,0 +1,38 @@
+"""
+    URLs of every company, mounted under /{company}/ by WhichDatabaseToUseMIddleware
+"""
+from django.apps import apps
+from django.contrib import admin
+from django.urls import path, include
+
+from apps.core.admin import CORE_MODELS_ADMIN
+from apps.core.routers import core_router, core_datacenter_router
+
+from code_setting.settings import LOCAL_APPLICATIONS
+
+# django admin register, the database of each request is picked by MultiDBModelAdmin
+company_site = admin.AdminSite('company')
+
+for app in LOCAL_APPLICATIONS:
+
+    if app == 'core':
+        admin_dict = CORE_MODELS_ADMIN
+    else:
+        admin_dict = None
+
+    if admin_dict:
+        for model_obj in apps.get_app_config(app).get_models():
+            model_admin = admin_dict.get(model_obj.__name__, '')
+            if model_admin:
+                company_site.register(model_obj, model_admin)
+
+urlpatterns = [
+
+    # Companies Django admin
+    path('admin/', company_site.urls, name='company-admin'),
+
+    # Companies APIs
+    path('core/', include(core_router.urls)),
+    path('core/', include(core_datacenter_router.urls)),
+
+]
@@ -0,0 +1,176 @@
+"""
+    Registry of the company (tenant) databases. Companies are read from the master database and their connection
+    is added to django.db.connections on first use, so adding a company does not need a redeploy.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.apps import apps
+from django.db import connections
+from django.utils.functional import cached_property
+
+from code_setting.db_backends.postgresql_pool.pool import close_idle_connections
+from code_setting.settings import (DATABASES, TENANT_MODEL, TENANT_DATABASE, TENANT_DATABASE_NAME,
+                                   TENANT_DATABASE_FIELDS, TENANT_MISS_TIMEOUT, TENANT_IDLE_TIMEOUT)
+
+# first path segments that are not companies
+MASTER_PATHS = frozenset(('master', 'docs', 'auth', 'static', 'media'))
+
+# seconds between sweeps of the idle tenants
+TENANT_SWEEP_INTERVAL = 60
+
+# company dbs are database names (NAME is built from them), other first path segments are never looked up
+TENANT_ALIAS_RE = re.compile(r'^[A-Za-z0-9_-]{1,63}$')
+# unknown aliases remembered for TENANT_MISS_TIMEOUT, the oldest are forgotten beyond this number
+TENANT_MAX_MISSES = 1024
+
+
+class TenantRegistry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tenants = {k: v for k, v in DATABASES.items() if k != 'default'}
+        self._misses = OrderedDict()
+        self._last_used = {}
+        self._last_sweep = time.monotonic()
+
+    @staticmethod
+    def get_company_model():
+        try:
+            return apps.get_model(TENANT_MODEL)
+        except (LookupError, ValueError):
+            return None
+
+    @staticmethod
+    def get_database_settings(company):
+        """
+        Connection settings of a company: the tenant template, the NAME built from its db, and the connection
+        fields of the company model when it has them
+        """
+        settings_dict = {**TENANT_DATABASE, 'NAME': TENANT_DATABASE_NAME.format(db=company.db)}
+        for key, field in TENANT_DATABASE_FIELDS.items():
+            value = getattr(company, field, None)
+            if value:
+                settings_dict[key] = value
+        return settings_dict
+
+    def load(self, alias):
+        """
+        @return: connection settings of a company read from the master database, None if it does not exist
+        """
+        company_model = self.get_company_model()
+        if company_model is None:
+            return None
+        company = company_model.objects.using('default').filter(db=alias).first()
+        return self.get_database_settings(company) if company else None
+
+    def get(self, alias):
+        """
+        Connection settings of a company, unknown aliases are looked up again after TENANT_MISS_TIMEOUT
+        @param alias: company db
+        @return: settings dict or None
+        """
+        settings_dict = self._tenants.get(alias)
+        if settings_dict is not None:
+            return settings_dict
+        if not TENANT_ALIAS_RE.match(alias or ''):
+            return None
+
+        missed_at = self._misses.get(alias)
+        if missed_at is not None and time.monotonic() - missed_at < TENANT_MISS_TIMEOUT:
+            return None
+
+        settings_dict = self.load(alias)
+        with self._lock:
+            if settings_dict is None:
+                self._add_miss(alias)
+            else:
+                self._misses.pop(alias, None)
+                self._tenants[alias] = settings_dict
+        return settings_dict
+
+    def _add_miss(self, alias):
+        # called with the lock held, the misses are kept in insertion order so the expired ones come first
+        now = time.monotonic()
+        self._misses.pop(alias, None)
+        self._misses[alias] = now
+        while self._misses:
+            missed_at = next(iter(self._misses.values()))
+            if now - missed_at < TENANT_MISS_TIMEOUT and len(self._misses) <= TENANT_MAX_MISSES:
+                break
+            self._misses.popitem(last=False)
+
+    def is_tenant(self, alias):
+        return bool(alias) and alias not in MASTER_PATHS and self.get(alias) is not None
+
+    def activate(self, alias):
+        """
+        Register the connection of a company if needed and mark it as used
+        @return: True if the company exists
+        """
+        settings_dict = self.get(alias)
+        if settings_dict is None:
+            return False
+        if alias not in connections.databases:
+            with self._lock:
+                if alias not in connections.databases:
+                    # copy on write: other threads may be iterating connections.databases (e.g. close_all)
+                    _set_connection_databases({**connections.databases, alias: dict(settings_dict)})
+        self._last_used[alias] = time.monotonic()
+        self.evict_idle()
+        return True
+
+    def get_aliases(self):
+        """
+        @return: every company db, from the master database when available
+        """
+        company_model = self.get_company_model()
+        if company_model is not None:
+            for alias in company_model.objects.using('default').values_list('db', flat=True):
+                self.get(alias)
+        return sorted(self._tenants)
+
+    def evict_idle(self, force=False):
+        """
+        Close the pooled connections of the companies without requests for TENANT_IDLE_TIMEOUT
+        @return: list of evicted aliases
+        """
+        now = time.monotonic()
+        if not force and now - self._last_sweep < TENANT_SWEEP_INTERVAL:
+            return []
+        self._last_sweep = now
+
+        idle = [alias for alias, used_at in list(self._last_used.items()) if now - used_at > TENANT_IDLE_TIMEOUT]
+        for alias in idle:
+            self._last_used.pop(alias, None)
+            close_idle_connections(alias)
+        return idle
+
+    def forget(self, alias):
+        with self._lock:
+            self._tenants.pop(alias, None)
+            self._last_used.pop(alias, None)
+        close_idle_connections(alias)
+
+
+def _set_connection_databases(databases):
+    # Django 3.1 caches the settings of the connections as ConnectionHandler.databases, later versions as settings
+    # (databases reads them)
+    if isinstance(vars(type(connections)).get('databases'), cached_property):
+        connections.__dict__['databases'] = databases
+    else:
+        connections.__dict__['settings'] = databases
+
+
+tenant_registry = TenantRegistry()
+
+
+def get_tenant_databases(databases=None):
+    """
+    Company databases ready to be used by management commands
+    @param databases: list of company dbs (default: all of them)
+    @return: list of aliases
+    """
+    return [alias for alias in databases or tenant_registry.get_aliases() if tenant_registry.activate(alias)]
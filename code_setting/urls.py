@@ -5,12 +5,14 @@ from django.urls import path, include
 from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from rest_framework.permissions import AllowAny
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView, TokenVerifyView
+from rest_framework_simplejwt.views import TokenVerifyView
 
-from apps.core.admin import CORE_MODELS_ADMIN
-from apps.core.routers import core_router, core_datacenter_router
+from code_setting.settings import MEDIA_URL, MEDIA_ROOT, STATIC_URL, STATIC_ROOT, BASE_URL
+from code_setting.views import MetricsView
+from utils.tokens import TenantsTokenObtainPairView, TenantsTokenRefreshView
 
-from code_setting.settings import DATABASES, MEDIA_URL, MEDIA_ROOT, STATIC_URL, STATIC_ROOT, BASE_URL, LOCAL_APPLICATIONS
+# the docs describe the master urls and the companies urls (filled below)
+docs_patterns = []
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -22,6 +24,7 @@ schema_view = get_schema_view(
         license=openapi.License(name="BSD License"),
     ),
     url=BASE_URL,
+    patterns=docs_patterns,
     public=True,
     permission_classes=(AllowAny,),
 )
@@ -32,8 +35,8 @@ urlpatterns = [
     # path('', views.index, name='index'),
 
     # Auth
-    path('auth/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('auth/token/', TenantsTokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('auth/token/refresh/', TenantsTokenRefreshView.as_view(), name='token_refresh'),
     path('auth/token/verify/', TokenVerifyView.as_view(), name='token_verify'),
 
     # Docs (swagger and redoc)
@@ -55,36 +58,13 @@ urlpatterns += [
     path('master/admin/', master_site_id.urls, name='master-admin'),
 
     # Master APIs
+    path('master/metrics/', MetricsView.as_view(), name='master-metrics'),
     path('master/', include(master_router.urls)),
 ]
 
-# Dynamic URLs for Companies per apps
-for company in [k for k in DATABASES.keys() if k != 'default']:
-
-    # django admin register
-    company_site_id = admin.AdminSite(company)
-
-    for app in LOCAL_APPLICATIONS:
-
-        if app == 'core':
-            admin_dict = CORE_MODELS_ADMIN
-        else:
-            admin_dict = None
-
-        if admin_dict:
-            for model_obj in apps.get_app_config(app).get_models():
-                company_site_id.register(model_obj, admin_dict[model_obj.__name__])
-
-    urlpatterns += [
-
-        # Companies Django admin
-        path(f'{company}/admin/', company_site_id.urls, name=f'{company}-admin'),
-
-        # Companies APIs
-        path(f'{company}/core/', include(core_router.urls)),
-        path(f'{company}/core/', include(core_datacenter_router.urls)),
-
-    ]
+# Companies URLs (/{company}/admin/, /{company}/core/...) are resolved by code_setting.tenant_urls, see
+# WhichDatabaseToUseMIddleware
+docs_patterns += urlpatterns + [path('<str:company>/', include('code_setting.tenant_urls'))]
 
 urlpatterns += static(MEDIA_URL, document_root=MEDIA_ROOT)
 urlpatterns += static(STATIC_URL, document_root=STATIC_ROOT)
@@ -0,0 +1,22 @@
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from code_setting.db_backends.postgresql_pool.pool import get_pools_metrics
+from utils.permissions import get_membership_metrics
+
+
+class MetricsView(APIView):
+    """
+    Counters of the worker process serving the request: permission cache and database pools
+    """
+    permission_classes = (IsAdminUser, )
+
+    def get(self, request, *args, **kwargs):
+        return Response({
+            'result': {
+                'permissions': get_membership_metrics(),
+                'db_pools': get_pools_metrics(),
+            }
+        }, status=status.HTTP_200_OK)
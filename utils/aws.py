@@ -0,0 +1,35 @@
+"""
+    AWS clients, created on first use (importing settings must not need boto3 nor AWS)
+"""
+import threading
+
+from code_setting.settings import AWS_S3_REGION_NAME, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_aws_client(service):
+    """
+    Client of an AWS service shared by the process (boto3 clients are thread safe)
+    @param service: e.g. 'stepfunctions'
+    @return: boto3 client
+    """
+    client = _clients.get(service)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        if service not in _clients:
+            import boto3
+
+            credentials = {}
+            if AWS_ACCESS_KEY_ID:
+                credentials = {'aws_access_key_id': AWS_ACCESS_KEY_ID,
+                               'aws_secret_access_key': AWS_SECRET_ACCESS_KEY}
+            _clients[service] = boto3.client(service, region_name=AWS_S3_REGION_NAME, **credentials)
+        return _clients[service]
+
+
+def get_stepfunctions_client():
+    return get_aws_client('stepfunctions')
@@ -0,0 +1,242 @@
+"""
+    Vectorized statistics over groups of sensor data
+
+    Groups are the rows of a 2-D array (one group per row/rack, padded with nan) or the groups of a pandas
+    frame. None, nan and inf are missing values. The results match the list helpers of utils.helpers
+    (reject_outliers, calculate_deviation, calculate_deviation_power, round_function) for valid inputs, with
+    nan where those return None.
+"""
+import warnings
+
+import numpy as np
+
+OUTLIERS_SIGMA = 'sigma'
+OUTLIERS_MAD = 'mad'
+OUTLIERS_IQR = 'iqr'
+
+# 0.6745 is the 0.75 quantile of the standard normal, makes the MAD comparable to the standard deviation
+MAD_SCALE = 0.6745
+
+
+def mask_invalid(values):
+    """
+    @param values: array-like, None/nan/inf are missing
+    @return: float array with nan for every missing value
+    """
+    values = np.array(values, dtype=float)
+    values[~np.isfinite(values)] = np.nan
+    return values
+
+
+def to_padded(groups):
+    """
+    @param groups: list of lists of values (different lengths)
+    @return: 2-D float array (groups x max length) padded with nan
+    """
+    groups = [list(group or []) for group in groups]
+    width = max((len(x) for x in groups), default=0)
+    padded = np.full((len(groups), width), np.nan)
+    for i, group in enumerate(groups):
+        padded[i, :len(group)] = np.array(group, dtype=float)
+    return mask_invalid(padded)
+
+
+def to_lists(values):
+    """
+    @param values: 2-D array padded with nan
+    @return: list of lists without the missing values
+    """
+    return [row[~np.isnan(row)].tolist() for row in np.atleast_2d(values)]
+
+
+def _nan_reduce(function, values, **kwargs):
+    with warnings.catch_warnings():
+        # empty groups give nan
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return function(values, axis=-1, **kwargs)
+
+
+def reject_outliers_sigma(values, m=2):
+    """
+    Values farther than m population standard deviations from the mean of their group become nan
+    (same criterion as utils.helpers.reject_outliers)
+    @param values: 2-D array, one group per row
+    @param m: threshold
+    @return: 2-D array
+    """
+    values = mask_invalid(values)
+    mean = _nan_reduce(np.nanmean, values, keepdims=True)
+    std = _nan_reduce(np.nanstd, values, keepdims=True)
+    with np.errstate(invalid='ignore'):
+        return np.where(np.abs(values - mean) < m * std, values, np.nan)
+
+
+def reject_outliers_mad(values, m=3.5):
+    """
+    Values with a modified z-score (median absolute deviation) bigger than m become nan
+    @param values: 2-D array, one group per row
+    @param m: threshold
+    @return: 2-D array
+    """
+    values = mask_invalid(values)
+    median = _nan_reduce(np.nanmedian, values, keepdims=True)
+    mad = _nan_reduce(np.nanmedian, np.abs(values - median), keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        score = MAD_SCALE * np.abs(values - median) / mad
+        # a group with mad 0 keeps the values equal to its median
+        score = np.where(mad == 0, np.where(values == median, 0, np.inf), score)
+        return np.where(score <= m, values, np.nan)
+
+
+def reject_outliers_iqr(values, k=1.5):
+    """
+    Values out of [Q1 - k * IQR, Q3 + k * IQR] of their group become nan
+    @param values: 2-D array, one group per row
+    @param k: threshold
+    @return: 2-D array
+    """
+    values = mask_invalid(values)
+    q1, q3 = _nan_reduce(np.nanpercentile, values, q=[25, 75], keepdims=True)
+    iqr = q3 - q1
+    with np.errstate(invalid='ignore'):
+        return np.where((values >= q1 - k * iqr) & (values <= q3 + k * iqr), values, np.nan)
+
+
+def reject_outliers(values, method=OUTLIERS_SIGMA, threshold=None):
+    """
+    @param values: 2-D array, one group per row
+    @param method: OUTLIERS_SIGMA, OUTLIERS_MAD or OUTLIERS_IQR
+    @param threshold: m or k of the method, its default if None
+    @return: 2-D array with the outliers as nan
+    """
+    functions = {
+        OUTLIERS_SIGMA: reject_outliers_sigma,
+        OUTLIERS_MAD: reject_outliers_mad,
+        OUTLIERS_IQR: reject_outliers_iqr,
+    }
+    if method not in functions:
+        raise ValueError(f'Unknown outliers method: {method}')
+    return functions[method](values) if threshold is None else functions[method](values, threshold)
+
+
+def stdev(values, decimals=2, ddof=1, ignore_zeros=True):
+    """
+    Sample standard deviation of every group, as calculate_deviation (decimals=2) and calculate_deviation_power
+    (decimals=4), which also leave out the zeros
+    @param values: 2-D array, one group per row
+    @param decimals: decimals of the result, None to not round
+    @param ddof: delta degrees of freedom
+    @param ignore_zeros: leave out the zeros
+    @return: array with one value per group, nan for groups with less than ddof + 1 values
+    """
+    values = mask_invalid(values)
+    if ignore_zeros:
+        values[values == 0] = np.nan
+
+    count = np.sum(~np.isnan(values), axis=-1)
+    result = np.full(count.shape, np.nan)
+    enough = count > ddof
+    result[enough] = _nan_reduce(np.nanstd, values[enough], ddof=ddof)
+    return round_values(result, decimals) if decimals is not None else result
+
+
+def round_values(values, decimals=2):
+    """
+    Round like round_function, nan/inf become nan. Python round is applied to every value: np.round scales by
+    10 ** decimals first and rounds ties of the scaled float, so it differs on values such as 2.255 (2.26 vs 2.25)
+    @param values: array-like
+    @param decimals: decimals
+    @return: float array
+    """
+    values = mask_invalid(values)
+    finite = np.isfinite(values)
+    values[finite] = [round(x, decimals) for x in values[finite].tolist()]
+    return values
+
+
+def describe(values):
+    """
+    Statistics of every group
+    @param values: 2-D array, one group per row
+    @return: dict of arrays with one value per group
+    """
+    values = mask_invalid(values)
+    return {
+        'count': np.sum(~np.isnan(values), axis=-1),
+        'mean': _nan_reduce(np.nanmean, values),
+        'median': _nan_reduce(np.nanmedian, values),
+        'min': _nan_reduce(np.nanmin, values),
+        'max': _nan_reduce(np.nanmax, values),
+        'stdev': stdev(values, decimals=None, ignore_zeros=False),
+    }
+
+
+def frame_to_padded(frame, by, column):
+    """
+    One row per group of a pandas frame. Rows with a missing group key (e.g. sensors without related_table2_id)
+    belong to no group
+    @param frame: pandas DataFrame
+    @param by: group column(s)
+    @param column: value column
+    @return: group keys (pandas Index), 2-D array padded with nan, (group position, column position) of every row,
+             -1 for the rows without group
+    """
+    keys = frame[by]
+    grouped = (keys.notna() if keys.ndim == 1 else keys.notna().all(axis=1)).to_numpy()
+    groups = frame[grouped].groupby(by, sort=True)
+
+    group_positions = np.full(len(frame), -1, dtype=np.int64)
+    column_positions = np.full(len(frame), -1, dtype=np.int64)
+    group_positions[grouped] = groups.ngroup().to_numpy()
+    column_positions[grouped] = groups.cumcount().to_numpy()
+
+    padded = np.full((groups.ngroups, column_positions.max() + 1 if grouped.any() else 0), np.nan)
+    padded[group_positions[grouped], column_positions[grouped]] = mask_invalid(frame[column].to_numpy()[grouped])
+    return groups.size().index, padded, (group_positions, column_positions)
+
+
+def describe_frame(frame, by, column, outliers=None, threshold=None, decimals=2):
+    """
+    Statistics per group of a pandas frame in one vectorized pass, rows without group are left out
+    @param frame: pandas DataFrame
+    @param by: group column(s), e.g. 'related_table2_id'
+    @param column: value column, e.g. 'temperature'
+    @param outliers: OUTLIERS_* method to reject outliers first, None to keep every value
+    @param threshold: threshold of the outliers method
+    @param decimals: decimals of the results, None to not round
+    @return: pandas DataFrame indexed by group
+    """
+    import pandas as pd
+
+    index, padded, _ = frame_to_padded(frame, by, column)
+    if outliers:
+        padded = reject_outliers(padded, outliers, threshold)
+
+    stats = describe(padded)
+    result = pd.DataFrame(stats, index=index)
+    if decimals is not None:
+        result[['mean', 'median', 'min', 'max', 'stdev']] = result[['mean', 'median', 'min', 'max', 'stdev']]\
+            .round(decimals)
+    return result
+
+
+def reject_outliers_frame(frame, by, column, method=OUTLIERS_SIGMA, threshold=None):
+    """
+    Rows of a pandas frame that are not outliers of their group. Rows with a missing value or without group are
+    kept
+    @param frame: pandas DataFrame
+    @param by: group column(s)
+    @param column: value column
+    @param method: OUTLIERS_* method
+    @param threshold: threshold of the method
+    @return: filtered pandas DataFrame
+    """
+    _, padded, (group_positions, column_positions) = frame_to_padded(frame, by, column)
+    grouped = group_positions >= 0
+    values = mask_invalid(frame[column].to_numpy())
+    kept = reject_outliers(padded, method, threshold)
+
+    outliers = np.zeros(len(frame), dtype=bool)
+    outliers[grouped] = np.isnan(kept[group_positions[grouped], column_positions[grouped]]) & \
+        ~np.isnan(values[grouped])
+    return frame[~outliers]
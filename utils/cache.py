@@ -0,0 +1,79 @@
+"""
+    Process-local caches validated by a version stamp shared through the django cache
+"""
+import threading
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+
+class VersionedLocalCache:
+    """
+    Keep built objects (trees, compiled structures, arrays) in process memory and rebuild them only when the
+    version of their key is bumped. Versions live in the django cache, so an invalidation made by any worker
+    is seen by all of them.
+    """
+
+    def __init__(self, namespace, max_entries=256):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _version_cache_key(self, version_key):
+        return f'{self.namespace}:version:{version_key}'
+
+    def get_version(self, version_key):
+        cache_key = self._version_cache_key(version_key)
+        version = cache.get(cache_key)
+        if version is None:
+            cache.add(cache_key, uuid.uuid4().hex, None)
+            version = cache.get(cache_key)
+        return version
+
+    def get(self, key, builder, version_key=None, version=None):
+        """
+        Get the object for key, building it again if its version changed
+        @param key: local key
+        @param builder: callable without arguments that builds the object
+        @param version_key: shared version key, several local keys may share the same version (default: key)
+        @param version: current version of version_key when the caller already read it (see get_version)
+        @return: object
+        """
+        if version is None:
+            version = self.get_version(key if version_key is None else version_key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        value = builder()
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def peek(self, key, version):
+        """
+        Get the object for key without building it
+        @param key: local key
+        @param version: current version of its shared version key (see get_version)
+        @return: object or None when it is missing or stale
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def invalidate(self, version_key):
+        cache.set(self._version_cache_key(version_key), uuid.uuid4().hex, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
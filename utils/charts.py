@@ -0,0 +1,108 @@
+"""
+    Psychrometric chart rendering with matplotlib (Agg backend). Only depends on numpy and matplotlib so it can run
+    in worker processes without django.
+    The chart plots dry bulb temperature (°C, x) against humidity ratio (g/kg, y).
+"""
+import io
+
+CHART_SIZE = (8, 6)
+CHART_DPI = 100
+CHART_TEMPERATURE_RANGE = (0, 50)
+CHART_HUMIDITY_RATIO_RANGE = (0, 30)
+CHART_RELATIVE_HUMIDITIES = range(10, 101, 10)
+# points per edge of the envelopes: straight edges in the (temperature, RH) plane are curves in the chart
+CHART_EDGE_POINTS = 20
+
+
+def to_chart_coordinates(temperatures, humidities, pressure):
+    """
+    @param temperatures: °C
+    @param humidities: relative humidity (%)
+    @param pressure: Pa
+    @return: (temperatures, humidity ratios in g/kg)
+    """
+    import numpy as np
+    from utils.psychrometrics import vapor_pressure, humidity_ratio
+
+    temperatures = np.asarray(temperatures, dtype=float)
+    ratios = humidity_ratio(vapor_pressure(temperatures, np.asarray(humidities, dtype=float) / 100), pressure)
+    return temperatures, ratios * 1000
+
+
+def densify_polygon(vertices, points=CHART_EDGE_POINTS):
+    import numpy as np
+
+    vertices = np.asarray(vertices, dtype=float)
+    closed = np.vstack((vertices, vertices[:1]))
+    steps = np.linspace(0, 1, points, endpoint=False)[:, None]
+    edges = [start + steps * (end - start) for start, end in zip(closed[:-1], closed[1:])]
+    return np.vstack(edges)
+
+
+def render_chart_background(recommended, allowed, pressure):
+    """
+    Render the static layer of the chart: relative humidity curves and the operation envelopes
+    @param recommended: (N x 2) vertices (temperature °C, RH %) of the recommended envelope
+    @param allowed: (N x 2) vertices of the allowed envelope
+    @param pressure: Pa
+    @return: (png bytes, transform) where transform maps chart coordinates to image pixels, see get_pixels
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import numpy as np
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    figure = Figure(figsize=CHART_SIZE, dpi=CHART_DPI)
+    canvas = FigureCanvasAgg(figure)
+    ax = figure.add_subplot(1, 1, 1)
+
+    temperatures = np.linspace(*CHART_TEMPERATURE_RANGE, 200)
+    for rh in CHART_RELATIVE_HUMIDITIES:
+        x, y = to_chart_coordinates(temperatures, np.full(len(temperatures), rh), pressure)
+        ax.plot(x, y, color='#1f77b4' if rh == 100 else '#9ecae1', linewidth=1.5 if rh == 100 else 0.6)
+        if rh < 100:
+            inside = np.nonzero(y < CHART_HUMIDITY_RATIO_RANGE[1])[0]
+            ax.annotate(f'{rh}%', (x[inside[-1]], y[inside[-1]]), fontsize=7, color='#6baed6')
+
+    for vertices, color, label in ((allowed, '#fdd0a2', 'Allowed'), (recommended, '#a1d99b', 'Recommended')):
+        x, y = to_chart_coordinates(*densify_polygon(vertices).T, pressure)
+        ax.fill(x, y, facecolor=color, edgecolor='#636363', linewidth=0.8, alpha=0.6, label=label)
+
+    ax.set_xlim(*CHART_TEMPERATURE_RANGE)
+    ax.set_ylim(*CHART_HUMIDITY_RATIO_RANGE)
+    ax.yaxis.tick_right()
+    ax.yaxis.set_label_position('right')
+    ax.set_xlabel('Dry bulb temperature (°C)')
+    ax.set_ylabel('Humidity ratio (g/kg)')
+    ax.grid(color='#f0f0f0', linewidth=0.5)
+    ax.legend(loc='upper left', fontsize=8)
+
+    canvas.draw()
+    width, height = canvas.get_width_height()
+    box = ax.get_window_extent()
+    transform = {'width': width, 'height': height,
+                 # pixels of the axes, origin at the top left corner as in images
+                 'left': box.x0, 'right': box.x1, 'top': height - box.y1, 'bottom': height - box.y0,
+                 'xlim': list(CHART_TEMPERATURE_RANGE), 'ylim': list(CHART_HUMIDITY_RATIO_RANGE)}
+
+    png = io.BytesIO()
+    canvas.print_png(png)
+    return png.getvalue(), transform
+
+
+def get_pixels(transform, x, y):
+    """
+    @param transform: transform returned by render_chart_background
+    @param x: chart temperatures
+    @param y: chart humidity ratios
+    @return: (image columns, image rows)
+    """
+    import numpy as np
+
+    (x0, x1), (y0, y1) = transform['xlim'], transform['ylim']
+    width = transform['right'] - transform['left']
+    height = transform['bottom'] - transform['top']
+    columns = transform['left'] + (np.asarray(x, dtype=float) - x0) / (x1 - x0) * width
+    rows = transform['bottom'] - (np.asarray(y, dtype=float) - y0) / (y1 - y0) * height
+    return columns, rows
@@ -0,0 +1,110 @@
+"""
+    HTTP conditional requests (ETag / If-None-Match)
+"""
+import hashlib
+import uuid
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from django.utils.http import parse_etags
+
+
+def etag_matches(request, etag):
+    """
+    @param request: request
+    @param etag: quoted strong ETag of the current representation
+    @return: True when the client already has it (If-None-Match), weak comparison as in RFC 7232
+    """
+    header = request.META.get('HTTP_IF_NONE_MATCH', '')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    return '*' in etags or etag in etags or etag in (x[2:] for x in etags if x.startswith('W/'))
+
+
+def not_modified(etag):
+    response = HttpResponse(status=304)
+    response['ETag'] = etag
+    return response
+
+
+def _model_version_key(model, db):
+    return f'conditional:version:{db}:{model._meta.label_lower}'
+
+
+def get_model_version(model, db):
+    """
+    Version of a model in a database, part of the ETags of its querysets. It lives in the django cache, which must be
+    shared by the workers (see CACHES) so a bump made by any of them changes the ETags served by all. A version lost
+    to an eviction is replaced by a new one: the next requests miss, none is answered 304 with stale data
+    """
+    key = _model_version_key(model, db)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_model_version(model, db):
+    """
+    Invalidate the ETags of a model, for writes that may leave MAX(updated_at) and the row count unchanged
+    (e.g. the admin does not touch updated_at) and for the writes of the models nested in its representation
+    """
+    cache.set(_model_version_key(model, db), uuid.uuid4().hex, None)
+
+
+def get_queryset_etag(queryset, *extra):
+    """
+    Cheap validator of a queryset: MAX(updated_at), the number of rows and the version of the model
+    @param queryset: queryset of a BaseModel
+    @param extra: other values the representation depends on (e.g. the query string)
+    @return: quoted ETag
+    """
+    validator = queryset.order_by().aggregate(updated_at=Max('updated_at'), count=Count('pk'))
+    parts = (get_model_version(queryset.model, queryset.db), validator['updated_at'], validator['count']) + extra
+    return '"{}"'.format(hashlib.sha1(repr(parts).encode()).hexdigest())
+
+
+class ConditionalResponseMixin:
+    """
+    list and retrieve answer 304 Not Modified, without serializing anything, when If-None-Match has the ETag of
+    get_conditional_queryset(). The model version must be bumped (bump_model_version) on post_save/post_delete.
+    """
+
+    def get_conditional_queryset(self):
+        """
+        Rows the list depends on, the filtered queryset of the viewset by default
+        """
+        return self.filter_queryset(self.get_queryset())
+
+    def get_conditional_etag(self, queryset):
+        return get_queryset_etag(queryset, self.request.get_full_path(), self.request.accepted_media_type)
+
+    def conditional_response(self, view, request, *args, queryset=None, **kwargs):
+        """
+        @param view: handler building the full response
+        @param queryset: rows the response depends on (default: get_conditional_queryset())
+        @return: 304 response or the response of view with its ETag
+        """
+        try:
+            etag = self.get_conditional_etag(self.get_conditional_queryset() if queryset is None else queryset)
+        except Exception:
+            # e.g. malformed ids, the view answers with its own error
+            return view(request, *args, **kwargs)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200:
+            response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.get_conditional_queryset().filter(**{self.lookup_field: kwargs[lookup_url_kwarg]})
+        return self.conditional_response(super().retrieve, request, *args, queryset=queryset, **kwargs)
@@ -15,6 +15,34 @@ CHOISES_CLASSES = (
     (CHOISE_3, 'Choise 3'))
 
 
+# MEASUREMENTS
+MEASUREMENT_TEMPERATURE = 0
+MEASUREMENT_HUMIDITY = 1
+MEASUREMENT_PRESSURE = 2
+
+MEASUREMENT_VARIABLES = (
+    (MEASUREMENT_TEMPERATURE, 'Temperature'),
+    (MEASUREMENT_HUMIDITY, 'Humidity'),
+    (MEASUREMENT_PRESSURE, 'Pressure'))
+
+# Measurement field by variable
+MEASUREMENT_FIELDS = {
+    MEASUREMENT_TEMPERATURE: 'temperature',
+    MEASUREMENT_HUMIDITY: 'humidity',
+    MEASUREMENT_PRESSURE: 'pressure',
+}
+
+# Rollup resolutions in seconds
+ROLLUP_1_MIN = 60
+ROLLUP_15_MIN = 900
+ROLLUP_1_HOUR = 3600
+
+ROLLUP_RESOLUTIONS = (
+    (ROLLUP_1_MIN, '1 min'),
+    (ROLLUP_15_MIN, '15 min'),
+    (ROLLUP_1_HOUR, '1 hour'))
+
+
 # UI components Generals
 UI_COMPONENT_GENERAL_ID = 1
 
@@ -39,4 +67,52 @@ DYNAMIC_HELP = {
             "read_more": False,
         },
     },
-}
\ No newline at end of file
+}
+
+# JOBS
+JOB_PENDING = 0
+JOB_RUNNING = 1
+JOB_SUCCEEDED = 2
+JOB_FAILED = 3
+JOB_CANCELED = 4
+
+JOB_STATUSES = (
+    (JOB_PENDING, 'Pending'),
+    (JOB_RUNNING, 'Running'),
+    (JOB_SUCCEEDED, 'Succeeded'),
+    (JOB_FAILED, 'Failed'),
+    (JOB_CANCELED, 'Canceled'))
+
+
+# INTERPOLATION
+# exponent of the distance in the Inverse Distance Weighting
+IDW_DEFAULT_POWER = 3
+
+
+# OPERATION ENVELOPES
+ENVELOPE_UNKNOWN = -1
+ENVELOPE_RECOMMENDED = 0
+ENVELOPE_ALLOWED = 1
+ENVELOPE_OUTSIDE = 2
+
+ENVELOPE_CLASSES = (
+    (ENVELOPE_UNKNOWN, 'Unknown'),
+    (ENVELOPE_RECOMMENDED, 'Inside recommended'),
+    (ENVELOPE_ALLOWED, 'Inside allowed'),
+    (ENVELOPE_OUTSIDE, 'Outside'))
+
+# Default envelopes by operation class (ASHRAE A1-A4):
+# (min temperature °C, max temperature °C, min dew point °C, max dew point °C, min RH %, max RH %)
+RECOMMENDED_OPERATION_ENVELOPES = {
+    CHOISE_0: (18, 27, -9, 15, 0, 60),
+    CHOISE_1: (18, 27, -9, 15, 0, 60),
+    CHOISE_2: (18, 27, -9, 15, 0, 60),
+    CHOISE_3: (18, 27, -9, 15, 0, 60),
+}
+
+ALLOWED_OPERATION_ENVELOPES = {
+    CHOISE_0: (15, 32, -12, 17, 8, 80),
+    CHOISE_1: (10, 35, -12, 21, 8, 80),
+    CHOISE_2: (5, 40, -12, 24, 8, 85),
+    CHOISE_3: (5, 45, -12, 24, 8, 90),
+}
@@ -1,14 +1,11 @@
 import base64
 import datetime
-import itertools
 import math
 import random
 import statistics
 import string
 import uuid
-from collections import defaultdict
 
-import numpy as np
 from django.contrib import admin
 from django.core.files.base import ContentFile
 from django.db import models
@@ -16,6 +13,7 @@ from django.db.models import Func, Aggregate, FloatField, JSONField
 from django.utils import timezone
 
 from code_setting.middleware import db_ctx
+from utils.constants import IDW_DEFAULT_POWER
 
 
 # # # # # BASE MODEL # # # # #
@@ -250,6 +248,8 @@ def reject_outliers(data, m=2):
     """
     if data:
         try:
+            import numpy as np
+
             data = np.array(data)
             return data[abs(data - np.mean(data)) < m * np.std(data)].tolist()
         except:
@@ -324,36 +324,24 @@ def calculate_deviation_power(items):
         return None
 
 
-def calculate_idwr(distance_list, values_list):
+def calculate_idwr(distance_list, values_list, power=IDW_DEFAULT_POWER):
     """Function to get the data with the Inverse Distance Weighting from the values of different positions
     :param distance_list: list of distances
     :param values_list: list of values measured by sensors
+    :param power: exponent of the distance
     :return calculated value
     """
     try:
         if distance_list:
-            distances_without_none = [i for i, elem in enumerate(distance_list) if elem is None]
-            for index in sorted(distances_without_none, reverse=True):
-                del distance_list[index]
-                del values_list[index]
-            distances_0 = [i for i, elem in enumerate(distance_list) if elem == 0]
-            if distances_0:
-                sum_val = 0
-                for i in distances_0:
-                    sum_val += values_list[i]
-                val = sum_val / len(distances_0)
-            else:
-                distance_inverse = list((1 / np.power(distance_list, 3)))
-                suminf = np.sum(distance_inverse)
-                temp_ponderation = np.array(distance_inverse) * np.array(values_list)
-                sum_temp_ponderation = np.sum(temp_ponderation)
-                val = sum_temp_ponderation / suminf
-            return round_function(val)
+            from utils.interpolation import idw_from_distances
+
+            value = idw_from_distances([distance_list], values_list, power)[0]
+            return round_function(value)
     except Exception:
         return 0
 
 
-def calculate_idwr_by_2_dict(list_distances, value_list):
+def calculate_idwr_by_2_dict(list_distances, value_list, power=IDW_DEFAULT_POWER):
     """
     Function to join 2 dictionaries with similar key value "rack__id" and get the data with the Inverse Distance
     Weighting
@@ -365,18 +353,17 @@ def calculate_idwr_by_2_dict(list_distances, value_list):
 
     @param list_distances: list of distances
     @param value_list: list of values
+    @param power: exponent of the distance
     @return: calculated weighted value
     """
     try:
-        d = defaultdict(dict)
-        for elem in itertools.chain(list_distances, value_list):
-            d[elem['relatedtable1_id']].update(elem)
-
-        return_values_list = list(d.values())
-        distances_return = list(x['dist'] for x in return_values_list)
-        temp_return = list(x['median'] for x in return_values_list)
-        value = round_function(calculate_idwr(distances_return, temp_return))
-        return value
+        distances = {x['relatedtable1_id']: x['dist'] for x in list_distances}
+        values = {x['relatedtable1_id']: x['median'] for x in value_list}
+        if distances.keys() != values.keys():
+            return None
+
+        keys = list(distances)
+        return round_function(calculate_idwr([distances[k] for k in keys], [values[k] for k in keys], power))
     except Exception:
         return None
 
@@ -389,12 +376,12 @@ def closest_node(node, nodes_list, ratio):
     @param ratio: max distance in meters
     @return: boolean list inside ratio main node
     """
+    import numpy as np
 
-    nodes = np.asarray(nodes_list)
-    distance_node_allnodes = list(np.sum((nodes - node) ** 2, axis=1))
-    sqrt_distances = [math.sqrt(x) for x in distance_node_allnodes]
-    list_index_closest_nodes = [x < ratio for x in sqrt_distances]
-    index_closest_node = np.argmin(sqrt_distances)
+    nodes = np.asarray(nodes_list, dtype=float)
+    distances = np.sqrt(np.sum((nodes - node) ** 2, axis=1))
+    list_index_closest_nodes = (distances < ratio).tolist()
+    index_closest_node = np.argmin(distances)
     return list_index_closest_nodes, index_closest_node
 
 
@@ -0,0 +1,77 @@
+"""
+    Inverse Distance Weighting (IDW) interpolation
+"""
+import numpy as np
+
+from utils.constants import IDW_DEFAULT_POWER
+
+# max number of (target, sensor) pairs evaluated at once, bounds the memory of the distance matrix
+IDW_BLOCK_SIZE = 1000000
+
+
+def idw_from_distances(distances, values, power=IDW_DEFAULT_POWER):
+    """
+    Inverse Distance Weighting from precomputed distances
+    Distances or values that are None/nan/inf are ignored. Targets with one or more sensors at distance 0 take
+    the mean value of those sensors.
+    @param distances: (M x N) array of distances from every target to every sensor
+    @param values: (N) or (M x N) array of values measured by sensors
+    @param power: exponent of the distance
+    @return: (M) array of interpolated values, nan for targets without any valid sensor
+    """
+    distances = np.atleast_2d(np.asarray(distances, dtype=float))
+    values = np.broadcast_to(np.asarray(values, dtype=float), distances.shape)
+
+    valid = np.isfinite(distances) & np.isfinite(values) & (distances >= 0)
+    exact = valid & (distances == 0)
+    weighted = valid & ~exact
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weights = np.zeros(distances.shape)
+        np.power(distances, -float(power), out=weights, where=weighted)
+        interpolated = np.sum(weights * np.where(weighted, values, 0), axis=1) / np.sum(weights, axis=1)
+
+        exact_count = np.sum(exact, axis=1)
+        exact_values = np.sum(np.where(exact, values, 0), axis=1) / exact_count
+
+    return np.where(exact_count > 0, exact_values, interpolated)
+
+
+def idw_interpolate(positions, values, targets, power=IDW_DEFAULT_POWER, block_size=IDW_BLOCK_SIZE):
+    """
+    Inverse Distance Weighting of all the targets in one call
+    Sensors with a None/nan/inf coordinate or value are ignored.
+    @param positions: (N x 3) array of sensor positions (any dimension D is accepted -> N x D)
+    @param values: (N) array of values measured by sensors
+    @param targets: (M x 3) array of points to interpolate (M x D)
+    @param power: exponent of the distance
+    @param block_size: max number of (target, sensor) pairs evaluated at once
+    @return: (M) array of interpolated values, nan when there is no valid sensor
+    """
+    positions = np.asarray(positions, dtype=float)
+    values = np.asarray(values, dtype=float).ravel()
+    targets = np.atleast_2d(np.asarray(targets, dtype=float))
+
+    if positions.ndim != 2 or positions.shape[0] != values.shape[0]:
+        raise ValueError(f'positions {positions.shape} and values {values.shape} do not match')
+    if targets.shape[1] != positions.shape[1]:
+        raise ValueError(f'targets {targets.shape} and positions {positions.shape} do not match')
+
+    mask = np.isfinite(values) & np.all(np.isfinite(positions), axis=1)
+    positions = positions[mask]
+    values = values[mask]
+
+    result = np.full(targets.shape[0], np.nan)
+    if not values.size:
+        return result
+
+    step = max(1, block_size // values.size)
+    for start in range(0, targets.shape[0], step):
+        block = targets[start:start + step]
+        # accumulate per axis to keep only (block x N) temporaries and exact zeros on exact hits
+        squared = np.zeros((block.shape[0], positions.shape[0]))
+        for axis in range(positions.shape[1]):
+            squared += (block[:, axis, None] - positions[None, :, axis]) ** 2
+        result[start:start + step] = idw_from_distances(np.sqrt(squared), values, power)
+
+    return result
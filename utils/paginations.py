@@ -1,5 +1,44 @@
+import base64
+import json
+import uuid
+
+from django.db import connections
+from django.db.models import F, Q
+from django.utils.dateparse import parse_datetime
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+COUNT_EXACT = 'exact'
+COUNT_ESTIMATED = 'estimated'
+
+
+def estimate_count(queryset):
+    """
+    Estimated number of rows of a queryset without COUNT(*): the table statistics (pg_class.reltuples) for a
+    whole table or the planner estimate of the filtered query
+    @param queryset: queryset
+    @return: int
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                           [connection.ops.quote_name(queryset.model._meta.db_table)])
+            row = cursor.fetchone()
+            # -1 (or 0 in old versions) when the table was never analyzed
+            if row and row[0] > 0:
+                return row[0]
+
+        sql, params = queryset.order_by().query.sql_with_params()
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        return int(plan[0]['Plan']['Plan Rows'])
 
 
 class Custom20Pagination(pagination.PageNumberPagination):
@@ -48,3 +87,165 @@ class Custom500Pagination(Custom20Pagination):
 
     page_size = 500
     max_page_size = 5000
+
+
+class CustomKeyset20Pagination(pagination.BasePagination):
+    """
+    Keyset (cursor) pagination on (created_at, id), newest first. It does not run COUNT(*) nor OFFSET, so deep
+    pages cost the same as the first one. The total is only computed with ?count=exact or ?count=estimated
+    (or count_mode), otherwise num_results is None.
+    """
+
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = None
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    count_mode = None
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_queryset = queryset
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+
+        reverse = cursor is not None and cursor[2]
+        if cursor is not None:
+            queryset = queryset.filter(self.get_cursor_filter(*cursor))
+
+        if reverse:
+            ordering = (F('created_at').asc(nulls_first=True), 'id')
+        else:
+            ordering = (F('created_at').desc(nulls_last=True), '-id')
+
+        results = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.has_next = has_more if not reverse else True
+        self.has_previous = cursor is not None if not reverse else has_more
+        self.first = results[0] if results else None
+        self.last = results[-1] if results else None
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.GET.get(self.page_size_query_param, self.page_size))
+            if page_size <= 0:
+                return self.page_size
+        except (TypeError, ValueError):
+            return self.page_size
+        return min(page_size, self.max_page_size) if self.max_page_size else page_size
+
+    @staticmethod
+    def get_cursor_filter(created_at, id, reverse):
+        # newest first: next pages are older (or null created_at, listed last), previous pages are newer
+        if not reverse:
+            if created_at is None:
+                return Q(created_at__isnull=True, id__lt=id)
+            return Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=id) | Q(created_at__isnull=True)
+
+        if created_at is None:
+            return Q(created_at__isnull=False) | Q(created_at__isnull=True, id__gt=id)
+        return Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=id)
+
+    def decode_cursor(self, request):
+        encoded = request.GET.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            created_at = None
+            if data['t']:
+                created_at = parse_datetime(data['t'])
+                if created_at is None:
+                    raise ValueError(data['t'])
+            # BaseModel primary keys
+            return created_at, uuid.UUID(str(data['i'])), bool(data['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, obj, reverse):
+        data = {
+            't': obj.created_at.isoformat() if obj.created_at else None,
+            'i': str(obj.pk),
+            'r': reverse
+        }
+        encoded = base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        return self.encode_cursor(self.last, False) if self.has_next and self.last else None
+
+    def get_previous_link(self):
+        return self.encode_cursor(self.first, True) if self.has_previous and self.first else None
+
+    def get_count(self):
+        count_mode = self.request.GET.get(self.count_query_param, self.count_mode)
+        if count_mode == COUNT_EXACT:
+            return self.base_queryset.count()
+        if count_mode == COUNT_ESTIMATED:
+            return estimate_count(self.base_queryset)
+        return None
+
+    def get_paginated_response(self, data):
+
+        return Response({
+            'pagination': {
+                'num_results':  self.get_count(),
+                'page_size':    self.page_size,
+                'next':         self.get_next_link(),
+                'previous':     self.get_previous_link()
+            },
+            'results': data
+        })
+
+
+class CustomKeyset50Pagination(CustomKeyset20Pagination):
+
+    page_size = 50
+    max_page_size = 500
+
+
+class CustomKeyset100Pagination(CustomKeyset20Pagination):
+
+    page_size = 100
+    max_page_size = 1000
+
+
+class CustomKeyset200Pagination(CustomKeyset20Pagination):
+
+    page_size = 200
+    max_page_size = 2000
+
+
+class CustomKeyset500Pagination(CustomKeyset20Pagination):
+
+    page_size = 500
+    max_page_size = 5000
+
+
+PAGINATION_QUERY_PARAM = 'paging'
+PAGINATION_KEYSET = 'keyset'
+
+
+class KeysetPaginationMixin:
+    """
+    Viewsets with page number pagination (pagination_class) that answer with keyset_pagination_class when the
+    request asks for it: ?paging=keyset or a cursor of a previous keyset page
+    """
+    keyset_pagination_class = CustomKeyset20Pagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            params = self.request.GET
+            keyset = params.get(PAGINATION_QUERY_PARAM) == PAGINATION_KEYSET or \
+                self.keyset_pagination_class.cursor_query_param in params
+            pagination_class = self.keyset_pagination_class if keyset else self.pagination_class
+            self._paginator = pagination_class() if pagination_class is not None else None
+        return self._paginator
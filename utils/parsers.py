@@ -0,0 +1,102 @@
+"""
+    Streaming parsers: request.data is a generator of (line number, row) that reads the body in chunks
+"""
+import codecs
+import csv
+import json
+
+from django.conf import settings
+from rest_framework.parsers import BaseParser
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def iter_lines(stream, encoding='utf-8', chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Read a binary stream in chunks and yield its decoded lines (with their line ending)
+    @param stream: file-like object with read(size)
+    @param encoding: encoding of the stream
+    @param chunk_size: bytes read each time
+    @return: generator of str
+    """
+    if stream is None:
+        return
+
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ''
+    while True:
+        chunk = stream.read(chunk_size)
+        pending += decoder.decode(chunk or b'', final=not chunk)
+        # the last piece may be an incomplete line, keep it for the next chunk
+        *lines, pending = pending.split('\n')
+        for line in lines:
+            yield line + '\n'
+        if not chunk:
+            if pending:
+                yield pending
+            return
+
+
+def has_content_length(request):
+    """
+    DRF only reads a body with a Content-Length (see Request._load_stream), a chunked upload (Transfer-Encoding:
+    chunked) would be parsed as an empty stream and accepted without rows
+    @param request: rest_framework Request
+    @return: bool
+    """
+    meta = request.META
+    try:
+        return int(meta.get('CONTENT_LENGTH') or meta.get('HTTP_CONTENT_LENGTH')) >= 0
+    except (TypeError, ValueError):
+        return False
+
+
+class StreamRowError(ValueError):
+    """
+    A row of the stream can not be decoded, the stream can go on with the next row
+    """
+
+
+class NDJSONStreamParser(BaseParser):
+    """
+    Newline delimited JSON, one object per line
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        return self._rows(stream, encoding)
+
+    @staticmethod
+    def _rows(stream, encoding):
+        for number, line in enumerate(iter_lines(stream, encoding), start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as ex:
+                row = StreamRowError(f'JSON parse error - {ex}')
+            if not isinstance(row, (dict, StreamRowError)):
+                row = StreamRowError('each line must be a JSON object')
+            yield number, row
+
+
+class CSVStreamParser(BaseParser):
+    """
+    CSV with a header line
+    """
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        return self._rows(stream, encoding)
+
+    @staticmethod
+    def _rows(stream, encoding):
+        reader = csv.DictReader(iter_lines(stream, encoding))
+        for row in reader:
+            if None in row:
+                yield reader.line_num, StreamRowError('row has more columns than the header')
+                continue
+            # empty cells are missing values
+            yield reader.line_num, {k: v for k, v in row.items() if v not in ('', None)}
@@ -1,6 +1,67 @@
+import logging
+
+from django.core.cache import cache
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
 from rest_framework import permissions
 
 from code_setting.middleware import db_ctx
+from code_setting.settings import MEMBERSHIP_CACHE_TIMEOUT, JWT_TENANTS_CLAIM
+
+logger = logging.getLogger(__name__)
+
+MEMBERSHIP_CACHE_KEY = 'permissions:membership:{user_id}:{db}'
+
+# per process counters of the membership checks
+membership_metrics = {'hits': 0, 'misses': 0, 'claims': 0}
+
+
+def get_membership_cache_key(user_id, db):
+    return MEMBERSHIP_CACHE_KEY.format(user_id=user_id, db=db)
+
+
+def is_company_member(user, db):
+    """
+    Check the Company-User relation, cached for MEMBERSHIP_CACHE_TIMEOUT seconds
+    @param user: authenticated user
+    @param db: company db
+    @return: bool
+    """
+    cache_key = get_membership_cache_key(user.pk, db)
+    member = cache.get(cache_key)
+    if member is not None:
+        membership_metrics['hits'] += 1
+        return member
+
+    membership_metrics['misses'] += 1
+    member = user.companyuser_set.filter(company__db=db).exists()
+    cache.set(cache_key, member, MEMBERSHIP_CACHE_TIMEOUT)
+    return member
+
+
+def invalidate_company_membership(user_id, db):
+    cache.delete(get_membership_cache_key(user_id, db))
+
+
+def get_user_tenants(user):
+    """
+    @return: list of the company dbs of a user
+    """
+    return list(user.companyuser_set.values_list('company__db', flat=True))
+
+
+def get_token_tenants(request):
+    """
+    @return: company dbs carried by the JWT of the request, None when there is no such claim
+    """
+    if not JWT_TENANTS_CLAIM or request.auth is None or not hasattr(request.auth, 'get'):
+        return None
+    return request.auth.get(JWT_TENANTS_CLAIM)
+
+
+def get_membership_metrics():
+    total = membership_metrics['hits'] + membership_metrics['misses']
+    return {**membership_metrics, 'hit_ratio': round(membership_metrics['hits'] / total, 4) if total else None}
 
 
 class IsAuthorized(permissions.BasePermission):
@@ -18,8 +79,28 @@ class IsAuthorized(permissions.BasePermission):
             user = request.user
             if user.is_superuser:
                 return True
-            else:
-                return user.companyuser_set.filter(company__db=db).exists()
+
+            tenants = get_token_tenants(request)
+            if tenants is not None:
+                membership_metrics['claims'] += 1
+                return db in tenants
+            return is_company_member(user, db)
         except Exception as ex:
-            print(ex.__str__())
-            return False
\ No newline at end of file
+            logger.warning('IsAuthorized: %s', ex)
+            return False
+
+
+@receiver(pre_save, sender='xmaster.CompanyUser')
+def track_company_user_membership(sender, instance, using, **kwargs):
+    # (user, company db) before the save, a CompanyUser moved to another company or user loses the old membership
+    instance._previous_membership = sender.objects.using(using).filter(pk=instance.pk)\
+        .values_list('user_id', 'company__db').first() if instance.pk is not None else None
+
+
+@receiver(post_save, sender='xmaster.CompanyUser')
+@receiver(post_delete, sender='xmaster.CompanyUser')
+def invalidate_company_user_membership(sender, instance, **kwargs):
+    invalidate_company_membership(instance.user_id, instance.company.db)
+    previous = getattr(instance, '_previous_membership', None)
+    if previous is not None:
+        invalidate_company_membership(*previous)
@@ -0,0 +1,176 @@
+"""
+    Vectorized psychrometrics (SI units), same formulas as PsychroLib evaluated on whole arrays
+    Temperatures in °C, relative humidity in [0, 1], pressures in Pa, humidity ratio in kg_H2O/kg_air,
+    enthalpy in J/kg_air. Invalid or out of range states give nan instead of raising.
+    Reference: ASHRAE Handbook - Fundamentals (2017) ch. 1
+"""
+from functools import lru_cache
+
+import numpy as np
+
+ZERO_CELSIUS_AS_KELVIN = 273.15
+TRIPLE_POINT_WATER = 0.01
+R_DA = 287.042
+MIN_HUM_RATIO = 1e-7
+STANDARD_PRESSURE = 101325.
+
+# validity range of the saturation vapor pressure equations (°C)
+TEMPERATURE_BOUNDS = (-100., 200.)
+
+DEW_POINT_TOLERANCE = 0.001
+DEW_POINT_MAX_ITERATIONS = 100
+
+PSYCHROMETRIC_FIELDS = ('vapor_pressure', 'humidity_ratio', 'dew_point', 'enthalpy', 'volume', 'density')
+
+
+def get_standard_pressure(altitude):
+    """
+    @param altitude: m
+    @return: standard atmosphere pressure (Pa)
+    """
+    return STANDARD_PRESSURE * (1 - 2.25577e-05 * np.asarray(altitude, dtype=float)) ** 5.2559
+
+
+def sat_vapor_pressure(temperature):
+    t = np.asarray(temperature, dtype=float)
+    k = t + ZERO_CELSIUS_AS_KELVIN
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ice = (-5.6745359E+03 / k + 6.3925247 - 9.677843E-03 * k + 6.2215701E-07 * k ** 2
+               + 2.0747825E-09 * k ** 3 - 9.484024E-13 * k ** 4 + 4.1635019 * np.log(k))
+        water = (-5.8002206E+03 / k + 1.3914993 - 4.8640239E-02 * k + 4.1764768E-05 * k ** 2
+                 - 1.4452093E-08 * k ** 3 + 6.5459673 * np.log(k))
+        pws = np.exp(np.where(t <= TRIPLE_POINT_WATER, ice, water))
+    return np.where((t >= TEMPERATURE_BOUNDS[0]) & (t <= TEMPERATURE_BOUNDS[1]), pws, np.nan)
+
+
+def _d_ln_sat_vapor_pressure(temperature):
+    k = temperature + ZERO_CELSIUS_AS_KELVIN
+    ice = (5.6745359E+03 / k ** 2 - 9.677843E-03 + 2 * 6.2215701E-07 * k + 3 * 2.0747825E-09 * k ** 2
+           - 4 * 9.484024E-13 * k ** 3 + 4.1635019 / k)
+    water = (5.8002206E+03 / k ** 2 - 4.8640239E-02 + 2 * 4.1764768E-05 * k - 3 * 1.4452093E-08 * k ** 2
+             + 6.5459673 / k)
+    return np.where(temperature <= TRIPLE_POINT_WATER, ice, water)
+
+
+def vapor_pressure(temperature, relative_humidity):
+    rh = np.asarray(relative_humidity, dtype=float)
+    return np.where((rh >= 0) & (rh <= 1), rh * sat_vapor_pressure(temperature), np.nan)
+
+
+def humidity_ratio(vapor_pressure_values, pressure=STANDARD_PRESSURE):
+    pw = np.asarray(vapor_pressure_values, dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        w = 0.621945 * pw / (pressure - pw)
+    return np.where(pw >= 0, np.maximum(w, MIN_HUM_RATIO), np.nan)
+
+
+def relative_humidity_from_humidity_ratio(temperature, humidity_ratio_values, pressure=STANDARD_PRESSURE):
+    w = np.maximum(np.asarray(humidity_ratio_values, dtype=float), MIN_HUM_RATIO)
+    pw = pressure * w / (0.621945 + w)
+    return pw / sat_vapor_pressure(temperature)
+
+
+def moist_air_enthalpy(temperature, humidity_ratio_values):
+    t = np.asarray(temperature, dtype=float)
+    w = np.maximum(np.asarray(humidity_ratio_values, dtype=float), MIN_HUM_RATIO)
+    return (1.006 * t + w * (2501. + 1.86 * t)) * 1000
+
+
+def moist_air_volume(temperature, humidity_ratio_values, pressure=STANDARD_PRESSURE):
+    t = np.asarray(temperature, dtype=float)
+    w = np.maximum(np.asarray(humidity_ratio_values, dtype=float), MIN_HUM_RATIO)
+    return R_DA * (t + ZERO_CELSIUS_AS_KELVIN) * (1 + 1.607858 * w) / pressure
+
+
+def moist_air_density(temperature, humidity_ratio_values, pressure=STANDARD_PRESSURE):
+    w = np.maximum(np.asarray(humidity_ratio_values, dtype=float), MIN_HUM_RATIO)
+    return (1 + w) / moist_air_volume(temperature, w, pressure)
+
+
+def dew_point(temperature, vapor_pressure_values, tolerance=DEW_POINT_TOLERANCE,
+              max_iterations=DEW_POINT_MAX_ITERATIONS):
+    """
+    Dew point from the vapor pressure, Newton-Raphson on ln(Pws) run on every state at once (states leave
+    the iteration when they converge)
+    @param temperature: dry bulb temperatures (°C), starting point of the iteration
+    @param vapor_pressure_values: partial pressures of water vapor (Pa)
+    @return: dew points (°C), never above the dry bulb temperature
+    """
+    t, pw = np.broadcast_arrays(np.asarray(temperature, dtype=float), np.asarray(vapor_pressure_values, dtype=float))
+    shape = t.shape
+    t, pw = t.ravel(), pw.ravel()
+    low, high = sat_vapor_pressure(np.array(TEMPERATURE_BOUNDS))
+    valid = np.isfinite(t) & np.isfinite(pw) & (pw >= low) & (pw <= high)
+
+    dew = np.full(t.shape, np.nan)
+    dew[valid] = t[valid]
+    ln_pw = np.log(pw[valid])
+    active = np.arange(len(t))[valid]
+    ln_pw_active = ln_pw
+
+    for _ in range(max_iterations + 1):
+        if not len(active):
+            break
+        current = dew[active]
+        step = (np.log(sat_vapor_pressure(current)) - ln_pw_active) / _d_ln_sat_vapor_pressure(current)
+        dew[active] = np.clip(current - step, *TEMPERATURE_BOUNDS)
+        pending = np.abs(dew[active] - current) > tolerance
+        active, ln_pw_active = active[pending], ln_pw_active[pending]
+
+    dew[active] = np.nan
+    return np.minimum(dew, np.where(valid, t, np.nan)).reshape(shape)
+
+
+def _compute(temperature, relative_humidity, pressure):
+    pw = vapor_pressure(temperature, relative_humidity)
+    w = humidity_ratio(pw, pressure)
+    return {
+        'vapor_pressure': pw,
+        'humidity_ratio': w,
+        'dew_point': dew_point(temperature, pw),
+        'enthalpy': moist_air_enthalpy(temperature, w),
+        'volume': moist_air_volume(temperature, w, pressure),
+        'density': moist_air_density(temperature, w, pressure),
+    }
+
+
+def psychrometrics(temperature, relative_humidity, pressure=STANDARD_PRESSURE):
+    """
+    Psychrometric properties of many states at once. Repeated (temperature, humidity, pressure) states, very
+    common with sensor readings, are computed once
+    @param temperature: array of dry bulb temperatures (°C)
+    @param relative_humidity: array of relative humidities in [0, 1]
+    @param pressure: array or scalar of atmospheric pressures (Pa)
+    @return: dict PSYCHROMETRIC_FIELDS -> arrays shaped like the inputs
+    """
+    t, rh, p = np.broadcast_arrays(np.asarray(temperature, dtype=float), np.asarray(relative_humidity, dtype=float),
+                                   np.asarray(pressure, dtype=float))
+    shape = t.shape
+    states = np.column_stack((t.ravel(), rh.ravel(), p.ravel()))
+    if not len(states):
+        return {x: np.empty(shape) for x in PSYCHROMETRIC_FIELDS}
+
+    # sort the states (lexsort is much faster than np.unique(axis=0)) and keep the first of each run
+    order = np.lexsort(states.T[::-1])
+    sorted_states = states[order]
+    first = np.ones(len(states), dtype=bool)
+    first[1:] = np.any(sorted_states[1:] != sorted_states[:-1], axis=1)
+    if first.all():
+        unique, inverse = states, None
+    else:
+        unique = sorted_states[first]
+        inverse = np.empty(len(states), dtype=np.intp)
+        inverse[order] = np.cumsum(first) - 1
+
+    values = _compute(unique[:, 0], unique[:, 1], unique[:, 2])
+    return {k: (v if inverse is None else v[inverse]).reshape(shape) for k, v in values.items()}
+
+
+@lru_cache(maxsize=4096)
+def get_psychrometric_state(temperature, relative_humidity, pressure=STANDARD_PRESSURE):
+    """
+    Memoized properties of a single state
+    @return: dict PSYCHROMETRIC_FIELDS -> float (nan if invalid)
+    """
+    values = _compute(np.array([temperature], dtype=float), np.array([relative_humidity], dtype=float), pressure)
+    return {k: float(v[0]) for k, v in values.items()}
@@ -0,0 +1,192 @@
+"""
+    Data access helpers for large company tables:
+        iter_chunks: keyset iteration by primary key, short independent queries instead of one long cursor
+        load_columns: values_list straight into numpy arrays, no model instances
+        bulk_update_values / merge_calculation_vars: batched writes of computed fields
+        trigram_icontains: case insensitive contains that a gin_trgm_ops index on the column can serve
+
+    numpy is imported when columns are loaded
+"""
+import json
+
+from django.db import connections, models, transaction
+
+CHUNK_SIZE = 2000
+BULK_BATCH_SIZE = 500
+
+
+@models.CharField.register_lookup
+@models.TextField.register_lookup
+class TrigramIContains(models.Lookup):
+    """
+    column ILIKE '%value%'. icontains renders UPPER(column::text) LIKE UPPER(value) on PostgreSQL, an expression
+    that a gin_trgm_ops index on the column does not match, so it always scans the table
+    """
+    lookup_name = 'trigram_icontains'
+
+    def get_db_prep_lookup(self, value, connection):
+        return '%s', [f'%{connection.ops.prep_for_like_query(value)}%']
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} {connection.operators["icontains"] % rhs}', lhs_params + rhs_params
+
+    def as_postgresql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} ILIKE {rhs}', lhs_params + rhs_params
+
+
+def iter_chunks(queryset, chunk_size=CHUNK_SIZE, fields=None):
+    """
+    Iterate a queryset in chunks ordered by primary key, each chunk is a query that starts after the last key
+    (WHERE pk > last ORDER BY pk LIMIT chunk_size), so no cursor or transaction is kept open between chunks and
+    rows inserted meanwhile are still seen when their key is ahead
+    @param queryset: queryset, it is bound to its database on the first chunk
+    @param chunk_size: rows per query
+    @param fields: values_list fields, the rows are tuples (pk, *fields) instead of model instances
+    @return: generator of lists of rows
+    """
+    queryset = queryset.using(queryset.db).order_by('pk')
+    if fields is not None:
+        queryset = queryset.values_list('pk', *fields)
+
+    last = None
+    while True:
+        chunk = list((queryset if last is None else queryset.filter(pk__gt=last))[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        last = chunk[-1][0] if fields is not None else chunk[-1].pk
+
+
+def get_field_dtype(field, null=False):
+    """
+    numpy dtype of a model field: nullable numbers are float64 so NULL is nan, text and UUIDs are objects
+    @param field: model field
+    @param null: the column may be NULL even when the field is not nullable (lookup across a nullable relation)
+    """
+    null = null or field.null
+    if isinstance(field, models.ForeignKey):
+        field = field.target_field
+    if isinstance(field, models.FloatField):
+        return 'float64'
+    if isinstance(field, models.BooleanField):
+        return 'float64' if null else 'bool'
+    if isinstance(field, (models.IntegerField, models.AutoField)):
+        return 'float64' if null else 'int64'
+    if isinstance(field, models.DateTimeField):
+        return 'datetime64[us]'
+    return 'object'
+
+
+def load_columns(queryset, fields, dtypes=None, chunk_size=CHUNK_SIZE):
+    """
+    Load fields of a queryset as numpy arrays, reading the rows in chunks without building model instances
+    @param queryset: queryset
+    @param fields: field names (related lookups such as related_table2__cold_pos are accepted)
+    @param dtypes: dict field -> numpy dtype, see get_field_dtype for the defaults
+    @param chunk_size: rows per fetch
+    @return: dict field -> (N) array
+    """
+    import numpy as np
+    from django.db.models.constants import LOOKUP_SEP
+
+    dtypes = dict(dtypes or {})
+    for name in fields:
+        if name not in dtypes:
+            model, parts, null = queryset.model, name.split(LOOKUP_SEP), False
+            for part in parts[:-1]:
+                field = model._meta.get_field(part)
+                # the fields behind a missing related row are NULL (nullable foreign keys and reverse relations)
+                null = null or field.null or not field.concrete
+                model = field.related_model
+            dtypes[name] = get_field_dtype(model._meta.get_field(parts[-1]), null)
+
+    columns = {x: [] for x in fields}
+    chunk = []
+
+    def flush():
+        for name, values in zip(fields, zip(*chunk)):
+            if dtypes[name].startswith('datetime64'):
+                # numpy keeps naive UTC datetimes
+                values = [None if x is None else x.replace(tzinfo=None) for x in values]
+            columns[name].append(np.array(values, dtype=dtypes[name]))
+        chunk.clear()
+
+    for row in queryset.values_list(*fields).iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+
+    return {x: np.concatenate(v) if v else np.empty(0, dtype=dtypes[x]) for x, v in columns.items()}
+
+
+def bulk_update_values(model, db, values, batch_size=BULK_BATCH_SIZE):
+    """
+    Write computed fields of many rows, one bulk_update (UPDATE ... CASE) per set of fields
+    @param model: model
+    @param db: database
+    @param values: dict pk -> {field: value}
+    @param batch_size: rows per query
+    @return: number of updated rows
+    """
+    by_fields = {}
+    for pk, row in values.items():
+        if row:
+            by_fields.setdefault(tuple(sorted(row)), []).append(model(pk=pk, **row))
+
+    updated = 0
+    with transaction.atomic(using=db):
+        for fields, objs in by_fields.items():
+            model.objects.using(db).bulk_update(objs, fields, batch_size=batch_size)
+            updated += len(objs)
+    return updated
+
+
+def merge_calculation_vars(model, db, values, batch_size=BULK_BATCH_SIZE):
+    """
+    Merge keys into calculation_vars (BaseModel) of many rows. On PostgreSQL each batch is a single
+    UPDATE ... FROM (VALUES ...) with the jsonb || operator, so the stored values are not read back
+    @param model: BaseModel subclass
+    @param db: database
+    @param values: dict pk -> dict of keys to set
+    @param batch_size: rows per query
+    @return: number of updated rows
+    """
+    items = [(pk, row) for pk, row in values.items() if row]
+    connection = connections[db]
+    if connection.vendor != 'postgresql':
+        updated = 0
+        with transaction.atomic(using=db):
+            for start in range(0, len(items), batch_size):
+                batch = {str(pk): row for pk, row in items[start:start + batch_size]}
+                objs = list(model.objects.using(db).filter(pk__in=batch).only('pk', 'calculation_vars'))
+                for obj in objs:
+                    obj.calculation_vars = {**(obj.calculation_vars or {}), **batch[str(obj.pk)]}
+                model.objects.using(db).bulk_update(objs, ['calculation_vars'], batch_size=batch_size)
+                updated += len(objs)
+        return updated
+
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    pk_column = qn(model._meta.pk.column)
+    column = qn(model._meta.get_field('calculation_vars').column)
+    pk_type = model._meta.pk.rel_db_type(connection)
+
+    updated = 0
+    with transaction.atomic(using=db), connection.cursor() as cursor:
+        for start in range(0, len(items), batch_size):
+            batch = items[start:start + batch_size]
+            rows = ', '.join([f'(%s::{pk_type}, %s::jsonb)'] * len(batch))
+            params = [x for pk, row in batch for x in (str(pk), json.dumps(row))]
+            cursor.execute(
+                f'UPDATE {table} AS t SET {column} = COALESCE(t.{column}, \'{{}}\'::jsonb) || v.vars '
+                f'FROM (VALUES {rows}) AS v(id, vars) WHERE t.{pk_column} = v.id', params)
+            updated += cursor.rowcount
+    return updated
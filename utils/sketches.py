@@ -0,0 +1,140 @@
+"""
+    Streaming quantile sketches
+"""
+import math
+
+
+def percentile_cont(values, p=0.5):
+    """
+    Exact quantile with linear interpolation, same as PostgreSQL PERCENTILE_CONT
+    @param values: list of numbers
+    @param p: quantile in [0, 1]
+    @return: float or None for an empty list
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    position = p * (len(values) - 1)
+    lower = math.floor(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class P2Quantile:
+    """
+    P-square algorithm (Jain & Chlamtac, 1985): estimates a quantile with 5 markers, O(1) memory and time per
+    observation. The first buffer_size observations are kept, so the value is exact until then, and the markers
+    start from their exact quantiles, which is much more accurate than starting from the first 5 observations.
+    """
+    __slots__ = ('p', 'buffer_size', 'count', 'heights', 'positions', 'desired', 'increments')
+
+    def __init__(self, p=0.5, buffer_size=64):
+        self.p = p
+        self.buffer_size = max(buffer_size, 5)
+        self.count = 0
+        self.heights = []
+        self.positions = []
+        self.desired = []
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def _start_markers(self):
+        values, n = self.heights, len(self.heights)
+        positions = [1 + round((n - 1) * x) for x in self.increments]
+        # markers need strictly increasing positions
+        for i in (3, 2, 1):
+            positions[i] = min(positions[i], positions[i + 1] - 1)
+        for i in (1, 2, 3):
+            positions[i] = max(positions[i], positions[i - 1] + 1)
+
+        self.positions = positions
+        self.heights = [values[x - 1] for x in positions]
+        self.desired = [1 + (n - 1) * x for x in self.increments]
+
+    def add(self, value):
+        if value is None or math.isnan(value) or math.isinf(value):
+            return
+
+        if self.count < self.buffer_size:
+            self.count += 1
+            self.heights.append(value)
+            self.heights.sort()
+            return
+        if self.count == self.buffer_size:
+            self._start_markers()
+
+        self.count += 1
+        heights = self.heights
+        if value < heights[0]:
+            heights[0] = value
+            k = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            k = 3
+        else:
+            k = 0
+            while value >= heights[k + 1]:
+                k += 1
+
+        positions = self.positions
+        for i in range(k + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        for i in (1, 2, 3):
+            d = self.desired[i] - positions[i]
+            if (d >= 1 and positions[i + 1] - positions[i] > 1) or (d <= -1 and positions[i - 1] - positions[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + d * (heights[i + d] - heights[i]) / (positions[i + d] - positions[i])
+                heights[i] = height
+                positions[i] += d
+
+    def _parabolic(self, i, d):
+        q, n = self.heights, self.positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    def value(self):
+        if self.count <= self.buffer_size:
+            return percentile_cont(self.heights, self.p)
+        return self.heights[2]
+
+    def to_dict(self):
+        return {x: getattr(self, x) for x in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['p'], data['buffer_size'])
+        for key in cls.__slots__:
+            setattr(sketch, key, list(data[key]) if isinstance(data[key], list) else data[key])
+        return sketch
+
+
+def sketch_accuracy(groups, p=0.5):
+    """
+    Compare the sketch with the exact quantile on groups of values
+    @param groups: dict group -> list of values
+    @param p: quantile
+    @return: dict with the max/mean absolute error and the error by group
+    """
+    errors = {}
+    for group, values in groups.items():
+        sketch = P2Quantile(p)
+        sketch.update(values)
+        exact = percentile_cont([x for x in values if x is not None and math.isfinite(x)], p)
+        if exact is not None:
+            errors[group] = abs(sketch.value() - exact)
+
+    return {
+        'groups': len(errors),
+        'max_abs_error': max(errors.values(), default=None),
+        'mean_abs_error': sum(errors.values()) / len(errors) if errors else None,
+        'errors': errors
+    }
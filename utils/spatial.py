@@ -0,0 +1,100 @@
+"""
+    Spatial index (KD-tree) for neighbourhood queries
+"""
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.spatial import cKDTree
+
+
+class SpatialIndex:
+    """
+    KD-tree over a set of points that keeps the id of every point
+    Points with a None/nan/inf coordinate are left out of the index.
+    """
+
+    def __init__(self, ids, points):
+        points = np.asarray(points, dtype=float)
+        if points.ndim != 2:
+            raise ValueError(f'points must be a (N x D) array, got {points.shape}')
+
+        mask = np.all(np.isfinite(points), axis=1)
+        self.ids = [x for x, valid in zip(ids, mask) if valid]
+        self.points = points[mask]
+        self.tree = cKDTree(self.points) if len(self.ids) else None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dimensions(self):
+        return self.points.shape[1]
+
+    def get_ids(self, indexes):
+        return [self.ids[i] for i in indexes]
+
+    def query_radius(self, point, radius):
+        """
+        Indexes of the points inside radius of point
+        @param point: (x, y, z)
+        @param radius: max distance in meters
+        @return: sorted list of indexes
+        """
+        if self.tree is None:
+            return []
+        return sorted(self.tree.query_ball_point(np.asarray(point, dtype=float), radius))
+
+    def query_radius_batch(self, points, radius):
+        """
+        Indexes of the points inside radius of every point
+        @param points: (M x D) array
+        @param radius: max distance in meters, scalar or (M) array
+        @return: list of M sorted lists of indexes
+        """
+        points = np.atleast_2d(np.asarray(points, dtype=float))
+        if self.tree is None:
+            return [[] for _ in range(points.shape[0])]
+        return [sorted(x) for x in self.tree.query_ball_point(points, radius)]
+
+    def query_nearest(self, points, k=1, max_distance=np.inf):
+        """
+        k nearest points of every point
+        Missing neighbours (less than k points or farther than max_distance) have distance inf and index -1
+        @param points: (M x D) array or a single point
+        @param k: number of neighbours
+        @param max_distance: max distance in meters
+        @return: (M x k) array of distances, (M x k) array of indexes
+        """
+        points = np.atleast_2d(np.asarray(points, dtype=float))
+        if self.tree is None:
+            return np.full((points.shape[0], k), np.inf), np.full((points.shape[0], k), -1)
+
+        distances, indexes = self.tree.query(points, k=k, distance_upper_bound=max_distance)
+        distances = distances.reshape(points.shape[0], k)
+        indexes = indexes.reshape(points.shape[0], k)
+        indexes[~np.isfinite(distances)] = -1
+        return distances, indexes
+
+    def distances_within(self, points, radius):
+        """
+        Sparse distance matrix between points and the indexed points, limited to radius
+        @param points: (M x D) array
+        @param radius: max distance in meters
+        @return: scipy.sparse coo_matrix (M x N)
+        """
+        points = np.atleast_2d(np.asarray(points, dtype=float))
+        if self.tree is None:
+            return coo_matrix((points.shape[0], 0))
+        return cKDTree(points).sparse_distance_matrix(self.tree, radius, output_type='coo_matrix')
+
+    def closest_node(self, point, radius):
+        """
+        Same output as utils.helpers.closest_node, using the index
+        @param point: (x, y, z)
+        @param radius: max distance in meters
+        @return: boolean list inside radius of point, index of the closest point
+        """
+        inside = np.zeros(len(self.ids), dtype=bool)
+        # closest_node keeps the points strictly inside the radius
+        inside[self.query_radius(point, np.nextafter(radius, 0))] = True
+        _, indexes = self.query_nearest(point, k=1)
+        return inside.tolist(), indexes[0, 0]
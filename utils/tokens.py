@@ -0,0 +1,46 @@
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+
+from code_setting.settings import JWT_TENANTS_CLAIM
+from utils.permissions import get_user_tenants
+
+
+class TenantsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Add the company dbs of the user to the token (JWT_TENANTS_CLAIM), so IsAuthorized does not query them
+    """
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        if JWT_TENANTS_CLAIM:
+            token[JWT_TENANTS_CLAIM] = get_user_tenants(user)
+        return token
+
+
+class TenantsTokenObtainPairView(TokenObtainPairView):
+    serializer_class = TenantsTokenObtainPairSerializer
+
+
+class TenantsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Access tokens copy the claims of the refresh token, the company dbs are read again so a user removed from a
+    company loses it at the next refresh
+    """
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        if JWT_TENANTS_CLAIM:
+            refresh = RefreshToken(attrs['refresh'])
+            user = get_user_model().objects.filter(
+                **{api_settings.USER_ID_FIELD: refresh[api_settings.USER_ID_CLAIM]}).first()
+            access = refresh.access_token
+            access[JWT_TENANTS_CLAIM] = get_user_tenants(user) if user is not None else []
+            data['access'] = str(access)
+        return data
+
+
+class TenantsTokenRefreshView(TokenRefreshView):
+    serializer_class = TenantsTokenRefreshSerializer